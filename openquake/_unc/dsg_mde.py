@@ -26,6 +26,7 @@
 # vim: tabstop=4 shiftwidth=4 softtabstop=4
 
 import numpy as np
+from openquake.calculators.extract import read_disagg
 
 # We use a PMF-matrix to store the results of a number of disaggregation
 # results obtained from a set of realisations admitted by a logic tree for a
@@ -74,12 +75,17 @@ def get_afes_from_dstore(dstore, name, imt_idx: int,
     # matrix has the following dimensions:
     # |Site| x |Mag| x |Dist| x |Eps| x |IMTs| x |IMLs| x |Rlz|
 
+    # NB: the datasets can be stored in sparse format, so they are expanded
+    # only for the first site
     if name == 'Mag_Dist_Eps': 
-        poes = dstore['disagg-rlzs/Mag_Dist_Eps'][0, :, :, :, imt_idx, 0, idxs]
+        poes = read_disagg(dstore['disagg-rlzs/Mag_Dist_Eps'], 0)[
+            :, :, :, imt_idx, 0][..., idxs]
     elif name == 'Mag_Dist':
-        poes = dstore['disagg-rlzs/Mag_Dist'][0, :, :, imt_idx, 0, idxs]
+        poes = read_disagg(dstore['disagg-rlzs/Mag_Dist'], 0)[
+            :, :, imt_idx, 0][..., idxs]
     elif name == 'Mag':
-        poes = dstore['disagg-rlzs/Mag'][0, :, imt_idx, 0, idxs]
+        poes = read_disagg(dstore['disagg-rlzs/Mag'], 0)[
+            :, imt_idx, 0][..., idxs]
     else:
         raise NameError(name)
     shapes = poes.shape
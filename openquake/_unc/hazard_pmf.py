@@ -36,6 +36,7 @@ For the description of a PMF we use:
 """
 
 import numpy as np
+from openquake.calculators.extract import read_disagg
 from openquake._unc.convolution import HistoGroup
 
 
@@ -124,18 +125,20 @@ def afes_matrix_from_dstore(dstore, imtstr: str, atype: str, info: bool=False,
         # Number of distances
         # Number of epsilons
         # Number of realisations
-        poes = dstore['disagg-rlzs/Mag_Dist_Eps'][
-            0, imt_idx, 0, :, :, :, rlzs]
+        poes = read_disagg(dstore['disagg-rlzs/Mag_Dist_Eps'], 0)[
+            imt_idx, 0][..., rlzs]
         poes = get_2d_from_mde(poes)
     elif atype == 'md':
         # The shape of the final `poes` is: R X A where R is the number of
         # realizations and A is the number of the annual frequencies of
         # exceedance
-        poes = dstore['disagg-rlzs/Mag_Dist'][0, :, :, imt_idx, 0, rlzs]
+        poes = read_disagg(dstore['disagg-rlzs/Mag_Dist'], 0)[
+            :, :, imt_idx, 0][..., rlzs]
         poes = get_2d_from_mde(poes[:, :, None, :])
         assert len(rlzs) == poes.shape[0]
     elif atype == 'm':
-        poes = dstore['disagg-rlzs/Mag'][0, :, imt_idx, 0, rlzs].T
+        poes = read_disagg(dstore['disagg-rlzs/Mag'], 0)[
+            :, imt_idx, 0][..., rlzs].T
         # shape (R, Ma) i.e. (6, 17) in test_m_correlation
     else:
         raise ValueError(f'Unsupported atype: {atype}')
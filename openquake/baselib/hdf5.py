@@ -396,6 +396,34 @@ class File(h5py.File):
         for k, v in kw.items():
             attrs[k] = v
 
+    def extend_df(self, key, df):
+        """
+        Extend a HDF5 datagroup readable as a pandas DataFrame, creating
+        it if missing. The columns not already present are added in order
+        of discovery and the missing values are filled with zeros.
+
+        :param key: name of the datagroup
+        :param df: a DataFrame
+        """
+        if key in self:
+            cols = self[key].attrs['__pdcolumns__'].split()
+            size = len(self[f'{key}/{cols[0]}'])
+        else:
+            cols, size = [], 0
+        for col in df.columns:
+            if col not in cols:
+                dt = df[col].to_numpy().dtype
+                dset = create(self, f'{key}/{col}', dt, (None,))
+                extend(dset, numpy.zeros(size, dt))
+                cols.append(col)
+        for col in cols:
+            dset = self[f'{key}/{col}']
+            if col in df.columns:
+                extend(dset, df[col].to_numpy())
+            else:
+                extend(dset, numpy.zeros(len(df), dset.dtype))
+        self[key].attrs['__pdcolumns__'] = ' '.join(cols)
+
     def read_df(self, key, index=None, sel=(), slc=slice(None), slices=()):
         """
         :param key: name of the structured dataset
@@ -19,11 +19,22 @@
 """
 Support for onnxruntime sessions
 """
+import hashlib
+import numpy
 try:
     import onnxruntime
 except ImportError:
     onnxruntime = None
 
+BATCH_SIZE = 100_000  # number of rows passed to a single inference call
+ONNX_DTYPE = {'tensor(float)': numpy.float32,
+              'tensor(double)': numpy.float64,
+              'tensor(int64)': numpy.int64}
+# the sessions are pooled in each process; the pool is bounded since the
+# sessions of large models can take hundreds of megabytes
+MAX_SESSIONS = 8
+_sessions = {}  # model key -> InferenceSession, in order of last use
+
 
 # NB: the engine is already parallelizing, so we must disable the
 # parallelization internal to onnxruntime to avoid oversubscription;
@@ -41,10 +52,45 @@ def get_session(model):
         model, opt, providers=onnxruntime.get_available_providers())
 
 
+def get_pooled_session(model):
+    """
+    :param model: path to a machine learning model or its bytes
+    :returns: an InferenceSession shared by all the callers in the process
+
+    At most MAX_SESSIONS sessions are kept, discarding the least recently
+    used one when a new model is loaded.
+    """
+    if isinstance(model, str):
+        key = model
+    else:
+        key = hashlib.sha1(model).hexdigest()
+    try:
+        sess = _sessions.pop(key)
+    except KeyError:
+        sess = get_session(model)
+        if len(_sessions) >= MAX_SESSIONS:
+            del _sessions[next(iter(_sessions))]
+    _sessions[key] = sess  # move to the end, as the most recently used
+    return sess
+
+
+def _concat(outputs):
+    # concatenate the outputs of the batches; sequence outputs
+    # (like the probabilities returned by the classifiers) are lists
+    if isinstance(outputs[0], list):
+        return [row for out in outputs for row in out]
+    return numpy.concatenate(outputs)
+
+
 class PicklableInferenceSession:
+    """
+    Wrapper over an InferenceSession which can be sent to the workers.
+    The underlying sessions are pooled, so that unpickling many tasks in the
+    same worker process loads the model only once.
+    """
     def __init__(self, model):
         self.model = model
-        self.inference_session = get_session(self.model)
+        self.inference_session = get_pooled_session(self.model)
 
     def get_inputs(self):
         return self.inference_session.get_inputs()
@@ -52,9 +98,32 @@ class PicklableInferenceSession:
     def run(self, *args):
         return self.inference_session.run(*args)
 
+    def run_batched(self, inputs, batch_size=BATCH_SIZE):
+        """
+        Run the model on batches of `batch_size` rows and concatenate the
+        outputs. The inputs are converted to the types expected by the model.
+
+        :param inputs: a dictionary input name -> array with N rows
+        :param batch_size: maximum number of rows per inference call
+        :returns: a list of outputs with N rows each
+        """
+        dtype = {inp.name: ONNX_DTYPE.get(inp.type)
+                 for inp in self.get_inputs()}
+        inputs = {name: numpy.asarray(arr, dtype[name])
+                  for name, arr in inputs.items()}
+        N = len(next(iter(inputs.values())))
+        outs = []
+        for start in range(0, N, batch_size):
+            slc = slice(start, start + batch_size)
+            outs.append(self.inference_session.run(
+                None, {name: arr[slc] for name, arr in inputs.items()}))
+        if not outs:  # no rows
+            outs.append(self.inference_session.run(None, inputs))
+        return [_concat(list(out)) for out in zip(*outs)]
+
     def __getstate__(self):
         return {"model": self.model}
 
     def __setstate__(self, values):
         self.model = values["model"]
-        self.inference_session = get_session(self.model)
+        self.inference_session = get_pooled_session(self.model)
@@ -44,12 +44,13 @@ from openquake.baselib.performance import Monitor, idx_start_stop
 from openquake.hazardlib import (
     InvalidFile, geo, site, stats, logictree, source_reader)
 from openquake.hazardlib.gsim_lt import GsimLogicTree
+from openquake.hazardlib.geo.surface import kite_fault
 from openquake.hazardlib.site_amplification import Amplifier
 from openquake.hazardlib.site_amplification import AmplFunction
 from openquake.hazardlib.calc.gmf import GmfComputer
 from openquake.hazardlib.calc.filters import SourceFilter, getdefault
 from openquake.hazardlib.source import rupture
-from openquake.hazardlib.shakemap.gmfs import to_gmfs
+from openquake.hazardlib.shakemap.gmfs import to_gmfs, get_imts, cholesky_sh
 from openquake.risklib import riskinput, riskmodels, reinsurance
 from openquake.commonlib import readinput, datastore, logs
 from openquake.calculators.export import export as exp
@@ -321,6 +322,7 @@ class BaseCalculator(metaclass=abc.ABCMeta):
                 if shutdown:
                     parallel.Starmap.shutdown()
                 # cleanup globals
+                kite_fault.clear_mesh_cache()
                 if ct == 0:  # restore OQ_DISTRIBUTE
                     if oq_distribute is None:  # was not set
                         del os.environ['OQ_DISTRIBUTE']
@@ -574,9 +576,10 @@ class HazardCalculator(BaseCalculator):
         self._read_risk2()
         self._read_risk3()
 
+        method = oq.ground_motion_correlation_params.get('method', 'cholesky')
         if (oq.calculation_mode == 'event_based' and
-                oq.ground_motion_correlation_model and
-                len(self.sitecol) > oq.max_sites_correl):
+                oq.ground_motion_correlation_model and method == 'cholesky'
+                and len(self.sitecol) > oq.max_sites_correl):
             raise ValueError('You cannot use a correlation model with '
                              f'{self.N} sites [{oq.max_sites_correl=}]')
         if hasattr(self, 'assetcol'):
@@ -1623,12 +1626,72 @@ def store_events(dstore, eids):
     return events
 
 
+def shakemap_gmfs(shakemap, gmf_dict, trunclevel, sids, start, num_gmfs,
+                  seed, imts, monitor):
+    """
+    Generate the GMFs for the events in the range [start, start+num_gmfs)
+
+    :returns: a dictionary with keys gmf_data and momenta
+    """
+    if 'L' in monitor.shared:  # Silva&Horspool decomposition
+        with monitor.shared['L'] as L:
+            imts, gmfs = to_gmfs(shakemap, dict(gmf_dict, L=L), None,
+                                 trunclevel, num_gmfs, seed + start, imts)
+    else:
+        imts, gmfs = to_gmfs(shakemap, dict(gmf_dict), None,
+                             trunclevel, num_gmfs, seed + start, imts)
+    N, E, _M = gmfs.shape
+    data = {'sid': numpy.tile(sids, E),
+            'eid': numpy.repeat(numpy.arange(start, start + E, dtype=U32), N)}
+    for m, im in enumerate(imts):
+        data[im.string] = gmfs[:, :, m].T.reshape(-1)
+    momenta = stats.calc_momenta(gmfs.transpose(1, 0, 2), numpy.ones(E))
+    return dict(gmf_data=data, momenta=momenta)
+
+
+def store_gmfs_streaming(calc, sitecol, shakemap, gmf_dict):
+    """
+    Store a ShakeMap array as a gmf_data dataset, by generating the GMFs
+    in parallel in chunks of events and saving them incrementally.
+    """
+    oq = calc.oqparam
+    dstore = calc.datastore
+    E = oq.number_of_ground_motion_fields
+    imts = get_imts(shakemap, oq.imtls)
+    smap = parallel.Starmap(shakemap_gmfs, h5=dstore.hdf5)
+    if gmf_dict['kind'] == 'Silva&Horspool':
+        with calc.monitor('computing cholesky'):
+            smap.share(L=cholesky_sh(
+                shakemap, imts, gmf_dict['spatialcorr'],
+                gmf_dict['crosscorr'], gmf_dict['cholesky_limit']))
+    store_events(dstore, E)
+    oq.hazard_imtls = {str(imt): [0] for imt in imts}
+    create_gmf_data(dstore, imts, E=E, R=1)
+    dstore['full_lt'] = logictree.FullLogicTree.fake()
+    dstore['weights'] = numpy.ones(1)
+    for start in range(0, E, oq.shakemap_gmfs_per_task):
+        smap.submit((shakemap, gmf_dict, oq.truncation_level, sitecol.sids,
+                     start, min(oq.shakemap_gmfs_per_task, E - start),
+                     oq.random_seed, oq.imtls))
+    momenta = numpy.zeros((3, len(sitecol), len(imts)))
+    for res in smap:
+        with calc.monitor('saving GMFs'):
+            for col, arr in res['gmf_data'].items():
+                hdf5.extend(dstore[f'gmf_data/{col}'], arr)
+            momenta += res['momenta']
+    avg_gmf = numpy.zeros((2, len(sitecol.complete), len(imts)), F32)
+    avg_gmf[:, sitecol.sids] = stats.calc_avg_std(momenta)
+    dstore['avg_gmf'] = avg_gmf
+
+
 def store_gmfs(calc, sitecol, shakemap, gmf_dict):
     """
     Store a ShakeMap array as a gmf_data dataset.
     """
     logging.info('Building GMFs')
     oq = calc.oqparam
+    if oq.shakemap_gmfs_per_task:
+        return store_gmfs_streaming(calc, sitecol, shakemap, gmf_dict)
     with calc.monitor('building/saving GMFs'):
         vs30 = None  # do not amplify, the ShakeMap takes care of that already
         imts, gmfs = to_gmfs(shakemap, gmf_dict, vs30,
@@ -31,6 +31,8 @@ from openquake.baselib import parallel, hdf5, config, python3compat
 from openquake.baselib.general import AccumDict, DictArray, groupby, humansize
 from openquake.hazardlib import valid, InvalidFile
 from openquake.hazardlib.contexts import get_cmakers, read_full_lt_by_label
+from openquake.hazardlib.source.base import is_poissonian
+from openquake.hazardlib.tom import NegativeBinomialTOM
 from openquake.hazardlib.calc.hazard_curve import classical as hazclassical
 from openquake.hazardlib.calc import disagg
 from openquake.hazardlib.map_array import (
@@ -383,6 +385,9 @@ class ClassicalCalculator(base.HazardCalculator):
             self.source_data += sdata
             self.rel_ruptures[grp_id] += sum(sdata['nrupts'])
         self.cfactor += dic.pop('cfactor')
+        att_stats = dic.pop('att_stats')
+        self.att_stats[:2] += att_stats[:2]
+        self.att_stats[2] = max(self.att_stats[2], att_stats[2])
         self.dparam_mb = max(dic.pop('dparam_mb'), self.dparam_mb)
         self.source_mb = max(dic.pop('source_mb'), self.source_mb)
 
@@ -391,6 +396,10 @@ class ClassicalCalculator(base.HazardCalculator):
             with self.monitor('saving rup_data'):
                 store_ctxs(self.datastore, dic['rup_data'], grp_id)
 
+        if 'disagg_hist' in dic:
+            gid, hist = dic.pop('disagg_hist')
+            self.disagg_hist[gid] += hist
+
         rmap = dic.pop('rmap', None)
         source_id = dic.pop('basename', '')  # non-empty for disagg_by_src
         if source_id:
@@ -470,9 +479,12 @@ class ClassicalCalculator(base.HazardCalculator):
                     self.cmdict['Default'])
 
         self.cfactor = numpy.zeros(2)
+        self.att_stats = numpy.zeros(3)
         self.dparam_mb = 0
         self.source_mb = 0
         self.rel_ruptures = AccumDict(accum=0)  # grp_id -> rel_ruptures
+        if oq.disagg_in_classical:
+            self.init_disagg_hist()
         if oq.disagg_by_src:
             M = len(oq.imtls)
             L1 = oq.imtls.size // M
@@ -491,6 +503,43 @@ class ClassicalCalculator(base.HazardCalculator):
             '_rates', [(n, rates_dt[n]) for n in rates_dt.names], GZIP)
         self.datastore.create_dset('_rates/slice_by_idx', getters.slice_dt)
 
+    def init_disagg_hist(self):
+        """
+        Set the disaggregation edges on the ContextMakers, so that
+        the classical tasks accumulate the mag/dist/eps histograms
+        """
+        oq = self.oqparam
+        if self.N > oq.max_sites_disagg:
+            raise InvalidFile(
+                '%s: disagg_in_classical requires at most max_sites_disagg'
+                '=%d sites, got %d' % (oq.inputs['job_ini'],
+                                       oq.max_sites_disagg, self.N))
+        for sg in self.csm.src_groups:
+            if sg.atomic:
+                raise InvalidFile(
+                    '%s: disagg_in_classical does not support mutex sources '
+                    'or clusters, found in group %d' % (
+                        oq.inputs['job_ini'], sg.grp_id))
+            for src in sg:
+                tom = getattr(src, 'temporal_occurrence_model', None)
+                if (isinstance(tom, NegativeBinomialTOM) or
+                        not (is_poissonian(src) or oq.infer_occur_rates)):
+                    raise InvalidFile(
+                        '%s: disagg_in_classical does not support the '
+                        'non-Poissonian source %s' % (
+                            oq.inputs['job_ini'], src.source_id))
+        edges, shapedic = disagg.get_edges_shapedic(oq, self.sitecol)
+        mag_edges, dist_edges, _lon, _lat, eps_edges, _trts = edges
+        for cmakers in self.cmdict.values():
+            for cm in cmakers:
+                cm.disagg_edges = (mag_edges, dist_edges, eps_edges)
+        M = len(oq.imtls)
+        shp = (self.cmdict['Default'].Gt, self.N, shapedic['mag'],
+               shapedic['dist'], shapedic['eps'], M, oq.imtls.size // M)
+        logging.info('Disaggregating in the classical pass, '
+                     'disagg_hist=%s', humansize(8 * numpy.prod(shp)))
+        self.disagg_hist = numpy.zeros(shp)
+
     def check_memory(self, N, L, maxw):
         """
         Log the memory required to receive the largest MapArray,
@@ -551,7 +600,18 @@ class ClassicalCalculator(base.HazardCalculator):
                                    ' included in the hazard model')
         else:
             logging.info('cfactor = {:_d}'.format(int(self.cfactor[0])))
+        if self.att_stats[1]:
+            logging.info('Interpolated {:_d}/{:_d} far contexts, max estimated'
+                         ' error={:.5f}'.format(*map(int, self.att_stats[:2]),
+                                                self.att_stats[2]))
         self.store_info()
+        if oq.disagg_in_classical:
+            self.datastore['disagg_hist'] = self.disagg_hist
+            self.datastore.set_shape_descr(
+                'disagg_hist', gid=len(self.disagg_hist), site_id=self.N,
+                mag=self.disagg_hist.shape[2], dist=self.disagg_hist.shape[3],
+                eps=self.disagg_hist.shape[4], imt=list(oq.imtls),
+                lvl=self.disagg_hist.shape[6])
         if self.dparam_mb:
             logging.info('maximum size of the dparam cache=%.1f MB',
                          self.dparam_mb)
@@ -23,6 +23,7 @@ Disaggregation calculator core functionality
 import logging
 import psutil
 import numpy
+from scipy import sparse
 
 from openquake.baselib import parallel
 from openquake.baselib.general import (
@@ -44,6 +45,10 @@ U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
 F32 = numpy.float32
+F64 = numpy.float64
+I64 = numpy.int64
+disagg_coo_dt = numpy.dtype([('idx', I64), ('value', F64)])
+MAX_TASK_MATRIX = 1E7  # max size of the dense matrices with disagg_sparse
 
 
 def compute_disagg(dstore, ctxt, sitecol, cmaker, bin_edges, src_mutex, rwdic,
@@ -87,10 +92,44 @@ def compute_disagg(dstore, ctxt, sitecol, cmaker, bin_edges, src_mutex, rwdic,
             rlzs = dstore['best_rlzs'][dis.sid]
         res = dis.disagg_by_magi(imtls, rlzs, rwdic, src_mutex,
                                  mon0, mon1, mon2, mon3)
+        if cmaker.oq.disagg_sparse:
+            res = map(sparsify, res)
         out.extend(res)
     return out
 
 
+def sparsify(res):
+    """
+    Convert the 6D matrices of rates in a result dictionary into sparse
+    rows, to reduce the data transfer when disagg_sparse is set
+    """
+    for key, arr in res.items():
+        if key not in ('trti', 'magi', 'sid'):
+            res[key] = sparse.csr_matrix(arr.reshape(1, -1))
+    return res
+
+
+def check_matrix_size(shapedic, disagg_sparse):
+    """
+    Raise a ValueError if the disaggregation matrix is too large; with
+    disagg_sparse the tasks still build a dense matrix of shape
+    (D, Lo, La, E, M, P) for each magnitude bin, so that one is checked
+    """
+    s = shapedic
+    if disagg_sparse:
+        size = s['dist'] * s['lon'] * s['lat'] * s['eps'] * s['M'] * s['P']
+        if size > MAX_TASK_MATRIX:
+            raise ValueError(
+                'The disaggregation matrix of a single magnitude bin is '
+                'too large (%d elements): fix the binning!' % size)
+        return
+    size = s['mag'] * s['dist'] * s['lon'] * s['lat'] * s['eps'] * s['trt']
+    if size > 1E6:
+        raise ValueError(
+            'The disaggregation matrix is too large '
+            '(%d elements): fix the binning!' % size)
+
+
 def get_outputs_size(shapedic, disagg_outputs, Z):
     """
     :returns: the total size of the outputs
@@ -145,8 +184,8 @@ class DisaggregationCalculator(base.HazardCalculator):
 
     def pre_checks(self):
         """
-        Checks on the number of sites, atomic groups and size of the
-        disaggregation matrix.
+        Checks on the number of sites; the size of the disaggregation
+        matrix is checked in full_disaggregation.
         """
         if self.N >= 32768:
             raise ValueError('You can disaggregate at max 32,768 sites')
@@ -155,18 +194,6 @@ class DisaggregationCalculator(base.HazardCalculator):
             raise ValueError(
                 'The number of sites is to disaggregate is %d, but you have '
                 'max_sites_disagg=%d' % (self.N, few))
-        self.oqparam.mags_by_trt = self.datastore['source_mags']
-        all_edges, _shapedic = disagg.get_edges_shapedic(
-            self.oqparam, self.sitecol, self.R)
-        *b, trts = all_edges
-        T = len(trts)
-        shape = [len(bin) - 1 for bin in
-                 (b[0], b[1], b[2][0], b[3][0], b[4])] + [T]
-        matrix_size = numpy.prod(shape)  # 6D
-        if matrix_size > 1E6:
-            raise ValueError(
-                'The disaggregation matrix is too large '
-                '(%d elements): fix the binning!' % matrix_size)
 
     def execute(self):
         """Performs the disaggregation"""
@@ -187,6 +214,7 @@ class DisaggregationCalculator(base.HazardCalculator):
         edges, self.shapedic = disagg.get_edges_shapedic(
             oq, self.sitecol, self.R)
         logging.info(self.shapedic)
+        check_matrix_size(self.shapedic, oq.disagg_sparse)
         self.save_bin_edges(edges)
         self.poes_disagg = oq.poes_disagg or (None,)
         self.imts = list(oq.imtls)
@@ -244,6 +272,8 @@ class DisaggregationCalculator(base.HazardCalculator):
         oq = self.oqparam
         dstore = (self.datastore.parent if self.datastore.parent
                   else self.datastore)
+        if oq.disagg_in_classical and 'disagg_hist' in dstore:
+            return self.disagg_from_hist(dstore)
         logging.info("Reading contexts")
         cmakers = read_cmakers(dstore).to_array()
         if 'src_mutex' in dstore:
@@ -323,12 +353,51 @@ class DisaggregationCalculator(base.HazardCalculator):
 
         shape8D = (s['trt'], s['mag'], s['dist'], s['lon'], s['lat'], s['eps'],
                    s['M'], s['P'])
-        check_memory(self.N, self.Z, shape8D)
-        acc = AccumDict(accum=numpy.zeros(shape8D))
+        if oq.disagg_sparse:
+            # sid, rlz -> sparse row, containing only the nonzero bins
+            acc = AccumDict()
+        else:
+            check_memory(self.N, self.Z, shape8D)
+            acc = AccumDict(accum=numpy.zeros(shape8D))
         # NB: a lot of memory can go in this AccumDict, please reduce the bins
         results = smap.reduce(self.agg_result, acc)
         return results  # s, r -> array 8D
 
+    def disagg_from_hist(self, dstore):
+        """
+        Build the disaggregation matrices by interpolating the histograms
+        stored by the classical calculator, without reading the contexts
+
+        :returns: a dictionary s, r -> array 8D
+        """
+        s = self.shapedic
+        shape8D = (s['trt'], s['mag'], s['dist'], s['lon'], s['lat'], s['eps'],
+                   s['M'], s['P'])
+        check_memory(self.N, self.Z, shape8D)
+        weights = self.datastore['weights'][:] if self.Z > 1 else None
+        iml3 = self.datastore['hmap3'][:]
+        acc = AccumDict(accum=numpy.zeros(shape8D))
+        logging.info('Interpolating the disaggregation histograms')
+        with self.monitor('disagg from hist'):
+            for cmaker in read_cmakers(dstore):
+                rlzs_by_g = list(cmaker.gsims.values())
+                for g, gid in enumerate(cmaker.gid):
+                    hist = dstore['disagg_hist'][gid]  # (N, Ma, D, E, M, L1)
+                    for sid in self.sitecol.sids:
+                        if iml3[sid].sum() == 0:  # zero hazard for this site
+                            continue
+                        rlzs = set(self.rlzs[sid]) & set(rlzs_by_g[g])
+                        if not rlzs:  # non-contributing gsim
+                            continue
+                        mat = disagg.interp_disagg_hist(
+                            hist[sid], self.oqparam.imtls, iml3[sid])
+                        for rlz in rlzs:
+                            acc[sid, rlz][cmaker.trti, :, :, 0, 0] += mat
+                            if weights is not None:
+                                acc[sid, 'mean'][cmaker.trti, :, :, 0, 0] += (
+                                    mat * weights[rlz])
+        return acc
+
     def agg_result(self, acc, results):
         """
         Collect the results coming from compute_disagg into self.results.
@@ -342,9 +411,22 @@ class DisaggregationCalculator(base.HazardCalculator):
                 magi = res.pop('magi')
                 sid = res.pop('sid')
                 for rlz, arr in res.items():
-                    acc[sid, rlz][trti, magi] += arr
+                    if sparse.issparse(arr):
+                        self._add_sparse(acc, (sid, rlz), trti, magi, arr)
+                    else:
+                        acc[sid, rlz][trti, magi] += arr
         return acc
 
+    def _add_sparse(self, acc, key, trti, magi, row):
+        # add a sparse 6D row in the position (trti, magi) of the 8D row
+        s = self.shapedic
+        size6D = row.shape[1]
+        coo = row.tocoo()
+        col = coo.col.astype(numpy.int64) + (trti * s['mag'] + magi) * size6D
+        mat = sparse.csr_matrix((coo.data, (coo.row, col)),
+                                shape=(1, s['trt'] * s['mag'] * size6D))
+        acc[key] = acc[key] + mat if key in acc else mat
+
     def post_execute(self, results):
         """
         Save all the results of the disaggregation. NB: the number of results
@@ -402,6 +484,8 @@ class DisaggregationCalculator(base.HazardCalculator):
             the string "disagg-rlzs" or "disagg-stats"
         """
         oq = self.oqparam
+        if oq.disagg_sparse:
+            return self.save_sparse_results(results, name)
         if name.endswith('rlzs'):
             Z = self.shapedic['Z']
         else:
@@ -451,3 +535,70 @@ class DisaggregationCalculator(base.HazardCalculator):
                 if lst:
                     logging.warning('No %s contributions for site=%d, rlz=%d',
                                     lst, s, r)
+
+    def save_sparse_results(self, results, name):
+        """
+        Save the computed PMFs in the datastore in COO format, i.e. as
+        arrays of (idx, value) records, where idx is the flat index in
+        the dense array of shape (N, ..., M, P, Z) stored in the attribute
+        `shape`. Use :func:`openquake.calculators.extract.read_disagg`
+        to expand them.
+
+        :param results:
+            a dict s, z -> sparse rows or 8D-matrices of rates
+        :param name:
+            the string "disagg-rlzs" or "disagg-stats"
+        """
+        oq = self.oqparam
+        s = self.shapedic
+        Z = s['Z'] if name.endswith('rlzs') else 1
+        shape8D = (s['trt'], s['mag'], s['dist'], s['lon'], s['lat'],
+                   s['eps'], s['M'], s['P'])
+        axis = dict(trt=0, mag=1, dist=2, lon=3, lat=4, eps=5)
+        M, P = len(self.imts), len(self.poes_disagg)
+        _disagg_trt = numpy.zeros(self.N, [(trt, float) for trt in self.trts])
+        idxs, vals, shapes = AccumDict(accum=[]), AccumDict(accum=[]), {}
+        for (sid, z), row in sorted(results.items()):
+            if isinstance(row, numpy.ndarray):  # from disagg_in_classical
+                row = row.reshape(1, -1)
+            coo = sparse.coo_matrix(row)
+            coo.sum_duplicates()
+            coords = numpy.unravel_index(coo.col, shape8D)
+            empty = []
+            for key in oq.disagg_outputs:
+                # the marginal PMFs are obtained by summing the rates
+                axes = [axis[k] for k in key.lower().split('_')] + [6, 7]
+                shp = tuple(shape8D[a] for a in axes)
+                shapes[key] = (self.N,) + shp + (Z,)
+                idx = numpy.ravel_multi_index([coords[a] for a in axes], shp)
+                rates = numpy.bincount(idx, coo.data, numpy.prod(shp))
+                nz, = rates.nonzero()
+                if len(nz) == 0:
+                    empty.append(key)
+                idxs[key].append((sid * len(rates) + nz) * Z + z)
+                vals[key].append(disagg.to_probs(rates[nz]))
+
+            # store poe4
+            trt_rates = numpy.zeros((s['trt'], M, P))
+            numpy.add.at(trt_rates, (coords[0], coords[6], coords[7]),
+                         coo.data)
+            _disagg_trt[sid] = tuple(disagg.to_probs(trt_rates[:, 0, 0]))
+            if name.endswith('-rlzs'):
+                poe_agg = disagg.to_probs(trt_rates.sum(axis=0))  # (M, P)
+                self.datastore['poe4'][sid, :, :, z] = numpy.maximum(
+                    poe_agg, mean_rates.CUTOFF)
+                if empty:
+                    logging.warning('No %s contributions for site=%d, rlz=%d',
+                                    empty, sid, self.rlzs[sid, z])
+
+        for key in oq.disagg_outputs:
+            idx = numpy.concatenate(idxs[key])
+            arr = numpy.zeros(len(idx), disagg_coo_dt)
+            arr['idx'] = idx
+            arr['value'] = numpy.concatenate(vals[key])
+            arr.sort(order='idx')
+            self.datastore[f'{name}/{key}'] = arr
+            sd = ['site_id'] + key.split('_') + ['imt', 'poe', 'Z']
+            self.datastore.set_attrs(f'{name}/{key}', shape_descr=sd,
+                                     shape=shapes[key], sparse=True)
+        self.datastore['_disagg_trt'] = _disagg_trt
@@ -219,9 +219,9 @@ def _event_based(proxies, cmaker, stations, srcfilter, shr,
                 continue
         if stations and stations[0] is not None:  # conditioned GMFs
             assert cmaker.scenario
-            with shr['mea'] as mea, shr['tau'] as tau, shr['phi'] as phi:
+            with shr['mea'] as mea, shr['chol'] as chol:
                 df = computer.compute_all(
-                    [mea, tau, phi], max_iml, mmon, cmon, umon)
+                    [mea, chol], max_iml, mmon, cmon, umon)
         else:  # regular GMFs
             df = computer.compute_all(None, max_iml, mmon, cmon, umon)
             if oq.mea_tau_phi:
@@ -420,14 +420,14 @@ def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None):
         G = len(cmaker.gsims)
         M = len(cmaker.imts)
         N = len(computer.sitecol)
-        size = 2 * G * M * N * N * 8  # tau, phi
-        msg = f'{G=} * {M=} * {humansize(N*N*8)} * 2'
-        logging.info('Requiring %s for tau, phi [%s]', humansize(size), msg)
+        size = G * M * N * N * 8  # tau + phi
+        msg = f'{G=} * {M=} * {humansize(N*N*8)}'
+        logging.info('Requiring %s for tau + phi [%s]', humansize(size), msg)
         if size > float(config.memory.conditioned_gmf_gb) * 1024**3:
             raise ValueError(
                 f'The calculation is too large: {G=}, {M=}, {N=}. '
                 'You must reduce the number of sites i.e. maximum_distance')
-        mea, tau, phi = computer.get_mea_tau_phi(dstore.hdf5)
+        mea, chol = computer.get_mea_chol(dstore.hdf5)
         del proxy.geom  # to reduce data transfer
 
     dstore.swmr_on()
@@ -450,7 +450,7 @@ def starmap_from_rups(func, oq, full_lt, sitecol, dstore, save_tmp=None):
             if parallel.oq_distribute() in ('zmq', 'slurm'):
                 logging.error('Conditioned scenarios are not meant to be run'
                               ' on a cluster')
-            smap.share(mea=mea, tau=tau, phi=phi)
+            smap.share(mea=mea, chol=chol)
         # producing slightly less than concurrent_tasks thanks to the 1.02
         for block in block_splitter(proxies, maxw * 1.02, rup_weight):
             args = block, cmaker, sitecol, (station_data, station_sites), dstore
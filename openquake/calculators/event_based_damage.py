@@ -34,6 +34,7 @@ from openquake.calculators.export import DISPLAY_NAME
 U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
+U64 = numpy.uint64
 F32 = numpy.float32
 
 
@@ -66,6 +67,116 @@ def damage_from_gmfs(gmfslices, oqparam, dstore, monitor):
     return event_based_damage(df, oqparam, dstore, monitor)
 
 
+class DmgByEvent(object):
+    """
+    Compact accumulator of damage distributions by (event_id, agg_id,
+    loss_id), replacing a dictionary of small arrays. The no damage state
+    is not stored (it is inferred in post_risk) and the rows with the same
+    key are summed when the number of rows exceeds `maxrows`. With discrete
+    damage distributions the damages are stored as integer counts.
+
+    :param K: aggregation ID of the total
+    :param L: number of loss types
+    :param D: number of damage states
+    :param C: number of consequences
+    :param discrete: if True, store the damages as uint32 counts
+    """
+    def __init__(self, K, L, D, C, discrete=False, maxrows=1_000_000):
+        self.K = K
+        self.L = L
+        self.D = D
+        self.C = C
+        self.dt = U32 if discrete else F32
+        self.maxrows = maxrows
+        self.blocks = []  # tuples (eids, kids, lids, dmgs, csqs)
+        self.nrows = 0
+
+    def add(self, eids, kids, li, dmgs, csqs):
+        """
+        :param eids: N event IDs
+        :param kids: N aggregation IDs
+        :param li: loss type index
+        :param dmgs: damages of shape (N, D-1), without the no damage state
+        :param csqs: consequences of shape (N, C)
+        """
+        N = len(eids)
+        self.blocks.append((U32(eids), U32(kids), numpy.full(N, li, U8),
+                            self.dt(dmgs), F32(csqs)))
+        self.nrows += N
+        if self.nrows > self.maxrows:
+            self.compact()
+            # avoid compacting at each call if there are many unique keys
+            self.maxrows = max(self.maxrows, 2 * self.nrows)
+
+    def compact(self):
+        """
+        Sum the rows with the same (event_id, agg_id, loss_id) and order them
+        """
+        if not self.blocks:
+            self.blocks = [(numpy.zeros(0, U32), numpy.zeros(0, U32),
+                            numpy.zeros(0, U8),
+                            numpy.zeros((0, self.D - 1), self.dt),
+                            numpy.zeros((0, self.C), F32))]
+        eids, kids, lids, dmgs, csqs = map(numpy.concatenate, zip(*self.blocks))
+        keys = (U64(eids) * (self.K + 1) + kids) * self.L + lids
+        uniq, idxs = numpy.unique(keys, return_inverse=True)
+        dmgs = general.fast_agg(idxs, dmgs, M=len(uniq))
+        csqs = general.fast_agg(idxs, csqs, M=len(uniq))
+        ek, lids = numpy.divmod(uniq, self.L)
+        self.blocks = [(U32(ek // (self.K + 1)), U32(ek % (self.K + 1)),
+                        U8(lids), dmgs, csqs)]
+        self.nrows = len(uniq)
+
+    def to_dframe(self, csqidx, loss_types):
+        """
+        :returns: a DataFrame (agg_id, event_id, loss_id, dmg_1, ...)
+        """
+        self.compact()
+        [(eids, kids, lids, dmgs, csqs)] = self.blocks
+        lossid = numpy.array([scientific.LOSSID[lt] for lt in loss_types])
+        dic = dict(agg_id=kids, event_id=eids, loss_id=lossid[lids])
+        for cname, ci in csqidx.items():
+            if ci < self.D:
+                dic[cname] = dmgs[:, ci - 1]
+            else:
+                dic[cname] = csqs[:, ci - self.D]
+        fix_dtypes(dic)
+        return pandas.DataFrame(dic)
+
+
+def _add_sparse(dbe, dmgcsq, sdds, csqs, eids, aids, rlzs, aggids, K):
+    # accumulate the compact damages returned by get_sparse_dds
+    # into the DmgByEvent accumulator and the (P, A, R, L, Dc) array
+    if K:
+        # an undamaged row for the first event of each realization, so
+        # that the aggregation keys with ground motion but no damage
+        # still enter in risk_by_event and then in aggrisk
+        _, first = numpy.unique(rlzs, return_index=True)
+        ukids = [numpy.unique(kids[aids]) for kids in aggids]
+    for li, sdd in enumerate(sdds):
+        aidx, eidx, dmg = sdd['aidx'], sdd['eidx'], sdd['dmg']
+        csq = numpy.zeros((len(dmg), len(csqs)), F32)
+        for c, cname in enumerate(csqs):
+            if cname in sdd:
+                csq[:, c] = sdd[cname]
+        numpy.add.at(dmgcsq[0, :, :, li, 1:], (aids[aidx], rlzs[eidx]),
+                     numpy.concatenate([dmg, csq], axis=1))
+        # the total row is stored for all the events, even if undamaged
+        totdmg = numpy.zeros((len(eids), dmg.shape[1]), dmg.dtype)
+        totcsq = numpy.zeros((len(eids), len(csqs)), F32)
+        numpy.add.at(totdmg, eidx, dmg)
+        numpy.add.at(totcsq, eidx, csq)
+        dbe.add(eids, numpy.full(len(eids), K), li, totdmg, totcsq)
+        if K:
+            for kids, uk in zip(aggids, ukids):
+                dbe.add(eids[eidx], kids[aids[aidx]], li, dmg, csq)
+                N = len(first) * len(uk)
+                dbe.add(numpy.repeat(eids[first], len(uk)),
+                        numpy.tile(uk, len(first)), li,
+                        numpy.zeros((N, dmg.shape[1]), dmg.dtype),
+                        numpy.zeros((N, len(csqs)), F32))
+
+
 def event_based_damage(df, oq, dstore, monitor):
     """
     :param df: a DataFrame of GMFs with fields sid, eid, imt, ...
@@ -86,8 +197,12 @@ def event_based_damage(df, oq, dstore, monitor):
     dmgcsq = zero_dmgcsq(len(assetcol), oq.R, oq.L, crmodel)
     P, _A, R, L, Dc = dmgcsq.shape
     D = len(crmodel.damage_states)
+    csqs = crmodel.get_consequences()
     rlzs = dstore['events']['rlz_id']
-    dddict = general.AccumDict(accum=numpy.zeros((L, Dc), F32))  # eid, kid
+    # with discrete damage distributions and a single peril only the
+    # integer counts of the damaged assets and events are kept
+    sparse = not oq.float_dmg_dist and P == 1
+    dbe = DmgByEvent(oq.K, L, D, Dc - D, discrete=sparse)
     for sid, asset_df in assetcol.to_dframe().groupby('site_id'):
         # working one site at the time
         gmf_df = df[df.sid == sid]
@@ -103,6 +218,14 @@ def event_based_damage(df, oq, dstore, monitor):
         for taxo, adf in asset_df.groupby('taxonomy'):
             aids = adf.index.to_numpy()
             A = len(aids)
+            if sparse:
+                with mon:
+                    rc = scientific.RiskComputer(crmodel, taxo)
+                    sdds = rc.get_sparse_dds(adf, gmf_df, rng, crmodel)
+                _add_sparse(dbe, dmgcsq, sdds, csqs, eids, aids,
+                            rlzs[eids] if R > 1 else numpy.zeros(E, U32),
+                            aggids, oq.K)
+                continue
             with mon:
                 rc = scientific.RiskComputer(crmodel, taxo)
                 dd5 = rc.get_dd5(adf, gmf_df, rng, Dc-D, crmodel)  # (A, E, L, Dc)
@@ -121,28 +244,18 @@ def event_based_damage(df, oq, dstore, monitor):
             else:
                 dd4 = dd5[0]
             tot = dd4.sum(axis=0)  # (E, L, Dc)
-            for e, eid in enumerate(eids):
-                dddict[eid, oq.K] += tot[e]
+            for li in range(L):
+                dbe.add(eids, numpy.full(E, oq.K), li,
+                        tot[:, li, 1:D], tot[:, li, D:])
                 if oq.K:
                     for kids in aggids:
-                        for a, aid in enumerate(aids):
-                            dddict[eid, kids[aid]] += dd4[a, e]
+                        # dd4 has shape (A, E, L, Dc)
+                        dd = dd4[:, :, li].reshape(A * E, Dc)
+                        dbe.add(numpy.tile(eids, A),
+                                numpy.repeat(kids[aids], E), li,
+                                dd[:, 1:D], dd[:, D:])
     csqidx = {dc: i + 1 for i, dc in enumerate(crmodel.get_dmg_csq())}
-    return _dframe(dddict, csqidx, oq.loss_types), dmgcsq
-
-
-def _dframe(dddic, csqidx, loss_types):
-    # convert {(eid, kid): dd} into a DataFrame (agg_id, event_id, loss_id)
-    dic = general.AccumDict(accum=[])
-    for (eid, kid), dd in sorted(dddic.items()):
-        for li, lt in enumerate(loss_types):
-            dic['agg_id'].append(kid)
-            dic['event_id'].append(eid)
-            dic['loss_id'].append(scientific.LOSSID[lt])
-            for cname, ci in csqidx.items():
-                dic[cname].append(dd[li, ci])
-    fix_dtypes(dic)
-    return pandas.DataFrame(dic)
+    return dbe.to_dframe(csqidx, oq.loss_types), dmgcsq
 
 
 @base.calculators.add('event_based_damage', 'scenario_damage')
@@ -225,7 +225,7 @@ def _event_based_risk(df, assdic, loss2, loss3, crmodel, monitor):
         rng = None
     else:
         rng = MultiEventRNG(oq.master_seed, df.eid.unique(),
-                            int(oq.asset_correlation))
+                            int(oq.asset_correlation), oq.counter_based_rng)
     outgen = output_gen(df, assdic, crmodel, rng, monitor)
     with monitor('aggregating losses', measuremem=True) as agg_mon:
         aggreg(outgen, loss2, loss3, crmodel, oq.K,
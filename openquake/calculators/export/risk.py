@@ -697,6 +697,8 @@ def export_reinsurance(ekey, dstore):
     dest = dstore.export_path('%s.%s' % ekey)
     df = dstore.read_df(ekey[0])
     if 'event_id' in df.columns:
+        # the reinsurance tasks store the events in order of arrival
+        df = df.sort_values('event_id', kind='stable', ignore_index=True)
         events = dstore['events'][()]
         if 'year' not in events.dtype.names:  # gmfs.hdf5 missing events
             df['year'] = 1
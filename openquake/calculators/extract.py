@@ -1341,6 +1341,44 @@ def get_ruptures_within(dstore, bbox):
     return dstore['ruptures'][mask]
 
 
+def read_disagg(dset, sid=None, idx=None):
+    """
+    Read a disaggregation output as a dense array, expanding it if it was
+    stored in COO format (i.e. with disagg_sparse = true)
+
+    :param dset: a dataset in disagg-rlzs or disagg-stats
+    :param sid: if given, read only the matrix for the given site
+    :param idx: the idx column of a sparse dataset, if already read
+    :returns: an array of shape (N, ..., M, P, Z) or (..., M, P, Z)
+    """
+    if 'sparse' not in dset.attrs:
+        return dset[()] if sid is None else dset[sid]
+    shape = tuple(dset.attrs['shape'])
+    if sid is None:
+        coo = dset[()]
+        out = numpy.zeros(shape)
+        out.reshape(-1)[coo['idx']] = coo['value']
+        return out
+    # read only the records of the given site, found by searching
+    # the sorted idx column
+    if idx is None:
+        idx = dset.fields('idx')[()]
+    size = numpy.prod(shape[1:])
+    i1, i2 = numpy.searchsorted(idx, [sid * size, (sid + 1) * size])
+    coo = dset[i1:i2]
+    out = numpy.zeros(shape[1:])
+    out.reshape(-1)[coo['idx'] - sid * size] = coo['value']
+    return out
+
+
+def read_disagg_idx(dset):
+    """
+    :returns: the idx column of a sparse disaggregation output, or None
+    """
+    if 'sparse' in dset.attrs:
+        return dset.fields('idx')[()]
+
+
 @extract.add('disagg')
 def extract_disagg(dstore, what):
     """
@@ -1376,7 +1414,7 @@ def extract_disagg(dstore, what):
         return dset[:]  # regular bin edges
 
     bins = {k: bin_edges(v, sid) for k, v in dstore['disagg-bins'].items()}
-    fullmatrix = dstore['disagg-%s/%s' % (spec, label)][sid]
+    fullmatrix = read_disagg(dstore['disagg-%s/%s' % (spec, label)], sid)
     # matrix has shape (..., M, P, Z)
     matrix = fullmatrix[..., imti, :, :][..., poei, :]
     if traditional:
@@ -1492,9 +1530,13 @@ def extract_disagg_layer(dstore, what):
     out = numpy.zeros(len(sitecol), dt)
     hmap3 = dstore['hmap3'][:]  # shape (N, M, P)
     best_rlzs = dstore['best_rlzs'][:]
-    arr = {kind: dstore['disagg-rlzs/' + kind][:] for kind in kinds}
+    dsets = {kind: dstore['disagg-rlzs/' + kind] for kind in kinds}
+    idxs = {kind: read_disagg_idx(dset) for kind, dset in dsets.items()}
     for sid, lon, lat, rec in zip(
             sitecol.sids, sitecol.lons, sitecol.lats, out):
+        # expand the matrices one site at the time
+        arr = {kind: read_disagg(dset, sid, idxs[kind])
+               for kind, dset in dsets.items()}
         weights = full_lt.weights[best_rlzs[sid]]
         rec['site_id'] = sid
         rec['lon'] = lon
@@ -1507,7 +1549,7 @@ def extract_disagg_layer(dstore, what):
             for p, poe in enumerate(poes_disagg):
                 for kind in kinds:
                     key = '%s-%s-%s' % (kind, imt, poe)
-                    rec[key] = arr[kind][sid, ..., m, p, :] @ ws
+                    rec[key] = arr[kind][..., m, p, :] @ ws
                 rec['iml-%s-%s' % (imt, poe)] = hmap3[sid, m, p]
     return ArrayWrapper(out, dict(mag=edges[0], dist=edges[1], eps=edges[-2],
                                   trt=numpy.array(encode(edges[-1]))))
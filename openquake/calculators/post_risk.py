@@ -277,6 +277,9 @@ def get_loss_id(ext_loss_types):
 # launch Starmap building the aggcurves and store them
 def store_aggcurves(oq, agg_ids, rbe_df, builder, loss_cols,
                     events, num_events, dstore):
+    """
+    Build the aggcurves in parallel and store them
+    """
     aggtypes = oq.aggregate_loss_curves_types
     logging.info('Building aggcurves')
     units = dstore['exposure'].cost_calculator.get_units(oq.loss_types)
@@ -286,14 +289,23 @@ def store_aggcurves(oq, agg_ids, rbe_df, builder, loss_cols,
             year = ()
     except ValueError:  # missing in case of GMFs from CSV
         year = ()
-    items = []
-    for agg_id in agg_ids:
-        gb = rbe_df[rbe_df.agg_id == agg_id].groupby(['rlz_id', 'loss_id'])
-        for (rlz_id, loss_id), df in gb:
+    # without years only the largest losses are needed to build the curves,
+    # so the data sent to the tasks can be truncated with a partial sort
+    k = 0 if len(year) else scientific.num_top_losses(
+        builder.return_periods, builder.eff_time)
+    groups = {}
+    for key, df in rbe_df.groupby(['agg_id', 'rlz_id', 'loss_id']):
+        if len(year):
             data = {col: df[col].to_numpy() for col in loss_cols}
-            if len(year):
-                data['year'] = year[df.event_id.to_numpy()]
-            items.append([(agg_id, rlz_id, loss_id), data])
+            data['year'] = year[df.event_id.to_numpy()]
+        else:
+            data = {col: scientific.top_losses(df[col].to_numpy(), k)
+                    for col in loss_cols}
+        groups[key] = data
+    # keep the aggregation keys in the order of agg_ids
+    pos = {agg_id: i for i, agg_id in enumerate(agg_ids)}
+    items = [[key, groups[key]] for key in sorted(
+        groups, key=lambda key: (pos[key[0]],) + key[1:])]
     dstore.swmr_on()
     dic = parallel.Starmap.apply(
         build_aggcurves, (items, builder, num_events, aggtypes),
@@ -329,9 +341,13 @@ def compute_aggrisk(dstore, oq, rbe_df, num_events, agg_ids):
         aggnumber = dstore['agg_values']['number']
     acc = general.AccumDict(accum=[])
     quantiles = general.AccumDict(accum=([], []))
+    # group once instead of filtering the full table for each agg_id
+    groups = general.AccumDict(accum=[])  # agg_id -> [(rlz, loss, df), ...]
+    for (agg_id, rlz_id, loss_id), df in rbe_df.groupby(
+            ['agg_id', 'rlz_id', 'loss_id']):
+        groups[agg_id].append((rlz_id, loss_id, df))
     for agg_id in agg_ids:
-        gb = rbe_df[rbe_df.agg_id == agg_id].groupby(['rlz_id', 'loss_id'])
-        for (rlz_id, loss_id), df in gb:
+        for rlz_id, loss_id, df in groups[agg_id]:
             ne = num_events[rlz_id]
             acc['agg_id'].append(agg_id)
             acc['rlz_id'].append(rlz_id)
@@ -559,18 +575,31 @@ class PostRiskCalculator(base.RiskCalculator):
                 dstore = self.datastore
             ct = oq.concurrent_tasks or 1
 
-            # now aggregate risk_by_event by policy
-            allargs = [(dstore, pdf, self.treaty_df, loss_id)
-                       for pdf in numpy.array_split(self.policy_df, ct)]
+            # each task reads its own range of events from risk_by_event,
+            # aggregates by policy and applies the treaties, since they
+            # act event by event; the results are saved as they come
+            E = len(self.datastore['events'])
+            edges = numpy.linspace(0, E, min(ct, E) + 1).astype(int)
+            allargs = [(dstore, self.policy_df, self.treaty_df, loss_id,
+                        (e0, e1)) for e0, e1 in zip(edges[:-1], edges[1:])]
             self.datastore.swmr_on()
-            smap = parallel.Starmap(reinsurance.reins_by_policy, allargs,
+            smap = parallel.Starmap(reinsurance.reins_by_event, allargs,
                                     h5=self.datastore.hdf5)
-            rbp = pandas.concat(list(smap))
-            if len(rbp) == 0:
+            for res in smap:
+                self.datastore.hdf5.extend_df(
+                    'reinsurance_by_policy', res['rbp'])
+                self.datastore.hdf5.extend_df(
+                    'reinsurance-risk_by_event', res['rbe'])
+            if 'reinsurance_by_policy' not in self.datastore.hdf5:
                 raise ValueError('No data in risk_by_event for %r' % lt)
-            rbe = reinsurance.by_event(rbp, self.treaty_df, self._monitor)
-            self.datastore.create_df('reinsurance_by_policy', rbp)
-            self.datastore.create_df('reinsurance-risk_by_event', rbe)
+            # the overspill columns are discovered task by task: list them
+            # in the order of the treaties, as in by_event
+            attrs = self.datastore.hdf5['reinsurance-risk_by_event'].attrs
+            cols = attrs['__pdcolumns__'].split()
+            over = [col for col in reinsurance.overcols(self.treaty_df.code)
+                    if col in cols]
+            attrs['__pdcolumns__'] = ' '.join(
+                [col for col in cols if col not in over] + over)
 
         if oq.investigation_time and oq.return_periods != [0]:
             # setting return_periods = 0 disable loss curves
@@ -21,16 +21,18 @@ from unittest import mock
 import numpy
 from openquake.baselib import hdf5
 from openquake.baselib.general import gettemp
+from openquake.hazardlib import InvalidFile
 from openquake.hazardlib.contexts import read_ctx_by_grp
 from openquake.calculators.views import view, text_table
 from openquake.calculators.export import export
-from openquake.calculators.extract import extract
+from openquake.calculators.extract import extract, read_disagg
 from openquake.calculators.tests import CalculatorTestCase, strip_calc_id
 from openquake.qa_tests_data.disagg import (
     case_1, case_2, case_3, case_4, case_5, case_6, case_7, case_8, case_9,
     case_10, case_11, case_12, case_13, case_14, case_15, case_16, case_master)
 
 aae = numpy.testing.assert_almost_equal
+aac = numpy.testing.assert_allclose
 ae = numpy.testing.assert_equal
 
 RLZCOL = re.compile(r'rlz\d+')
@@ -92,6 +94,42 @@ class DisaggregationTestCase(CalculatorTestCase):
         numpy.testing.assert_equal(sitecol.vs30measured, [0, 1])
         numpy.testing.assert_equal(sitecol.backarc, [0, 1])
 
+    def test_case_2_in_classical(self):
+        # the histograms are computed in the classical pass; with a single
+        # intensity there is no interpolation and the results are the same
+        self.run_calc(case_2.__file__, 'job.ini', disagg_in_classical='true')
+        self.assertIn('disagg_hist', self.calc.datastore)
+        got = export(('disagg-rlzs', 'csv'), self.calc.datastore)
+        for fname, actual in zip(['Mag-0.csv', 'Mag-1.csv'], got):
+            self.assertEqualFiles('expected_output/%s' % fname, actual)
+
+    def test_case_1_in_classical(self):
+        # with poes_disagg the histograms are interpolated between the
+        # hazard levels, so the results are only close to the dense ones:
+        # the differences are below 2.5% of the largest probability
+        outputs = 'Mag Mag_Dist'
+        self.run_calc(case_1.__file__, 'job.ini', disagg_outputs=outputs)
+        dense = {key: dset[()] for key, dset in
+                 self.calc.datastore['disagg-rlzs'].items()}
+        self.run_calc(case_1.__file__, 'job.ini', disagg_outputs=outputs,
+                      disagg_in_classical='true')
+        for key, expected in dense.items():
+            got = self.calc.datastore['disagg-rlzs/' + key][()]
+            aac(got, expected, atol=.025 * expected.max())
+
+        # Lon/Lat outputs are rejected
+        with self.assertRaises(ValueError) as ctx:
+            self.run_calc(case_1.__file__, 'job.ini',
+                          disagg_outputs='Mag Lon_Lat',
+                          disagg_in_classical='true')
+        self.assertIn('disagg_in_classical', str(ctx.exception))
+
+        # non-Poissonian sources are rejected
+        with self.assertRaises(InvalidFile) as ctx:
+            self.run_calc(case_8.__file__, 'job.ini',
+                          disagg_in_classical='true')
+        self.assertIn('non-Poissonian source', str(ctx.exception))
+
     def test_case_3(self):
         # a case with poes_disagg too large
         with self.assertRaises(SystemExit) as ctx:
@@ -277,3 +315,32 @@ class DisaggregationTestCase(CalculatorTestCase):
             if 'Mag_Dist' in fname and 'Eps' not in fname:
                 self.assertEqualFiles(
                     'expected_output/%s' % strip_calc_id(fname), fname)
+
+    def test_case_master_sparse(self):
+        # same as case_master, but storing the matrices in COO format
+        self.run_calc(case_master.__file__, 'job.ini', disagg_sparse='true')
+        dstore = self.calc.datastore
+        self.assertTrue(dstore['disagg-stats/Mag'].attrs['sparse'])
+        # reading a single site gives the same as expanding all sites
+        dset = dstore['disagg-rlzs/Mag_Dist_Eps']
+        full = read_disagg(dset)
+        for sid in range(len(full)):
+            numpy.testing.assert_equal(read_disagg(dset, sid), full[sid])
+        fname = gettemp(text_table(view('mean_disagg', self.calc.datastore)))
+        self.assertEqualFiles('expected/mean_disagg.rst', fname)
+        os.remove(fname)
+
+        fnames = export(('disagg-stats', 'csv'), self.calc.datastore)
+        self.assertEqual(len(fnames), 22)
+        for fname in fnames:
+            if 'Mag_Dist' in fname and 'Eps' not in fname:
+                self.assertEqualFiles(
+                    'expected_output/%s' % strip_calc_id(fname), fname)
+
+        # the dense matrix of a single magnitude bin is checked
+        with mock.patch(
+                'openquake.calculators.disaggregation.MAX_TASK_MATRIX', 100):
+            with self.assertRaises(ValueError) as ctx:
+                self.run_calc(case_master.__file__, 'job.ini',
+                              disagg_sparse='true')
+        self.assertIn('single magnitude bin is too large', str(ctx.exception))
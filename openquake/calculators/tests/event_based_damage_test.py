@@ -86,6 +86,31 @@ class EventBasedDamageTestCase(CalculatorTestCase):
         self.run_calc(case_12.__file__, 'job_d.ini')
         self.check_damages('d_damage_table.txt', 'd_damages.txt')
 
+    def test_case_12e(self):
+        # test event_based_damage, aggregate_by=taxonomy, with a taxonomy
+        # UD getting ground motion but no damage;
+        # discrete_damage_distribution = true
+        self.run_calc(case_12.__file__, 'job_e.ini')
+        aggrisk = self.calc.datastore.read_df('aggrisk', 'agg_id')
+        keys = list(self.calc.datastore['agg_keys'][:])
+        ud = aggrisk.loc[keys.index(b'UD')]
+        self.assertEqual(ud.dmg_0, 20)
+        self.assertEqual(ud.dmg_1, 0)
+        self.assertEqual(ud.dmg_2, 0)
+
+        # the aggregation keys are the same as with float damages
+        self.run_calc(case_12.__file__, 'job_e.ini',
+                      discrete_damage_distribution='false')
+        df = self.calc.datastore.read_df('aggrisk', 'agg_id')
+        self.assertEqual(sorted(aggrisk.index), sorted(df.index))
+
+    def test_counter_based_rng(self):
+        # the counter based RNG does not support the damage calculators
+        with self.assertRaises(ValueError) as ctx:
+            self.run_calc(case_12.__file__, 'job_a.ini',
+                          counter_based_rng='true')
+        self.assertIn('counter_based_rng', str(ctx.exception))
+
     def test_case_13a(self):
         # test event_based_damage, no aggregate_by
         self.run_calc(case_13.__file__, 'job_a.ini')
@@ -85,6 +85,19 @@ class EventBasedRiskTestCase(CalculatorTestCase):
             self.assertEqualFiles('expected/%s' % strip_calc_id(fname), fname,
                                   delta=1E-5)
 
+    def test_case_1_top_losses(self):
+        # the aggcurves built from the top losses only must be the same
+        # as the ones built from all the losses
+        self.run_calc(case_01.__file__, 'job.ini')
+        df = self.calc.datastore.read_df('aggcurves')
+        with mock.patch('openquake.risklib.scientific.num_top_losses',
+                        return_value=0):
+            self.run_calc(case_01.__file__, 'job.ini')
+        full = self.calc.datastore.read_df('aggcurves')
+        self.assertEqual(list(df.columns), list(full.columns))
+        for col in df.columns:
+            aac(df[col].to_numpy(), full[col].to_numpy(), rtol=1E-6)
+
     def test_case_1_missing_occupancy(self):
         with self.assertRaises(InvalidFile) as ctx:
             self.run_calc(case_01.__file__, 'job_missing_occupancy.ini')
@@ -201,6 +214,15 @@ agg_id
         loss2 = view('portfolio_losses', self.calc.datastore)
         self.assertEqual(loss0, loss2)
 
+        # same with the counter based random generator
+        self.run_calc(case_1f.__file__, 'job.ini', concurrent_tasks='0',
+                      counter_based_rng='true')
+        loss0 = view('portfolio_losses', self.calc.datastore)
+        self.run_calc(case_1f.__file__, 'job.ini', concurrent_tasks='2',
+                      counter_based_rng='true')
+        loss2 = view('portfolio_losses', self.calc.datastore)
+        self.assertEqual(loss0, loss2)
+
     def test_case_1g(self):
         # vulnerability function with PMF
         self.run_calc(case_1g.__file__, 'job_h.ini,job_r.ini')
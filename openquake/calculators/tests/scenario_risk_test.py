@@ -293,6 +293,25 @@ class ScenarioRiskTestCase(CalculatorTestCase):
         [fname] = export(('realizations', 'csv'), self.calc.datastore)
         self.assertEqualFiles('expected/realizations.csv', fname)
 
+    def test_case_shakemap_streaming(self):
+        self.run_calc(case_shakemap.__file__, 'pre-job.ini')
+        hc_id = str(self.calc.datastore.calc_id)
+
+        # with a single chunk the GMFs are the same as without streaming
+        self.run_calc(case_shakemap.__file__, 'job.ini',
+                      hazard_calculation_id=hc_id, shakemap_gmfs_per_task='3')
+        [fname] = export(('aggrisk', 'csv'), self.calc.datastore)
+        self.assertEqualFiles('expected/agglosses.csv', fname)
+
+        # with 2 chunks the GMFs are stored incrementally
+        self.run_calc(case_shakemap.__file__, 'job.ini',
+                      hazard_calculation_id=hc_id, shakemap_gmfs_per_task='2')
+        df = self.calc.datastore.read_df('gmf_data')
+        self.assertEqual(len(df), 18)  # 6 sites x 3 events
+        avg_gmf = self.calc.datastore['avg_gmf'][0]
+        aac(avg_gmf[df.sid.unique()], df.groupby('sid')[
+            ['PGA', 'SA(0.3)', 'SA(1.0)']].mean().to_numpy(), rtol=1E-5)
+
     def test_case_shapefile(self):
         self.run_calc(case_shapefile.__file__, 'prepare_job.ini')
         pre_id = str(self.calc.datastore.calc_id)
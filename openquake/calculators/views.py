@@ -46,7 +46,8 @@ from openquake.risklib.scientific import (
 from openquake.baselib.writers import build_header, scientificformat
 from openquake.calculators.getters import (
     get_ebrupture, MapGetter, get_pmaps_gb)
-from openquake.calculators.extract import extract
+from openquake.calculators.extract import (
+    extract, read_disagg, read_disagg_idx)
 
 TWO24 = 2**24
 F32 = numpy.float32
@@ -987,14 +988,17 @@ def view_mean_disagg(token, dstore):
     """
     N, _M, P = dstore['hmap3'].shape
     tbl = []
-    kd = {key: dset[:] for key, dset in sorted(dstore['disagg-rlzs'].items())}
+    kd = dict(sorted(dstore['disagg-rlzs'].items()))
+    idxs = {key: read_disagg_idx(dset) for key, dset in kd.items()}
     oq = dstore['oqparam']
     for s in range(N):
+        # expand the matrices one site at the time
+        arr = {k: read_disagg(d, s, idxs[k]) for k, d in kd.items()}
         for m, imt in enumerate(oq.imtls):
             for p in range(P):
                 row = ['%s-sid-%d-poe-%s' % (imt, s, p)]
-                for k, d in kd.items():
-                    row.append(d[s, ..., m, p, :].mean())
+                for k, d in arr.items():
+                    row.append(d[..., m, p, :].mean())
                 tbl.append(tuple(row))
     return numpy.array(sorted(tbl), dt(['key'] + list(kd)))
 
@@ -1009,9 +1013,9 @@ def view_disagg(token, dstore):
     assert kind in ('Mag', 'Dist', 'TRT'), kind
     site_id = 0
     if 'disagg-stats' in dstore:
-        data = dstore['disagg-stats/' + kind][site_id, ..., 0]  # (:, M, P)
+        data = read_disagg(dstore['disagg-stats/' + kind], site_id)[..., 0]
     else:
-        data = dstore['disagg-rlzs/' + kind][site_id, ..., 0]  # (:, M, P)
+        data = read_disagg(dstore['disagg-rlzs/' + kind], site_id)[..., 0]
     Ma, M, P = data.shape
     oq = dstore['oqparam']
     imts = list(oq.imtls)
@@ -1195,7 +1199,8 @@ def view_calc_risk(token, dstore):
         rng = None
     else:
         rng = ebr.MultiEventRNG(oq.master_seed, gmf_df.eid.unique(),
-                                int(oq.asset_correlation))
+                                int(oq.asset_correlation),
+                                oq.counter_based_rng)
 
     mon = Monitor()
     outs = []  # ebr.gen_outputs(gmf_df, crmodel, rng, mon)
@@ -28,7 +28,7 @@ from openquake.calculators.base import calculators, store_gmfs
 # see qa_tests_data/scenario/case_21
 def main(id, site_model, *, num_gmfs: int = 0, random_seed: int = 42,
          trunclevel: float = 3, spatialcorr='yes', crosscorr='yes',
-         cholesky_limit: int = 10_000):
+         cholesky_limit: int = 10_000, gmfs_per_task: int = 0):
     """
     Given a shakemap ID and a path to a site_model.csv file build a
     GMFs array corresponding to num_gmfs events. The user can pass
@@ -47,6 +47,7 @@ def main(id, site_model, *, num_gmfs: int = 0, random_seed: int = 42,
                  truncation_level=str(trunclevel),
                  calculation_mode='scenario',
                  random_seed=str(random_seed),
+                 shakemap_gmfs_per_task=str(gmfs_per_task),
                  inputs={'job_ini': '<memory>',
                          'site_model': [os.path.abspath(site_model)]})
     with logs.init(param) as log:
@@ -82,3 +83,4 @@ main.trunclevel = 'Truncation level'
 main.spatialcorr = 'Spatial correlation'
 main.crosscorr = 'Cross correlation among IMTs'
 main.cholesky_limit = 'Cholesky Limit'
+main.gmfs_per_task = 'If nonzero, generate the GMFs in parallel chunks'
@@ -399,6 +399,29 @@ def build_slice_by_event(eids, offset=0):
     return sbe
 
 
+def read_slice_by_event(eid_dset, chunksize):
+    """
+    Build the slice_by_event index by reading the event IDs in chunks,
+    without keeping the full `gmf_data/eid` column in memory.
+
+    :param eid_dset: the dataset `gmf_data/eid` (or an array)
+    :param chunksize: number of rows read at once
+    :returns: an array of dtype slice_dt ordered by start
+    """
+    sbes = [build_slice_by_event(eid_dset[slc], slc.start)
+            for slc in general.gen_slices(0, len(eid_dset), chunksize)]
+    sbe = numpy.concatenate(sbes, dtype=slice_dt)
+    # merge the events spanning the chunk boundaries
+    same = sbe['eid'][1:] == sbe['eid'][:-1]
+    if same.any():
+        first = numpy.concatenate([[True], ~same])
+        last = numpy.concatenate([~same, [True]])
+        stop = sbe['stop'][last]
+        sbe = sbe[first]
+        sbe['stop'] = stop
+    return sbe
+
+
 def get_counts(idxs, N):
     """
     :param idxs: indices in the range 0..N-1
@@ -415,11 +438,14 @@ def split(sbe, max_gmvs_chunk):
     """
     :yield: blocks of slices by event
     """
-    dic = general.AccumDict(accum=[])
-    for rec in sbe:
-        dic[rec['stop'] // max_gmvs_chunk].append(rec)
-    for recs in dic.values():
-        yield numpy.array(recs, sbe[0].dtype)
+    sbe = numpy.array(sbe, sbe[0].dtype)  # sbe can be a list of records
+    keys = sbe['stop'] // max_gmvs_chunk
+    _uniq, first, inv, counts = numpy.unique(
+        keys, return_index=True, return_inverse=True, return_counts=True)
+    blocks = numpy.split(sbe[numpy.argsort(inv, kind='stable')],
+                         numpy.cumsum(counts)[:-1])
+    for k in numpy.argsort(first):  # keep the original order
+        yield blocks[k]
 
 
 def count_outputs(eids, sbe, maxw, weight,
@@ -480,9 +506,12 @@ def starmap_from_gmfs(task_func, oq, dstore, mon):
         try:
             sbe = data['slice_by_event'][:]
         except KeyError:
-            eids = data['eid'][:]
-            sbe = build_slice_by_event(eids)
-            assert len(sbe) == len(numpy.unique(eids))  # sanity check
+            sbe = read_slice_by_event(
+                data['eid'], int(config.memory.max_gmvs_chunk))
+            # sanity check: the GMFs must be ordered by event
+            assert len(sbe) == len(numpy.unique(sbe['eid']))
+            if ds is dstore:  # store the index, to be reused by the children
+                dstore['gmf_data/slice_by_event'] = sbe
         slices = []
         logging.info('Reading event weights')
         for slc in general.gen_slices(0, len(sbe), 100_000):
@@ -132,6 +132,22 @@ gmf_max_gb:
   Example: *gmf_max_gb = 1.*
   Default: 0.1
 
+att_curves_distance:
+  Used in classical calculations. Beyond this distance (in km) the mean and
+  standard deviations are interpolated on attenuation curves computed on a
+  few nodes instead of being computed on all the contexts. Useful with
+  expensive GSIMs and many sites. Can be a dictionary by tectonic region type.
+  Example: *att_curves_distance = 200*.
+  Default: 0, meaning no interpolation
+
+att_curves_tolerance:
+  Used in conjunction with *att_curves_distance*: maximum estimated
+  interpolation error on the mean (in natural log units) and on the
+  standard deviations; the groups of contexts exceeding it are computed
+  exactly.
+  Example: *att_curves_tolerance = 0.005*.
+  Default: 0.01
+
 avg_losses:
   Used in risk calculations to compute average losses.
   Example: *avg_losses=false*.
@@ -169,6 +185,13 @@ correlation_cutoff:
   Example: *correlation_cutoff = 1E-11*
   Default: 1E-12
 
+compact_sections:
+  Used in calculations with multi-fault sources. If set, the sections are
+  built on compact meshes with float32 cartesian coordinates, using half
+  of the memory; the distances change by less than 10 meters.
+  Example: *compact_sections = true*.
+  Default: False
+
 compare_with_classical:
   Used in event based calculation to perform also a classical calculation,
   so that the hazard curves can be compared.
@@ -210,6 +233,16 @@ coordinate_bin_width:
   Example: *coordinate_bin_width = 1.0*.
   Default: 100 degrees, meaning don't disaggregate by lon, lat
 
+counter_based_rng:
+  Used in event based risk calculations with vulnerability functions with
+  coefficients of variation. If set, the epsilons are generated with a
+  counter-based random generator keyed by (master_seed, event, asset) and
+  by the loss type and vulnerability function, so that the losses do not
+  depend on how the calculation is split in tasks. Not supported by the
+  damage calculators, which sample the damage states per event.
+  Example: *counter_based_rng = true*.
+  Default: False
+
 countries:
   Used to restrict the exposure to a single country in Aristotle mode.
   Example: *countries = ITA*.
@@ -240,6 +273,22 @@ disagg_by_src:
   Example: *disagg_by_src = true*.
   Default: False
 
+disagg_in_classical:
+  Flag used in disaggregation calculations to accumulate the magnitude,
+  distance and epsilon histograms during the classical pass, so that the
+  contexts are not built twice; the histograms are interpolated at the
+  iml_disagg or poes_disagg levels. Lon/Lat outputs are not supported,
+  so disagg_outputs must be set without them.
+  Example: *disagg_in_classical = true*.
+  Default: False
+
+disagg_sparse:
+  Flag used in disaggregation calculations to accumulate and store the
+  disaggregation matrices in sparse (COO) format, so that fine lon/lat
+  bins can be used without running out of memory.
+  Example: *disagg_sparse = true*.
+  Default: False
+
 disagg_outputs:
   Used in disaggregation calculations to restrict the number of exported
   outputs.
@@ -333,7 +382,13 @@ ground_motion_correlation_model:
   Default: None
 
 ground_motion_correlation_params:
-  To be used together with ground_motion_correlation_model.
+  To be used together with ground_motion_correlation_model. For large
+  site collections you can replace the full Cholesky factorization with
+  "method": "vecchia", conditioning each site on its nearest
+  "neighbors" (default 16), or with "method": "nystrom", a low-rank
+  approximation with a number of "landmarks" (default 1000); in that
+  case max_sites_correl is not enforced and the estimated error on the
+  correlations is logged.
   Example: *ground_motion_correlation_params = {"vs30_clustering": False}*.
   Default: empty dictionary
 
@@ -490,7 +545,8 @@ max_potential_paths:
   Default: 15_000
 
 max_sites_correl:
-  Maximum number of sites for GMF-correlation.
+  Maximum number of sites for GMF-correlation with the (default)
+  cholesky method.
   Example: *max_sites_correl = 2000*
   Default: 1200
 
@@ -731,6 +787,13 @@ ses_seed:
   Example: *ses_seed = 123*.
   Default: 42
 
+shakemap_gmfs_per_task:
+  Used in ShakeMap calculations. If nonzero, the GMFs are generated in
+  parallel in chunks of the given number of events, and stored
+  incrementally, instead of being built all in memory.
+  Example: *shakemap_gmfs_per_task = 100*.
+  Default: 0
+
 shakemap_id:
   Used in ShakeMap calculations to download a ShakeMap from the USGS site
   Example: *shakemap_id = usp000fjta*.
@@ -1024,6 +1087,8 @@ class OqParam(valid.ParamSet):
     asset_correlation = valid.Param(valid.Choice('0', '1'), 0)
     asset_life_expectancy = valid.Param(valid.positivefloat)
     assets_per_site_limit = valid.Param(valid.positivefloat, 1000)
+    att_curves_distance = valid.Param(valid.floatdict, {'default': 0})
+    att_curves_tolerance = valid.Param(valid.positivefloat, .01)
     avg_losses = valid.Param(valid.boolean, True)
     base_path = valid.Param(valid.utf8, '.')
     calculation_mode = valid.Param(valid.Choice(*ALL_CALCULATORS))
@@ -1031,10 +1096,12 @@ class OqParam(valid.ParamSet):
     collapse_level = valid.Param(int, -1)
     collect_rlzs = valid.Param(valid.boolean, None)
     coordinate_bin_width = valid.Param(valid.positivefloat, 100.)
+    compact_sections = valid.Param(valid.boolean, False)
     compare_with_classical = valid.Param(valid.boolean, False)
     concurrent_tasks = valid.Param(valid.positiveint, Starmap.CT)
     conditional_loss_poes = valid.Param(valid.probabilities, [])
     continuous_fragility_discretization = valid.Param(valid.positiveint, 20)
+    counter_based_rng = valid.Param(valid.boolean, False)
     countries = valid.Param(valid.namelist, ())
     cross_correlation = valid.Param(valid.utf8_not_empty, 'yes')
     cholesky_limit = valid.Param(valid.positiveint, 10_000)
@@ -1042,7 +1109,9 @@ class OqParam(valid.ParamSet):
     cache_distances = valid.Param(valid.boolean, False)
     description = valid.Param(valid.utf8_not_empty, "no description")
     disagg_by_src = valid.Param(valid.boolean, False)
+    disagg_in_classical = valid.Param(valid.boolean, False)
     disagg_outputs = valid.Param(valid.disagg_outputs, list(valid.pmf_map))
+    disagg_sparse = valid.Param(valid.boolean, False)
     disagg_bin_edges = valid.Param(valid.dictionary, {})
     discard_assets = valid.Param(valid.boolean, False)
     discard_trts = valid.Param(str, '')  # tested in the cariboo example
@@ -1150,6 +1219,7 @@ class OqParam(valid.ParamSet):
     ses_per_logic_tree_path = valid.Param(
         valid.compose(valid.nonzero, valid.positiveint), 1)
     ses_seed = valid.Param(valid.positiveint, 42)
+    shakemap_gmfs_per_task = valid.Param(valid.positiveint, 0)
     shakemap_id = valid.Param(valid.nice_string, None)
     # example: shakemap_uri = {'kind': 'usgs_id', 'id': 'XXX'}
     shakemap_uri = valid.Param(valid.dictionary, {})
@@ -2029,6 +2099,25 @@ class OqParam(valid.ParamSet):
             return self.ps_grid_spacing == 0
         return True
 
+    def is_valid_disagg_in_classical(self):
+        """
+        disagg_in_classical does not support the Lon and Lat outputs,
+        so disagg_outputs must be set without them
+        """
+        if self.disagg_in_classical:
+            return not any('Lon' in out or 'Lat' in out
+                           for out in self.disagg_outputs)
+        return True
+
+    def is_valid_counter_based_rng(self):
+        """
+        counter_based_rng is supported only for the risk calculators
+        sampling the vulnerability functions, not for the damage calculators
+        """
+        if self.counter_based_rng:
+            return not self.calculation_mode.endswith('_damage')
+        return True
+
     def is_valid_concurrent_tasks(self):
         """
         At most you can use 30_000 tasks
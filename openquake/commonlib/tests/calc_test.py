@@ -3,6 +3,7 @@ import numpy
 from openquake.baselib import general
 from openquake.hazardlib.sourceconverter import SourceConverter
 from openquake.hazardlib.map_array import compute_hazard_maps
+from openquake.commonlib import calc
 
 converter = SourceConverter(
     investigation_time=50.,
@@ -64,3 +65,18 @@ class HazardMapsTestCase(unittest.TestCase):
         ]
         actual = compute_hazard_maps(numpy.array(curves), imls, poes)
         aaae(expected, actual.T)
+
+
+class SliceByEventTestCase(unittest.TestCase):
+    def test_read_slice_by_event(self):
+        eids = numpy.array([3, 3, 3, 1, 1, 7, 2, 2, 2, 2], numpy.uint32)
+        expected = calc.build_slice_by_event(eids)
+        for chunksize in (1, 2, 3, 10):
+            sbe = calc.read_slice_by_event(eids, chunksize)
+            numpy.testing.assert_equal(sbe, expected)
+
+    def test_split(self):
+        sbe = calc.build_slice_by_event(
+            numpy.array([3, 3, 3, 1, 1, 7, 2, 2, 2, 2], numpy.uint32))
+        blocks = list(calc.split(sbe, 4))
+        self.assertEqual([list(b['eid']) for b in blocks], [[3], [1, 7], [2]])
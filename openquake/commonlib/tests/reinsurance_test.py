@@ -24,7 +24,7 @@ import unittest
 import tempfile
 import numpy as np
 import pandas
-from openquake.baselib import general, InvalidFile
+from openquake.baselib import general, hdf5, InvalidFile
 from openquake.commonlib import readinput
 from openquake.risklib import reinsurance
 
@@ -307,6 +307,28 @@ event_id,retention,claim,prop1,prop2,wxl1,wxl2,cat1,cat2,cat3,cat4,cat5,over_E,o
             risk_by_event, pol_df, treaty_df)
         assert_ok(byevent, expected)
 
+        # processing the events in chunks gives the same result
+        risk_by_event = _df('''\
+event_id,agg_id,loss
+1,     0,      12000
+1,     1,      5000
+1,     2,      3000
+1,     3,      12000
+1,     4,      5000
+1,     5,      3000
+2,     0,      1000
+2,     3,      500
+3,     5,      20000
+''')
+        _bypolicy, byevent = by_policy_event(
+            risk_by_event, pol_df, treaty_df)
+        with hdf5.File.temporary() as h5:
+            for eid in (1, 2, 3):
+                df = risk_by_event[risk_by_event.event_id == eid]
+                _rbp, rbe = by_policy_event(df, pol_df, treaty_df)
+                h5.extend_df('rbe', rbe)  # missing overspills are zeros
+            assert_ok(h5.read_df('rbe'), byevent)
+
 
 #############################################################################
 #                            VALIDATION TESTS                               #
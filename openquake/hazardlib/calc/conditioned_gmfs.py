@@ -107,10 +107,13 @@ cov_Y_Y_yD:
 """
 
 import logging
+import tempfile
+import functools
 from dataclasses import dataclass
 
 import psutil
 import numpy
+from scipy.linalg import cholesky, solve_triangular
 from openquake.baselib import parallel
 from openquake.hazardlib import correlation, cross_correlation
 from openquake.hazardlib.imt import from_string
@@ -120,6 +123,8 @@ from openquake.hazardlib.geo.geodetic import geodetic_distance
 
 U32 = numpy.uint32
 F32 = numpy.float32
+F64 = numpy.float64
+TILESIZE = 10_000_000  # number of elements in a tile of a NxN matrix
 
 class NoInterIntraStdDevs(Exception):
     def __init__(self, gsim):
@@ -211,9 +216,9 @@ class ConditionedGmfComputer(GmfComputer):
         self.num_events = number_of_ground_motion_fields
 
     # parallelized
-    def get_mea_tau_phi(self, h5):
+    def get_mea_sig(self, h5):
         """
-        :returns: a list of arrays [mea, sig, tau, phi]
+        :returns: a list of arrays [mea, sig] with sig = tau + phi
         """
         return get_mean_covs(
             self.rupture, self.cmaker,
@@ -223,6 +228,32 @@ class ConditionedGmfComputer(GmfComputer):
             self.cross_correl_within,
             sigma=False, h5=h5)
 
+    def get_mea_chol(self, h5):
+        """
+        Factorize the conditioned covariance matrices once, so that the
+        tasks only need a matrix multiplication to sample the GMFs.
+
+        :returns: the arrays [mea, chol], where chol contains the lower
+                  Cholesky factors of tau + phi for each (gsim, IMT)
+        """
+        mea, chol = self.get_mea_sig(h5)
+        if self.cmaker.truncation_level <= 1E-9:  # no random part
+            return [mea, chol]
+        eps = self.cmaker.oq.correlation_cutoff
+        N = chol.shape[-1]
+        for g, gsim in enumerate(self.cmaker.gsims):
+            for m, imt in enumerate(self.imts):
+                # add a cutoff to remove negative eigenvalues
+                chol[g, m].flat[::N + 1] += eps
+                try:
+                    cholesky_blocked(chol[g, m])
+                except Exception as exc:
+                    raise RuntimeError(
+                        '(%s, %s, %s): %s' %
+                        (gsim, imt, exc.__class__.__name__, exc)
+                    ).with_traceback(exc.__traceback__)
+        return [mea, chol]
+
 
 @dataclass
 class TempResult:
@@ -236,7 +267,7 @@ class TempResult:
     native_data_available: bool
     corr_HD_HD: numpy.ndarray = 0
     cov_WD_WD_inv: numpy.ndarray = 0
-    phi_D_diag: numpy.ndarray = 0
+    phi_D: numpy.ndarray = 0
     T_D: numpy.ndarray = 0
     zeta_D: numpy.ndarray = 0
 
@@ -336,11 +367,11 @@ def create_result(g, m, target_imt, target_imts, observed_imts,
 
     # The raw residuals
     t.zeta_D = yD - mu_yD
-    t.phi_D_diag = numpy.diag(phi_D.flatten())
+    t.phi_D = phi_D.flatten()
 
     cov_WD_WD = compute_spatial_cross_covariance_matrix(
         spatial_correl, cross_correl_within, DD,
-        t.conditioning_imts, t.conditioning_imts, t.phi_D_diag, t.phi_D_diag)
+        t.conditioning_imts, t.conditioning_imts, t.phi_D, t.phi_D)
 
     # Add on the additional variance of the residuals
     # for the cases where the station data is uncertain
@@ -368,29 +399,110 @@ def create_result(g, m, target_imt, target_imts, observed_imts,
     return t
 
 
+def get_row_slices(N1, N2):
+    """
+    :returns: slices over N1 rows, with tiles of at most TILESIZE elements
+    """
+    rows = max(1, TILESIZE // max(N2, 1))
+    return [slice(start, min(start + rows, N1))
+            for start in range(0, N1, rows)]
+
+
+def empty_matrix(shape, dtype):
+    """
+    :returns:
+        an empty array or, if it does not fit in the available memory,
+        an array memory-mapped on a temporary file in the scratch directory
+    """
+    nbytes = numpy.prod(shape) * numpy.dtype(dtype).itemsize
+    if nbytes < psutil.virtual_memory().available / 2:
+        return numpy.empty(shape, dtype)
+    logging.warning('Memory-mapping a matrix of shape %s on the scratch '
+                    'directory %s', shape, tempfile.gettempdir())
+    return numpy.memmap(tempfile.TemporaryFile(), dtype, 'w+', shape=shape)
+
+
 def compute_distance_matrix(sites1, sites2):
     """
     :param sites1: N1 sites
     :param sites2: N2 sites
     :returns:
-       a matrix of shape N1 x N2 of float32 distances (~37 GB for 100k sites)
+       a matrix of shape N1 x N2 of float32 distances (~37 GB for 100k sites),
+       computed by tiles and memory-mapped if it does not fit in memory
     """
-    avail_gb = psutil.virtual_memory().available / 1024**3
-    req_gb = len(sites1) * len(sites2) * 8 / 1024**3
-    if req_gb > avail_gb:
-        raise MemoryError('The distance_matrix of shape (%d, %d) is too large!'
-                          % (len(sites1), len(sites2)))
-    distance_matrix = geodetic_distance(
-        sites1.lons.reshape(sites1.lons.shape + (1,)),
-        sites1.lats.reshape(sites1.lats.shape + (1,)),
-        sites2.lons,
-        sites2.lats)
-    return distance_matrix.astype(F32)
+    distance_matrix = empty_matrix((len(sites1), len(sites2)), F32)
+    for sl in get_row_slices(len(sites1), len(sites2)):
+        distance_matrix[sl] = geodetic_distance(
+            sites1.lons[sl, None], sites1.lats[sl, None],
+            sites2.lons, sites2.lats)
+    return distance_matrix
+
+
+def compute_conditioned_within_covariance(
+        spatial_correl, target_imt, sites, phi_Y, RC, cov_WD_WY):
+    """
+    Compute the conditioned within-event covariance matrix for the target
+    sites, cov_WY_WY - RC @ cov_WD_WY clipped to zero, by tiles of rows
+    computed on the fly, without storing the distance matrix of the
+    target sites.
+
+    :param spatial_correl: a spatial correlation model
+    :param target_imt: the target IMT
+    :param sites: N target sites
+    :param phi_Y: N within-event standard deviations
+    :param RC: regression coefficient matrix of shape (N, D)
+    :param cov_WD_WY: covariance matrix of shape (D, N)
+    :yields: pairs (slice, tile) with tiles of shape (rows, N)
+    """
+    if isinstance(spatial_correl, correlation.HM2018CorrelationModel):
+        # draw beta once, otherwise each tile would use a different one
+        beta = correlation.hm_beta(
+            target_imt, spatial_correl.uncertainty_multiplier)
+        get_rho = functools.partial(
+            correlation.hmcorrelation, imt=target_imt, beta=beta)
+    else:
+        get_rho = functools.partial(
+            spatial_correl._get_correlation_matrix, imt=target_imt)
+    N = len(sites)
+    for sl in get_row_slices(N, N):
+        dist = geodetic_distance(
+            sites.lons[sl, None], sites.lats[sl, None],
+            sites.lons, sites.lats).astype(F32)
+        rho = get_rho(dist)
+        yield sl, (phi_Y[sl, None] * rho * phi_Y - RC[sl] @ cov_WD_WY).clip(
+            min=0)
+
+
+def cholesky_blocked(cov, blocksize=1024):
+    """
+    Compute in place the lower Cholesky factor of a positive-definite matrix,
+    by working on blocks of columns; the temporary arrays have at most
+    N x blocksize elements, so that the matrix can be memory-mapped.
+
+    :param cov: a symmetric matrix of shape (N, N), overwritten
+    :returns: the lower triangular factor L, with cov = L @ L.T
+    """
+    N = len(cov)
+    for start in range(0, N, blocksize):
+        stop = min(start + blocksize, N)
+        diag = cholesky(cov[start:stop, start:stop], lower=True)
+        cov[start:stop, start:stop] = diag
+        cov[start:stop, stop:] = 0
+        if stop == N:
+            break
+        # L21 = A21 @ inv(L11).T
+        cov[stop:, start:stop] = solve_triangular(
+            diag, cov[stop:, start:stop].T, lower=True).T
+        # update the lower part of the trailing matrix, by blocks
+        for j in range(stop, N, blocksize):
+            k = min(j + blocksize, N)
+            cov[j:, j:k] -= cov[j:, start:stop] @ cov[j:k, start:stop].T
+    return cov
 
 
 def compute_spatial_cross_covariance_matrix(
         spatial_correl, cross_correl_within, distance_matrix,
-        imts1, imts2, diag1, diag2):
+        imts1, imts2, phi1, phi2):
     # The correlation structure for IMs of differing types at differing
     # locations can be reasonably assumed as Markovian in nature, and we
     # assume here that the correlation between differing IMs at differing
@@ -402,7 +514,8 @@ def compute_spatial_cross_covariance_matrix(
         _compute_spatial_cross_correlation_matrix(
             imt_1, imt_2, spatial_correl, cross_correl_within, distance_matrix)
         for imt_2 in imts2] for imt_1 in imts1])
-    return numpy.linalg.multi_dot([diag1, rho, diag2])
+    # same as diag(phi1) @ rho @ diag(phi2), without the diagonal matrices
+    return phi1[:, None] * rho * phi2
 
 
 # In scenario/case_21 one has
@@ -415,7 +528,7 @@ def compute_spatial_cross_covariance_matrix(
 def get_mu_tau_phi(target_imt, gsim, mean_stds,
                    target_imts, observed_imts, station_data,
                    target_sitecol, station_sitecol, spatial_correl,
-                   cross_correl_within, r, monitor):
+                   cross_correl_within, r, sigma, monitor):
     # Using Bayes rule, compute the posterior distribution of the
     # normalized between-event residual H|YD=yD, employing
     # Engler et al. (2022), eqns B8 and B9 (also B18 and B19),
@@ -447,7 +560,7 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
 
     # Predicted uncertainty components at the target sites, from GSIM
     tau_Y = mean_stds[2, 0][:, None]
-    phi_Y_diag = numpy.diag(mean_stds[3, 0])
+    phi_Y = mean_stds[3, 0]
 
     # Compute the within-event covariance matrices for the
     # target sites and observation sites; the shapes are 
@@ -455,12 +568,12 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
     with monitor.shared['YD'] as YD:
         cov_WY_WD = compute_spatial_cross_covariance_matrix(
             spatial_correl, cross_correl_within, YD,
-            [target_imt], r.conditioning_imts, phi_Y_diag, r.phi_D_diag)
+            [target_imt], r.conditioning_imts, phi_Y, r.phi_D)
 
     with monitor.shared['DY'] as DY:
         cov_WD_WY = compute_spatial_cross_covariance_matrix(
             spatial_correl, cross_correl_within, DY,
-            r.conditioning_imts, [target_imt], r.phi_D_diag, phi_Y_diag)
+            r.conditioning_imts, [target_imt], r.phi_D, phi_Y)
 
     # Compute the regression coefficient matrix [cov_WY_WD × cov_WD_WD_inv]
     RC = cov_WY_WD @ r.cov_WD_WD_inv  # shape (nsites, nstations)
@@ -473,22 +586,7 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
     # Compute the conditioned mean of the ground motion
     # at the target sites; shape (nsites, 1)
     mu_Y_yD = mu_Y + tau_Y @ mu_HD_yD[0, None] + RC @ (r.zeta_D - mu_BD_yD)
-
-    # Compute the within-event covariance matrix for the
-    # target sites (apriori) (nsites, nsites)
-    
-    with monitor.shared['YY'] as YY:
-        cov_WY_WY = compute_spatial_cross_covariance_matrix(
-            spatial_correl, cross_correl_within, YY,
-            [target_imt], [target_imt], phi_Y_diag, phi_Y_diag)
-
-    # Both conditioned covariance matrices can contain extremely
-    # small negative values due to limitations of floating point
-    # operations (~ -10^-17 to -10^-15), these are clipped to zero
-
-    # Compute the conditioned within-event covariance matrix
-    # for the target sites clipped to zero, shape (nsites, nsites)
-    cov_WY_WY_wD = (cov_WY_WY - RC @ cov_WD_WY).clip(min=0)
+    yield dict(g=r.g, m=r.m, mu=mu_Y_yD, msg=msg)
 
     # Compute the scaling matrix "C" for the conditioned between-event
     # covariance matrix
@@ -498,25 +596,41 @@ def get_mu_tau_phi(target_imt, gsim, mean_stds,
         zeros = numpy.zeros((len(target_sitecol), len(r.conditioning_imts)))
         C = numpy.block([tau_Y, zeros]) - RC @ r.T_D
 
-    # Compute the conditioned between-event covariance matrix
-    # for the target sites clipped to zero, shape (nsites, nsites)
-    cov_BY_BY_yD = numpy.linalg.multi_dot([C, cov_HD_HD_yD, C.T]).clip(min=0)
-    return {(r.g, r.m): (mu_Y_yD, cov_WY_WY_wD, cov_BY_BY_yD, msg)}
+    # Both conditioned covariance matrices can contain extremely
+    # small negative values due to limitations of floating point
+    # operations (~ -10^-17 to -10^-15), these are clipped to zero;
+    # they are sent back by tiles of rows, so that the task never
+    # holds a (nsites, nsites) matrix
+    for sl, cov_WY_WY_wD in compute_conditioned_within_covariance(
+            spatial_correl, target_imt, target_sitecol, phi_Y,
+            RC, cov_WD_WY):
+        # conditioned between-event covariance matrix for the tile
+        cov_BY_BY_yD = (C[sl] @ cov_HD_HD_yD @ C.T).clip(min=0)
+        if sigma:
+            yield dict(g=r.g, m=r.m, sl=sl,
+                       tau=cov_BY_BY_yD, phi=cov_WY_WY_wD)
+        else:
+            cov_BY_BY_yD += cov_WY_WY_wD
+            yield dict(g=r.g, m=r.m, sl=sl, sig=cov_BY_BY_yD)
 
 
 # calls get_mu_tau_phi in parallel
 def get_me_ta_ph(cmaker, sdata, observed_imts, target_imts,
                  mean_stds_D, mean_stds_Y, target, station_filtered,
-                 spatial_correl, cross_correl_within, cross_correl_between, h5):
+                 spatial_correl, cross_correl_within, cross_correl_between, h5,
+                 sigma=True):
     G = len(cmaker.gsims)
     M = len(target_imts)
     N = mean_stds_Y.shape[-1]
     me = numpy.zeros((G, M, N, 1))
-    ta = numpy.zeros((G, M, N, N))
-    ph = numpy.zeros((G, M, N, N))
+    if sigma:
+        ta = numpy.zeros((G, M, N, N))
+        ph = numpy.zeros((G, M, N, N))
+    else:
+        # the tiles of tau + phi are written in a single scratch array
+        sig = empty_matrix((G, M, N, N), F64)
     smap = parallel.Starmap(get_mu_tau_phi, h5=h5)
-    smap.share(YY=compute_distance_matrix(target, target),
-               YD=compute_distance_matrix(target, station_filtered),
+    smap.share(YD=compute_distance_matrix(target, station_filtered),
                DY=compute_distance_matrix(station_filtered, target))
     DD = compute_distance_matrix(station_filtered, station_filtered)
 
@@ -544,13 +658,20 @@ def get_me_ta_ph(cmaker, sdata, observed_imts, target_imts,
             smap.submit(
                 (target_imt, gsim, mean_stds_Y[:, g], target_imts,
                  observed_imts, sdata, target, station_filtered,
-                 spatial_correl, cross_correl_within, result))
-    for (g, m), (mu, tau, phi, msg) in smap.reduce().items():
-        me[g, m] = mu
-        ta[g, m] = tau
-        ph[g, m] = phi
-        logging.info(msg)
-    return me, ta, ph
+                 spatial_correl, cross_correl_within, result, sigma))
+    for res in smap:
+        g, m = res['g'], res['m']
+        if 'mu' in res:
+            me[g, m] = res['mu']
+            logging.info(res['msg'])
+        elif sigma:
+            ta[g, m, res['sl']] = res['tau']
+            ph[g, m, res['sl']] = res['phi']
+        else:
+            sig[g, m, res['sl']] = res['sig']
+    if sigma:
+        return [me, ta + ph, ta, ph]
+    return [me, sig]
 
 
 # tested in openquake/hazardlib/tests/calc/conditioned_gmfs_test.py
@@ -559,7 +680,7 @@ def get_mean_covs(
         target_sitecol, target_imts, spatial_correl, cross_correl_between,
         cross_correl_within, sigma=True, h5=None):
     """
-    :returns: a list of arrays [mea, sig, tau, phi] or [mea, tau, phi]
+    :returns: a list of arrays [mea, sig, tau, phi] or [mea, sig]
     """
     if hasattr(rupture, 'rupture'):
         rupture = rupture.rupture
@@ -592,15 +713,12 @@ def get_mean_covs(
         numpy.isin(target_sitecol.sids, ctx_Y.sids))
     mask = numpy.isin(station_sitecol.sids, ctx_D.sids)
     station_filtered = station_sitecol.filter(mask)
-    me, ta, ph = get_me_ta_ph(
+    # when sigma is False, tau and phi are not returned, to save memory
+    return get_me_ta_ph(
         cmaker, station_data[mask].copy(), observed_imts, target_imts,
         mean_stds_D, mean_stds_Y, target, station_filtered,
-        spatial_correl, cross_correl_within, cross_correl_between, h5)
-    if sigma:
-        return [me, ta + ph, ta, ph]
-    else:
-        # save memory since sigma = tau + phi is not needed
-        return [me, ta, ph]
+        spatial_correl, cross_correl_within, cross_correl_between, h5,
+        sigma)
 
 
 def _compute_spatial_cross_correlation_matrix(
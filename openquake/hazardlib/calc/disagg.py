@@ -24,7 +24,6 @@ extracting a specific PMF from the result of :func:`disaggregation`.
 
 import operator
 import collections
-import itertools
 from functools import lru_cache
 import numpy
 import scipy.stats
@@ -46,7 +45,7 @@ from openquake.hazardlib.contexts import (
 from openquake.hazardlib.calc.mean_rates import to_rates, to_probs
 
 BIN_NAMES = 'mag', 'dist', 'lon', 'lat', 'eps', 'trt'
-BinData = collections.namedtuple('BinData', 'dists, lons, lats, pnes')
+BinData = collections.namedtuple('BinData', 'dists, lons, lats, lnpnes')
 TWO24 = 2 ** 24
 
 
@@ -212,7 +211,6 @@ def _disaggregate(ctx, mea, std, cmaker, g, iml2, bin_edges, eps4, epsstar, gp,
         # P - Number of PoEs
         # G - Number of gsims
         poes = numpy.zeros((U, E, M, P))
-        pnes = numpy.ones((U, E, M, P))
 
         # disaggregate by epsilon
         for (m, p), iml in numpy.ndenumerate(iml2):
@@ -232,20 +230,23 @@ def _disaggregate(ctx, mea, std, cmaker, g, iml2, bin_edges, eps4, epsstar, gp,
                     truncnorm_sf(phi_b, lvls), idxs, eps_bands, cum_bands)
 
     with mon2:
+        # the probabilities of no exceedence are kept in log space
         time_span = cmaker.investigation_time
         if not infer_occur_rates and any(len(po) for po in ctx.probs_occur):
             # slow lane, case_65
+            pnes = numpy.ones((U, E, M, P))
             for u, rec in enumerate(ctx):
                 pnes[u] *= get_pnes(rec.occurrence_rate, rec.probs_occur,
                                     poes[u], time_span)
+            with numpy.errstate(divide='ignore'):
+                lnpnes = numpy.log(pnes)
         else:
-            # poissonian, fast lane
-            for e, m, p in itertools.product(range(E), range(M), range(P)):
-                pnes[:, e, m, p] *= numpy.exp(
-                    -ctx.occurrence_rate * poes[:, e, m, p] * time_span)
+            # poissonian, fast lane, on the whole (U, E, M, P) block
+            rates = ctx.occurrence_rate * time_span
+            lnpnes = -rates[:, None, None, None] * poes
 
     with mon3:
-        bindata = BinData(ctx.rrup, ctx.clon, ctx.clat, pnes)
+        bindata = BinData(ctx.rrup, ctx.clon, ctx.clat, lnpnes)
         return _build_disagg_matrix(bindata, bin_edges[1:])
 
 
@@ -263,7 +264,8 @@ def _disagg_eps(survival, bins, eps_bands, cum_bands):
 # this is fast
 def _build_disagg_matrix(bdata, bins):
     """
-    :param bdata: a dictionary of probabilities of no exceedence
+    :param bdata: a BinData with the logarithms of the probabilities of
+                  no exceedence
     :param bins: bin edges
     :returns:
         a 7D-matrix of shape (#distbins, #lonbins, #latbins, #epsbins, M, P, Z)
@@ -288,12 +290,88 @@ def _build_disagg_matrix(bdata, bins):
     dists_idx[dists_idx == dim1] = dim1 - 1
     lons_idx[lons_idx == dim2] = dim2 - 1
     lats_idx[lats_idx == dim3] = dim3 - 1
-    _U, _E, M, P = bdata.pnes.shape
-    mat6D = numpy.ones(shape + [M, P])
-    for i_dist, i_lon, i_lat, pne in zip(
-            dists_idx, lons_idx, lats_idx, bdata.pnes):
-        mat6D[i_dist, i_lon, i_lat] *= pne  # shape E, M, P
-    return 1. - mat6D
+    U, E, M, P = bdata.lnpnes.shape
+
+    # multiplying the pnes in the same bin is the same as summing their
+    # logarithms, which can be done with a single scatter on the
+    # flattened bin indices
+    idx = numpy.ravel_multi_index((dists_idx, lons_idx, lats_idx), shape[:3])
+    mat = numpy.zeros((dim1 * dim2 * dim3, E * M * P))
+    numpy.add.at(mat, idx, bdata.lnpnes.reshape(U, E * M * P))
+    return -numpy.expm1(mat).reshape(shape + [M, P])
+
+
+def update_disagg_hist(hist, ctx, mea, std, cmaker):
+    """
+    Accumulate the exceedence rates of the hazard levels by magnitude,
+    distance and epsilon bin; used to disaggregate in the classical pass,
+    without building the contexts a second time.
+
+    :param hist: an array of shape (G, N, Ma, D, E, M, L1) to update
+    :param ctx: a Poissonian context array with a single magnitude
+    :param mea: an array of shape (G, M, U)
+    :param std: an array of shape (G, M, U)
+    :param cmaker: a ContextMaker with attribute .disagg_edges
+    """
+    mag_edges, dist_edges, eps_edges = cmaker.disagg_edges
+    G, N, Ma, D, E, M, L1 = hist.shape
+    U = len(ctx)
+    min_eps, max_eps, eps_bands, cum_bands = get_eps4(
+        tuple(eps_edges), cmaker.truncation_level)
+    magi = numpy.clip(numpy.searchsorted(mag_edges, ctx.mag) - 1, 0, Ma - 1)
+    disti = numpy.clip(numpy.digitize(ctx.rrup, dist_edges) - 1, 0, D - 1)
+    idx = numpy.ravel_multi_index((ctx.sids, magi, disti), (N, Ma, D))
+    rates = ctx.occurrence_rate * cmaker.investigation_time
+    loglevels = cmaker.loglevels.array  # shape (M, L1)
+    contrib = numpy.zeros((U, E, M, L1))
+    for g in range(G):
+        for m in range(M):
+            # epsilons of all the levels, shape (L1, U)
+            lvls = ((loglevels[m, :, None] - mea[g, m]) / std[g, m]).ravel()
+            idxs = numpy.searchsorted(eps_edges, lvls)
+            sf = truncnorm_sf(cmaker.phi_b, lvls)
+            if cmaker.oq.epsilon_star:
+                poes = numpy.zeros((L1 * U, E))
+                ok = (lvls >= min_eps) & (lvls < max_eps)
+                poes[ok, idxs[ok] - 1] = sf[ok]
+            else:
+                poes = _disagg_eps(sf, idxs, eps_bands, cum_bands)
+            contrib[:, :, m] = poes.reshape(L1, U, E).transpose(1, 2, 0)
+        contrib *= rates[:, None, None, None]
+        numpy.add.at(hist[g].reshape(N * Ma * D, E * M * L1), idx,
+                     contrib.reshape(U, E * M * L1))
+
+
+def interp_disagg_hist(hist, imtls, iml2):
+    """
+    Interpolate the histograms computed by `update_disagg_hist` at the
+    disaggregation levels; the interpolation is log-log when both rates
+    are positive and linear in the logarithm of the levels otherwise.
+
+    :param hist: an array of shape (..., M, L1)
+    :param imtls: a DictArray imt -> levels
+    :param iml2: an array of shape (M, P) of intensities (0 = zero hazard)
+    :returns: an array of shape (..., M, P)
+    """
+    M, P = iml2.shape
+    out = numpy.zeros(hist.shape[:-1] + (P,))
+    for m, imt in enumerate(imtls):
+        xs = to_distribution_values(imtls[imt], imt)
+        for p, iml in enumerate(iml2[m]):
+            if iml == 0:  # zero hazard
+                continue
+            elif len(xs) == 1:  # single level, as for iml_disagg
+                out[..., m, p] = hist[..., m, 0]
+                continue
+            x = to_distribution_values(iml, imt)
+            i = numpy.clip(numpy.searchsorted(xs, x), 1, len(xs) - 1)
+            w = numpy.clip((x - xs[i-1]) / (xs[i] - xs[i-1]), 0., 1.)
+            y0, y1 = hist[..., m, i-1], hist[..., m, i]
+            pos = (y0 > 0) & (y1 > 0)
+            res = y0 + w * (y1 - y0)
+            res[pos] = y0[pos] ** (1. - w) * y1[pos] ** w
+            out[..., m, p] = res
+    return out
 
 
 def uniform_bins(min_value, max_value, bin_width):
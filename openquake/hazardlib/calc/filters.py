@@ -31,7 +31,7 @@ from openquake.hazardlib import site
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.geo.utils import (
     KM_TO_DEGREES, angular_distance, get_bounding_box,
-    get_longitudinal_extent, BBoxError, spherical_to_cartesian)
+    get_longitudinal_extent, BBoxError, spherical_to_cartesian, cross_idl)
 
 F32 = numpy.float32
 U32 = numpy.uint32
@@ -446,8 +446,8 @@ class SourceFilter(object):
     """
     Filter objects have a .filter method yielding filtered sources
     and the IDs of the sites within the given maximum distance.
-    Filter the sources by using `self.sitecol.within_bbox` which is
-    based on numpy.
+    Filter the sources by using a longitude-sorted index of the sites,
+    built once per site collection and based on numpy.
     """
     multiplier = 1  # not reduce
 
@@ -555,7 +555,34 @@ class SourceFilter(object):
                 return U32([])
             except BBoxError:  # do not filter
                 return self.sitecol.sids
+            return self.within_bbox(bbox)
+
+    def within_bbox(self, bbox):
+        """
+        Equivalent to `self.sitecol.within_bbox(bbox)`, but checking only
+        the sites in the longitude strip of the bounding box, found with
+        a binary search on the sorted longitudes
+
+        :param bbox:
+            a quartet (min_lon, min_lat, max_lon, max_lat)
+        :returns:
+            site indices within the bounding box
+        """
+        if not hasattr(self, 'lonidx'):
+            lons = self.sitecol['lon']
+            self.lonidx = numpy.argsort(lons, kind='stable')
+            self.sorted_lons = lons[self.lonidx]
+        min_lon, min_lat, max_lon, max_lat = bbox
+        lons = self.sorted_lons
+        if cross_idl(lons[0], lons[-1], min_lon, max_lon):
             return self.sitecol.within_bbox(bbox)
+        start = numpy.searchsorted(lons, min_lon, 'right')
+        stop = numpy.searchsorted(lons, max_lon, 'left')
+        idxs = self.lonidx[start:stop]
+        lats = self.sitecol['lat'][idxs]
+        idxs = idxs[(min_lat < lats) & (lats < max_lat)]
+        idxs.sort()
+        return idxs
 
     def _close_sids(self, lon, lat, dep, dist):
         if not hasattr(self, 'kdt'):
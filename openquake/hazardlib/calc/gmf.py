@@ -36,6 +36,7 @@ U16 = numpy.uint16
 U32 = numpy.uint32
 I64 = numpy.int64
 F32 = numpy.float32
+SEC_PERIL_ROWS = 1_000_000  # max number of rows in a block of events
 
 
 class CorrelationButNoInterIntraStdDevs(Exception):
@@ -160,6 +161,22 @@ def calc_gmf_simplified(ebrupture, sitecol, cmaker):
     return numpy.concatenate(gmfs)  # shape (M, N, E)
 
 
+class _TiledCtx(object):
+    # context repeated `reps` times, as seen by the secondary perils;
+    # only the columns actually read by the models are tiled
+    def __init__(self, ctx, reps):
+        self.ctx = ctx
+        self.reps = reps
+
+    def __getattr__(self, name):
+        arr = numpy.tile(getattr(self.ctx, name), self.reps)
+        setattr(self, name, arr)  # tile each column once per block
+        return arr
+
+    def __len__(self):
+        return len(self.ctx) * self.reps
+
+
 class GmfComputer(object):
     """
     Given an earthquake rupture, the GmfComputer computes
@@ -279,23 +296,35 @@ class GmfComputer(object):
 
         set_max_min(array, mean, max_iml, min_iml, self.mmi_index)
         data['gmv'].append(array)
-
         if self.sec_perils:
-            n = 0
-            for rlz in rlzs:
-                eids = self.eid[self.rlz == rlz]
-                E = len(eids)
-                for e, eid in enumerate(eids):
-                    gmfa = array[:, :, n + e].T  # shape (M, N)
-                    for sp in self.sec_perils:
-                        o = sp.compute(mag, zip(self.imts, gmfa), self.ctx)
-                        for outkey, outarr in zip(sp.outputs, o):
-                            key = f'{sp.__class__.__name__}_{outkey}'
-                            if outkey == 'Disp':
-                                # Catarina says to ignore small displacements
-                                outarr[outarr < 1e-4] = 0
-                            data[key].append(outarr)
-                n += E
+            self.compute_sec_perils(data, array, mag)
+
+    def compute_sec_perils(self, data, array, mag):
+        """
+        Compute all the secondary perils in a single pass over blocks of
+        events, by flattening the GMFs of the block and tiling the
+        context columns used by the models, so that each model is called
+        once per block and not once per event. Updates the data dictionary.
+
+        :param data: a dictionary key -> list of arrays
+        :param array: GMVs of shape (N, M, E)
+        :param mag: the magnitude of the rupture
+        """
+        N, M, E = array.shape
+        step = max(1, SEC_PERIL_ROWS // N)
+        for start in range(0, E, step):
+            block = array[:, :, start:start + step]
+            # shape (M, e * N), ordered by event and then by site
+            gmfa = block.transpose(1, 2, 0).reshape(M, -1)
+            ctx = _TiledCtx(self.ctx, block.shape[2])
+            for sp in self.sec_perils:
+                o = sp.compute(mag, zip(self.imts, gmfa), ctx)
+                for outkey, outarr in zip(sp.outputs, o):
+                    key = f'{sp.__class__.__name__}_{outkey}'
+                    if outkey == 'Disp':
+                        # Catarina says to ignore small displacements
+                        outarr[outarr < 1e-4] = 0
+                    data[key].append(outarr)
 
     def strip_zeros(self, data):
         """
@@ -349,7 +378,7 @@ class GmfComputer(object):
                 with mmon:
                     ms = self.cmaker.get_4MN([self.ctx], gs)
             else:  # conditioned
-                ms = (mean_stds[0][g], mean_stds[1][g], mean_stds[2][g])
+                ms = (mean_stds[0][g], mean_stds[1][g])
             with cmon:
                 E = len(idxs)
                 result = numpy.zeros(
@@ -383,22 +412,18 @@ class GmfComputer(object):
             return self.strip_zeros(data)
 
     def _compute(self, mean_stds, m, imt, gsim, intra_eps, idxs, rng=None):
-        if len(mean_stds) == 3:  # conditioned GMFs
-            # mea, tau, phi with shapes (N,1), (N,N), (N,N)
-            mu_Y, cov_WY_WY, cov_BY_BY = mean_stds
+        if len(mean_stds) == 2:  # conditioned GMFs
+            # mea and lower Cholesky factor of the covariance matrix
+            # with shapes (N,1), (N,N), see ConditionedGmfComputer.get_mea_chol
+            mu_Y, chol = mean_stds
             E = len(idxs)
-            eps = self.cmaker.oq.correlation_cutoff
             if self.cmaker.truncation_level <= 1E-9:
                 gmf = exp(mu_Y, imt.string != "MMI")
                 gmf = gmf.repeat(E, axis=1)
             else:
-                # add a cutoff to remove negative eigenvalues
-                cov_Y_Y = cov_WY_WY + cov_BY_BY + numpy.eye(
-                    len(cov_WY_WY)) * eps
-                arr = rng.multivariate_normal(
-                    mu_Y.flatten(), cov_Y_Y, size=E,
-                    check_valid="raise", tol=1e-5, method="cholesky")
-                gmf = exp(arr, imt != "MMI").T
+                # same numbers as rng.multivariate_normal(method="cholesky")
+                arr = mu_Y + chol @ rng.standard_normal((E, len(chol))).T
+                gmf = exp(arr, imt != "MMI")
             return gmf  # shapes (N, E)
 
         # regular case, sets self.sig, returns gmf
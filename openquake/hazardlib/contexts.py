@@ -28,12 +28,13 @@ import collections
 import numpy
 import shapely
 from scipy.interpolate import interp1d
+from scipy.spatial.distance import cdist
 
 from openquake.baselib import config
 from openquake.baselib.general import getsizeof
 from openquake.baselib.general import (
     AccumDict, DictArray, RecordBuilder, split_in_slices, block_splitter,
-    sqrscale)
+    sqrscale, gen_slices)
 from openquake.baselib.performance import Monitor, split_array, kround0, compile
 from openquake.baselib.python3compat import decode
 from openquake.hazardlib import valid, imt as imt_module
@@ -46,7 +47,12 @@ from openquake.hazardlib.calc.filters import (
     get_dparam, get_distances, getdefault, MINMAG, MAXMAG)
 from openquake.hazardlib.map_array import MapArray
 from openquake.hazardlib.geo import multiline
+from openquake.hazardlib.geo.geodetic import (
+    geodetic_distance, spherical_to_cartesian)
 from openquake.hazardlib.geo.mesh import Mesh
+from openquake.hazardlib.geo.surface.base import _get_finite_mesh
+from openquake.hazardlib.geo.surface.simple_fault import SimpleFaultSurface
+from openquake.hazardlib.geo.surface.complex_fault import ComplexFaultSurface
 from openquake.hazardlib.geo.surface.planar import (
     project, project_back, get_distances_planar)
 
@@ -64,7 +70,13 @@ STD_TYPES = (StdDev.TOTAL, StdDev.INTER_EVENT, StdDev.INTRA_EVENT)
 KNOWN_DISTANCES = frozenset('''rrup rx_ry0 rx ry0 rjb rhypo repi rcdpp azimuth
 azimuthcp rvolc clon_clat clon clat'''.split())
 NUM_BINS = 256
+# maximum size of the section distance cache
+MAX_DCACHE_MB = float(config.memory.section_distances_mb)
+ATT_LOGSTEP = .02  # step in log(rrup) between the nodes of the att curves
+ATT_MIN_GROUP = 16  # minimum number of far contexts to build an att curve
 DIST_BINS = sqrscale(80, 1000, NUM_BINS)
+MF_DISTANCES = {'rrup', 'rjb', 'rx', 'ry0'}  # computable in bulk
+MF_RUPPARAMS = {'mag', 'rake', 'strike', 'dip', 'ztor', 'width', 'zbot'}
 MEA = 0
 STD = 1
 EPS = float(os.environ.get('OQ_SAMPLE_SITES', 1))
@@ -80,9 +92,78 @@ def _get(surfaces, param, dparam, mask=slice(None)):
     return arr  # shape (S, N, ...)
 
 
+def _block_min(xyzs, xyz):
+    # minimum distances between each group of points and the sites; the
+    # groups typically overlap, so the distances from the distinct points
+    # are computed only once
+    lens = [len(pts) for pts in xyzs]
+    uniq, inv = numpy.unique(
+        numpy.concatenate(xyzs), axis=0, return_inverse=True)
+    idxs = numpy.split(inv.reshape(-1), numpy.cumsum(lens)[:-1])
+    out = numpy.zeros((len(xyzs), len(xyz)))
+    for slc in gen_slices(0, len(xyz), max(1, 4_000_000 // len(uniq))):
+        dists = cdist(uniq, xyz[slc])  # shape (P, N')
+        for r, idx in enumerate(idxs):
+            out[r, slc] = dists[idx].min(axis=0)
+    return out
+
+
+def _mesh_dists(rups, sites, params):
+    # distances for a block of ruptures with mesh surfaces, which are
+    # typically overlapping windows of the same fault mesh; returns a
+    # dictionary param -> array of shape (R, N) containing rrup and, if
+    # required, rjb, repi and rhypo; the other distances depend on the
+    # top edge and strike of each rupture and are computed in genctxs
+    fmeshes = [_get_finite_mesh(rup.surface.mesh) for rup in rups]
+    out = {'rrup': _block_min([m.xyz for m in fmeshes], sites.xyz)}
+    if 'rjb' in params:
+        # distances from the projections of the mesh points, then
+        # corrected with the enclosing polygon of each rupture
+        rjbs = _block_min(
+            [spherical_to_cartesian(m.lons.flatten(), m.lats.flatten())
+             for m in fmeshes],
+            spherical_to_cartesian(sites.lons, sites.lats))
+        for fmesh, rjb in zip(fmeshes, rjbs):
+            fmesh._fix_close_distances(rjb, sites)
+        out['rjb'] = rjbs
+    if 'repi' in params or 'rhypo' in params:
+        hypos = numpy.array([(rup.hypocenter.x, rup.hypocenter.y,
+                              rup.hypocenter.z) for rup in rups])
+        repi = geodetic_distance(hypos[:, 0:1], hypos[:, 1:2],
+                                 sites.lons, sites.lats)
+        if 'repi' in params:
+            out['repi'] = repi
+        if 'rhypo' in params:
+            out['rhypo'] = numpy.sqrt(
+                repi ** 2 + (hypos[:, 2:3] - sites.depths) ** 2)
+    return out
+
+
+def _gen_rrups(rups, sites, dparam, params=()):
+    # yields pairs (rup, dists) for ruptures with the same magnitude,
+    # where dists is a dictionary param -> distances containing rrup
+    # and possibly the other distances computed in bulk
+    if dparam:
+        for rup in rups:
+            rrups = _get(rup.surface.surfaces, 'rrup', dparam)
+            yield rup, {'rrup': numpy.min(rrups, axis=0)}
+    elif all(type(rup.surface) in (SimpleFaultSurface, ComplexFaultSurface)
+             for rup in rups):
+        for block in block_splitter(rups, max(1, 1_000_000 // len(sites))):
+            dists = _mesh_dists(block, sites, params)
+            for r, rup in enumerate(block):
+                yield rup, {par: dists[par][r] for par in dists}
+    else:
+        for rup in rups:
+            yield rup, {'rrup': get_distances(rup, sites, 'rrup')}
+
+
 def _get_tu(rup, dparam, mask):
-    tor = rup.surface.tor
     arr = _get(rup.surface.surfaces, 'tuw', dparam, mask)
+    return _tu(rup.surface.tor, arr)
+
+
+def _tu(tor, arr):
     S, N = arr.shape[:2]
     # keep the flipped values and then reorder the surface indices
     # arr has shape (S, N, 2, 3) where 2 refer to the flipping
@@ -447,8 +528,8 @@ def genctxs_Pp(src, sitecol, cmaker):
 
     if tom and isinstance(tom, NegativeBinomialTOM):
         if hasattr(src, 'pointsources'):  # CollapsedPointSource
-            maxrate = max(max(ps.mfd.occurrence_rates)
-                          for ps in src.pointsources)
+            maxrate = max(max(mfd.occurrence_rates)
+                          for mfd in src.pdata['mfd'].uni)
         else:  # regular source
             maxrate = max(src.mfd.occurrence_rates)
         p_size = tom.get_pmf(maxrate).shape[1]
@@ -479,20 +560,169 @@ def genctxs_Pp(src, sitecol, cmaker):
 
 
 def _build_dparam(src, sitecol, cmaker):
-    dparams = {'rjb', 'tuw'}
-    if cmaker.fewsites:
-        dparams |= {'clon_clat'}
-    sections = src.get_sections(src.get_unique_idxs())
+    # the section distances are cached by (hdf5path, section index) and
+    # site ID, so that the multifault sources in the same task sharing
+    # sections and sites do not recompute them; only the missing sites
+    # are computed
+    dparams = ('rrup', 'rjb', 'tuw') + (
+        ('clon_clat',) if cmaker.fewsites else ())
+    if (cmaker.dcache_sites is not sitecol.complete or
+            cmaker.dcache_params != dparams or
+            getsizeof(cmaker.dcache) > MAX_DCACHE_MB * TWO20):
+        cmaker.dcache = {}
+        cmaker.dcache_sites = sitecol.complete
+        cmaker.dcache_params = dparams
+    dcache = cmaker.dcache
+    sids = sitecol.sids
+    idxs = src.get_unique_idxs()
+    todo = []
+    for idx in idxs:
+        key = src.hdf5path, idx
+        if key in dcache:
+            missing = ~numpy.isin(sids, dcache[key]['sids'])
+        else:
+            missing = numpy.ones(len(sids), bool)
+        if missing.any():
+            todo.append((idx, missing))
+    if todo:
+        sections = src.get_sections([idx for idx, _ in todo])
+        for sec, (idx, missing) in zip(sections, todo):
+            sites = sitecol.filter(missing)
+            new = {'sids': sites.sids}
+            for param in dparams:
+                new[param] = get_dparam(sec, sites, param)
+            key = src.hdf5path, idx
+            if key in dcache:  # merge with the cached sites
+                old = dcache[key]
+                order = numpy.argsort(
+                    numpy.concatenate([old['sids'], new['sids']]))
+                new = {k: numpy.concatenate([old[k], new[k]])[order]
+                       for k in new}
+            dcache[key] = new
     out = {}
-    for sec in sections:
-        out[sec.idx, 'rrup'] = get_dparam(sec, sitecol, 'rrup')
+    for idx in idxs:
+        dic = dcache[src.hdf5path, idx]
+        pos = numpy.searchsorted(dic['sids'], sids)
         for param in dparams:
-            out[sec.idx, param] = get_dparam(sec, sitecol, param)
+            out[idx, param] = dic[param][pos]
     cmaker.dparam_mb = max(cmaker.dparam_mb, getsizeof(out) / TWO20)
     cmaker.source_mb += getsizeof(src) / TWO20
     return out
 
 
+def _close_ruptures(src, dparam, maximum_distance):
+    # returns a boolean array with the multifault ruptures within the
+    # maximum distance from the sites, without building the ruptures:
+    # the minimum distance of a rupture is the minimum of the distances
+    # of its sections, computed with a segmented reduction
+    ridxs = src.rupture_idxs
+    lens = numpy.array([len(idxs) for idxs in ridxs])
+    allidxs = numpy.concatenate(ridxs)
+    uniq = numpy.unique(allidxs)
+    secdist = numpy.array([dparam[idx, 'rrup'].min() for idx in uniq])
+    dists = secdist[numpy.searchsorted(uniq, allidxs)]
+    rupdist = numpy.minimum.reduceat(dists, numpy.cumsum(lens) - lens)
+    return rupdist <= maximum_distance(src.mags)
+
+
+def _bulk_mf(cmaker):
+    # the multifault contexts can be built in bulk only if the required
+    # parameters can be computed from the msparams and section distances
+    return (not cmaker.fewsites and
+            cmaker.REQUIRES_DISTANCES <= MF_DISTANCES and
+            cmaker.REQUIRES_RUPTURE_PARAMETERS <= MF_RUPPARAMS)
+
+
+def _segmented_min(dparam, idxs, starts, param):
+    # minimum of the section distances for each rupture, shape (R, N)
+    dists = numpy.array([dparam[idx, param] for idx in idxs])
+    return numpy.minimum.reduceat(dists, starts)
+
+
+def genctxs_mf(src, sitecol, cmaker, rids):
+    """
+    Context generator for multifault sources. The distances of the
+    ruptures are computed in bulk from the distances of the sections,
+    with segmented reductions over the rupture indices, without building
+    the MultiSurfaces and the ruptures.
+
+    :param rids: indices of the ruptures to consider
+    """
+    dparam = cmaker.dparam
+    msparams = src.msparams
+    rup_ids = src.offset + numpy.cumsum(msparams['area'] > 0) - 1
+    rids = rids[numpy.argsort(src.mags[rids], kind='stable')]  # by mag
+    dd = cmaker.defaultdict.copy()
+    if src.infer_occur_rates:
+        rates = src.occur_rates
+        dd['probs_occur'] = numpy.zeros(0)
+    else:
+        rates = numpy.full(len(src.mags), numpy.nan)
+        dd['probs_occur'] = numpy.zeros(src.probs_occur.shape[1])
+    builder = RecordBuilder(**dd)
+    siteparams = [par for par in sitecol.array.dtype.names if par in dd]
+    dists = cmaker.REQUIRES_DISTANCES
+    if 'rx' in dists or 'ry0' in dists:
+        sections = src.get_sections()
+    ridxs = src.rupture_idxs
+    lens = numpy.array([len(idxs) for idxs in ridxs])
+    N = len(sitecol)
+    for block in block_splitter(rids, max(1, 1_000_000 // N),
+                                weight=lambda r: lens[r]):
+        rs = numpy.array(block)
+        idxs = numpy.concatenate([ridxs[r] for r in rs])
+        starts = numpy.cumsum(lens[rs]) - lens[rs]
+        rrup = _segmented_min(dparam, idxs, starts, 'rrup')
+        mask = rrup <= cmaker.maximum_distance(src.mags[rs])[:, None]
+        ri, si = numpy.nonzero(mask)  # rupture and site indices
+        if len(ri) == 0:
+            continue
+        ctx = builder.zeros(len(ri))
+        ms = msparams[rs[ri]]
+        for par in cmaker.REQUIRES_RUPTURE_PARAMETERS:
+            if par == 'mag':
+                ctx.mag = numpy.round(src.mags[rs[ri]], 3)
+            elif par == 'rake':
+                ctx.rake = src.rakes[rs[ri]]
+            else:
+                ctx[par] = ms[par]
+        ctx.occurrence_rate = rates[rs[ri]]
+        if not src.infer_occur_rates:
+            ctx.probs_occur = src.probs_occur[rs[ri]]
+        ctx.rrup = rrup[mask]
+        if 'rjb' in dists:
+            ctx.rjb = _segmented_min(dparam, idxs, starts, 'rjb')[mask]
+        if 'rx' in dists or 'ry0' in dists:
+            stop = 0
+            for r, m in zip(rs, mask):
+                n = m.sum()
+                if n == 0:
+                    continue
+                slc = slice(stop, stop + n)
+                stop += n
+                tor = multiline.MultiLine(
+                    [sections[idx].tor for idx in ridxs[r]])
+                arr = numpy.array([dparam[idx, 'tuw'][m] for idx in ridxs[r]])
+                tut, uut = _tu(tor, arr)
+                if 'rx' in dists:
+                    ctx.rx[slc] = tut
+                if 'ry0' in dists:
+                    ry0 = numpy.zeros(n)
+                    neg = uut < 0
+                    ry0[neg] = numpy.abs(uut[neg])
+                    u_max = msparams[r]['u_max']
+                    big = uut > u_max
+                    ry0[big] = uut[big] - u_max
+                    ctx.ry0[slc] = ry0
+        for par in siteparams:
+            ctx[par] = sitecol.array[par][si]
+        ctx.sids = sitecol.sids[si]
+        ctx.src_id = src.id
+        if src.id >= 0:
+            ctx.rup_id = rup_ids[rs[ri]]
+        yield ctx
+
+
 # this is the critical function for the performance of the classical calculator
 # the performance is dominated by the CPU cache, i.e. large arrays are slow
 # the only way to speedup is to reduce the maximum_distance, then the array
@@ -548,6 +778,10 @@ class ContextMaker(object):
     cluster = None  # set in RmapMaker
     dparam_mb = 0  # set in build_dparam
     source_mb = 0  # set in build_dparam
+    dcache_sites = None  # set in build_dparam
+    dcache_params = ()  # set in build_dparam
+    disagg_edges = ()  # (mag, dist, eps) edges, set by the classical calc
+    disagg_hist = None  # set in RmapMaker when disagg_edges is non-empty
 
     def __init__(self, trt, gsims, oq, monitor=Monitor(), extraparams=()):
         self.trt = trt
@@ -624,6 +858,9 @@ class ContextMaker(object):
         self.num_epsilon_bins = param.get('num_epsilon_bins', 1)
         self.disagg_bin_edges = param.get('disagg_bin_edges', {})
         self.ps_grid_spacing = param.get('ps_grid_spacing')
+        self.att_curves_distance = getdefault(
+            param.get('att_curves_distance', {'default': 0}), self.trt)
+        self.att_curves_tolerance = param.get('att_curves_tolerance', .01)
         self.split_sources = self.oq.split_sources
         for gsim in self.gsims:
             if hasattr(gsim, 'set_tables'):
@@ -690,9 +927,13 @@ class ContextMaker(object):
         self.sec_mon = monitor('building dparam', measuremem=False)
         self.delta_mon = monitor('getting delta_rates', measuremem=False)
         self.clu_mon = monitor('cluster loop', measuremem=False)
+        self.dcache = {}  # section distances, see _build_dparam
+        self.dcache_sites = None
         self.task_no = getattr(monitor, 'task_no', 0)
         self.out_no = getattr(monitor, 'out_no', self.task_no)
         self.cfactor = numpy.zeros(2)
+        # approximated contexts, far contexts, max estimated error
+        self.att_stats = numpy.zeros(3)
 
     def copy(self, **kw):
         """
@@ -958,12 +1199,9 @@ class ContextMaker(object):
         """
         magdist = self.maximum_distance(same_mag_rups[0].mag)
         dparam = getattr(self, 'dparam', None)
-        for rup in same_mag_rups:
-            if dparam:
-                rrups = _get(rup.surface.surfaces, 'rrup', dparam)
-                rrup = numpy.min(rrups, axis=0)
-            else:
-                rrup = get_distances(rup, sites, 'rrup')
+        for rup, dists in _gen_rrups(
+                same_mag_rups, sites, dparam, self.REQUIRES_DISTANCES):
+            rrup = dists['rrup']
             mask = rrup <= magdist
             if not mask.any():
                 continue
@@ -1002,7 +1240,10 @@ class ContextMaker(object):
             else:
                 tu = None
             for param in params - {'clon', 'clat'}:
-                set_distances(ctx, rup, r_sites, param, dparam, mask, tu)
+                if param in dists:  # computed in bulk
+                    ctx[param] = dists[param][mask]
+                else:
+                    set_distances(ctx, rup, r_sites, param, dparam, mask, tu)
 
             # Equivalent distances
             reqv_obj = (self.reqv.get(self.trt) if self.reqv else None)
@@ -1058,10 +1299,33 @@ class ContextMaker(object):
             minmag = self.maximum_distance.x[0]
             maxmag = self.maximum_distance.x[-1]
             with self.ir_mon:
-                allrups = list(src.iter_ruptures(
-                    shift_hypo=self.shift_hypo, step=step))
-                for i, rup in enumerate(allrups):
-                    rup.rup_id = src.offset + i
+                if self.dparam and _bulk_mf(self):
+                    # build the contexts without building the ruptures
+                    close = _close_ruptures(
+                        src, self.dparam, self.maximum_distance)
+                    rids = numpy.where(
+                        close & (src.msparams['area'] > 0) &
+                        (src.mags >= minmag) & (src.mags <= maxmag))[0]
+                    self.num_rups = len(rids) or 1
+                    ctxs = genctxs_mf(src, sitecol, self, rids)
+                    return self.ctx_mon.iter(
+                        self.recarray([ctx]) for ctx in ctxs)
+                elif self.dparam:
+                    # discard the far away ruptures before building them,
+                    # keeping the same rupture IDs
+                    close = _close_ruptures(
+                        src, self.dparam, self.maximum_distance)
+                    valid = src.msparams['area'] > 0
+                    rup_ids = src.offset + numpy.cumsum(valid) - 1
+                    allrups = list(src.iter_ruptures(
+                        shift_hypo=self.shift_hypo, close=close))
+                    for rup, rup_id in zip(allrups, rup_ids[close & valid]):
+                        rup.rup_id = rup_id
+                else:
+                    allrups = list(src.iter_ruptures(
+                        shift_hypo=self.shift_hypo, step=step))
+                    for i, rup in enumerate(allrups):
+                        rup.rup_id = src.offset + i
                 allrups = sorted([rup for rup in allrups
                                   if minmag <= rup.mag <= maxmag],
                                  key=bymag)
@@ -1143,7 +1407,10 @@ class ContextMaker(object):
 
         # split large context arrays to avoid filling the CPU cache
         with self.gmf_mon:
-            mean_stdt = self.get_mean_stds([ctx], split_by_mag=False)
+            if self.att_curves_distance:
+                mean_stdt = self.get_att_mean_stds(ctx)
+            else:
+                mean_stdt = self.get_mean_stds([ctx], split_by_mag=False)
 
         if len(ctx) < 100:
             # do not split in slices to make debugging easier
@@ -1221,6 +1488,8 @@ class ContextMaker(object):
         :param ctx: a context array
         :param rup_mutex: dictionary (src_id, rup_id) -> weight
         """
+        if self.disagg_hist is not None:
+            from openquake.hazardlib.calc.disagg import update_disagg_hist
         for poes, mea, sig, tau, ctxt in self.gen_poes(ctx):
             # ctxt contains an unique magnitude
             if rup_mutex:
@@ -1231,6 +1500,9 @@ class ContextMaker(object):
                     pmap.array[sidx] *= 1. - poe
             else:
                 pmap.update_indep(poes, ctxt, self.tom.time_span)
+            if self.disagg_hist is not None:
+                # the unsupported cases are rejected in init_disagg_hist
+                update_disagg_hist(self.disagg_hist, ctxt, mea, sig, self)
 
     # called by gen_poes and by the GmfComputer
     def get_mean_stds(self, ctxs, split_by_mag=True):
@@ -1265,6 +1537,11 @@ class ContextMaker(object):
         out = numpy.zeros((4, M, N))
         gsim.adj = []  # NSHM2014P adjustments
         compute = gsim.__class__.compute
+        if gsim.batched and len(ctxs) > 1 and all(
+                isinstance(ctx, numpy.recarray) for ctx in ctxs):
+            # i.e. machine learning models, faster on large batches
+            ctxs = [numpy.concatenate(
+                ctxs, dtype=ctxs[0].dtype).view(numpy.recarray)]
         start = 0
         for ctx in ctxs:
             slc = slice(start, start + len(ctx))
@@ -1280,6 +1557,124 @@ class ContextMaker(object):
             self.horiz_comp_to_geom_mean(out, gsim)
         return out
 
+    def get_att_mean_stds(self, ctx):
+        """
+        Compute the mean and stddevs exactly for the contexts closer than
+        att_curves_distance and by interpolating attenuation curves for
+        the far ones. The far contexts are grouped by rupture and site
+        parameters; for each large group the GSIMs are evaluated exactly
+        only on a few nodes spaced by ATT_LOGSTEP in log(rrup). The
+        interpolation error is estimated on the odd nodes by using only
+        the even ones; if it exceeds att_curves_tolerance the group is
+        computed exactly.
+
+        :param ctx: a context array with a single magnitude
+        :returns: an array of shape (4, G, M, N) with mean and stddevs
+        """
+        far, = numpy.where(ctx.rrup > self.att_curves_distance)
+        if (len(far) < ATT_MIN_GROUP or
+                any(hasattr(gsim, 'weights_signs') for gsim in self.gsims)):
+            # the NSHM adjustments are aligned to the full context
+            return self.get_mean_stds([ctx], split_by_mag=False)
+
+        # group index from the rupture and site parameters, by combining
+        # the indices of the single parameters (much faster than using
+        # numpy.unique on a structured array)
+        arrays = [ctx[par][far] for par in sorted(
+            self.REQUIRES_RUPTURE_PARAMETERS | self.REQUIRES_SITES_PARAMETERS)
+            if par in ctx.dtype.names]
+        # the other distances are smooth functions of rrup only on the same
+        # side of the rupture: the hanging wall terms depend on the sign of
+        # rx and on ry0 being zero, the volcanic terms on rvolc being zero
+        for dist in ('rx', 'ry0', 'rvolc'):
+            if dist in self.REQUIRES_DISTANCES:
+                arrays.append(ctx[dist][far] >= 0 if dist == 'rx'
+                              else ctx[dist][far] > 0)
+        grp = numpy.zeros(len(far), numpy.int64)
+        for arr in arrays:
+            if (arr == arr[0]).all():  # common case, nothing to do
+                continue
+            uni, idx = numpy.unique(arr, return_inverse=True)
+            _, grp = numpy.unique(grp * len(uni) + idx.flatten(),
+                                  return_inverse=True)
+        ngroups = grp.max() + 1
+
+        # the nodes are one context per cell of size ATT_LOGSTEP in
+        # log(rrup), plus the closest and farthest context of each group
+        logr = numpy.log(ctx.rrup[far])
+        span = logr.max() - logr.min() + 1.
+        cell = ((logr - logr.min()) // ATT_LOGSTEP).astype(numpy.int64)
+        ncells = cell.max() + 1
+        reps = numpy.full(ngroups * ncells, -1)
+        reps[grp * ncells + cell] = numpy.arange(len(far))
+        gmin = numpy.full(ngroups, numpy.inf)
+        gmax = numpy.full(ngroups, -numpy.inf)
+        numpy.minimum.at(gmin, grp, logr)
+        numpy.maximum.at(gmax, grp, logr)
+        lo = numpy.zeros(ngroups, numpy.int64)
+        hi = numpy.zeros(ngroups, numpy.int64)
+        lo[grp[logr == gmin[grp]]] = numpy.where(logr == gmin[grp])[0]
+        hi[grp[logr == gmax[grp]]] = numpy.where(logr == gmax[grp])[0]
+        nodes = numpy.unique(numpy.concatenate([reps[reps >= 0], lo, hi]))
+
+        # keep only the groups with enough contexts per node
+        gsize = numpy.bincount(grp, minlength=ngroups)
+        nnodes = numpy.bincount(grp[nodes], minlength=ngroups)
+        ok = (gsize >= ATT_MIN_GROUP) & (nnodes >= 3) & (nnodes * 4 <= gsize)
+        nodes = nodes[ok[grp[nodes]]]
+        nodes = nodes[numpy.lexsort((logr[nodes], grp[nodes]))]
+        out = numpy.empty((4, len(self.gsims), len(self.imts), len(ctx)))
+        exact = numpy.ones(len(ctx), bool)
+        if len(nodes):
+            out[..., far[nodes]] = self.get_mean_stds(
+                [ctx[far[nodes]]], split_by_mag=False)
+
+            # estimate the error on the odd nodes with the even nodes
+            ngrp, x, y = grp[nodes], logr[nodes], out[:2, ..., far[nodes]]
+            first = numpy.searchsorted(ngrp, ngrp)
+            odd = numpy.where(((numpy.arange(len(nodes)) - first) % 2 == 1) &
+                              (numpy.append(ngrp[1:], -1) == ngrp))[0]
+            w = (x[odd] - x[odd - 1]) / (x[odd + 1] - x[odd - 1])
+            coarse = y[..., odd - 1] * (1. - w) + y[..., odd + 1] * w
+            err = numpy.zeros(ngroups)
+            numpy.maximum.at(err, ngrp[odd], numpy.abs(
+                coarse - y[..., odd]).max(axis=(0, 1, 2)))
+            ok &= err <= self.att_curves_tolerance  # also false for NaN
+            self.att_stats[2] = max(self.att_stats[2], err[ok].max(
+                initial=0))
+
+            # interpolate linearly in log(rrup) inside each group
+            approx, = numpy.where(ok[grp])
+            keep = ok[ngrp]
+            nodes, ngrp, x = nodes[keep], ngrp[keep], x[keep]
+            ynodes = out[..., far[nodes]]
+            xa, ga = logr[approx], grp[approx]
+            i0 = numpy.searchsorted(ngrp * span + x, ga * span + xa) - 1
+            i0 = numpy.clip(i0, numpy.searchsorted(ngrp, ga),
+                            numpy.searchsorted(ngrp, ga, 'right') - 2)
+            w = numpy.clip((xa - x[i0]) / (x[i0 + 1] - x[i0]), 0., 1.)
+            out[..., far[approx]] = (ynodes[..., i0] * (1. - w) +
+                                     ynodes[..., i0 + 1] * w)
+            exact[far[approx]] = False
+            self.att_stats[0] += len(approx)
+        self.att_stats[1] += len(far)
+        if exact.any():
+            out[..., exact] = self.get_mean_stds(
+                [ctx[exact]], split_by_mag=False)
+        return out
+
+    def check_att_curves(self, ctx):
+        """
+        Compare the interpolated mean and stddevs with the exact ones
+
+        :param ctx: a context array with a single magnitude
+        :returns: a dictionary with the maximum absolute differences
+        """
+        exact = self.get_mean_stds([ctx], split_by_mag=False)
+        approx = self.get_att_mean_stds(ctx)
+        diff = numpy.abs(approx - exact).max(axis=(1, 2, 3))
+        return dict(zip(['mea', 'sig', 'tau', 'phi'], diff))
+
     # not used right now
     def get_att_curves(self, site, msr, mag, aratio=1., strike=0.,
                        dip=45., rake=-90):
@@ -1622,6 +2017,13 @@ class RmapMaker(object):
         dic = {}
         self.rupdata = []
         self.source_data = AccumDict(accum=[])
+        if self.cmaker.disagg_edges:
+            # histograms of the rates for the few sites, see
+            # update_disagg_hist
+            Ma, D, E = (len(edges) - 1 for edges in self.cmaker.disagg_edges)
+            M, L1 = self.cmaker.loglevels.array.shape
+            self.cmaker.disagg_hist = numpy.zeros(
+                (len(self.cmaker.gsims), self.N, Ma, D, E, M, L1))
         if not self.src_mutex and not self.rup_mutex:
             pnemap = self._make_src_indep()
         else:
@@ -1644,6 +2046,10 @@ class RmapMaker(object):
         dic['rmap'] = pnemap.to_rates()
         dic['rmap'].gid = self.cmaker.gid
         dic['cfactor'] = self.cmaker.cfactor
+        dic['att_stats'] = self.cmaker.att_stats
+        if self.cmaker.disagg_edges:
+            # the rmap can be stored in the workers, so send the gid too
+            dic['disagg_hist'] = self.cmaker.gid, self.cmaker.disagg_hist
         dic['rup_data'] = concat(self.rupdata)
         dic['source_data'] = self.source_data
         dic['task_no'] = self.task_no
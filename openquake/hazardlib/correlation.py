@@ -18,14 +18,227 @@ Module :mod:`openquake.hazardlib.correlation` defines correlation models for
 spatially-distributed ground-shaking intensities.
 """
 import abc
+import logging
 import numpy
+from scipy import sparse
+from scipy.spatial import cKDTree
+from scipy.sparse.linalg import spsolve_triangular
+from openquake.hazardlib.geo.geodetic import (
+    geodetic_distance, spherical_to_cartesian)
+
+METHODS = ('cholesky', 'nystrom', 'vecchia')
+
+
+def get_landmarks(lons, lats, num):
+    """
+    Select up to `num` sites spread uniformly in space, by overlaying a
+    regular grid on the bounding box and taking a site for each nonempty
+    cell.
+
+    :param lons: longitudes of the sites
+    :param lats: latitudes of the sites
+    :param num: the maximum number of landmarks
+    :returns: an array of site indices
+    """
+    N = len(lons)
+    if N <= num:
+        return numpy.arange(N)
+    dx = numpy.ptp(lons) or 1.
+    dy = numpy.ptp(lats) or 1.
+    nx = int(numpy.ceil(numpy.sqrt(num)))
+    while True:
+        ix = numpy.minimum((lons - lons.min()) / dx * nx, nx - 1)
+        iy = numpy.minimum((lats - lats.min()) / dy * nx, nx - 1)
+        _, idx = numpy.unique(ix.astype(int) * nx + iy.astype(int),
+                              return_index=True)
+        if len(idx) >= num // 2 or nx >= num:
+            break
+        nx *= 2  # sites clustered in a small part of the bounding box
+    if len(idx) > num:
+        idx = idx[numpy.linspace(0, len(idx) - 1, num).astype(int)]
+    return numpy.sort(idx)
 
 
 class BaseCorrelationModel(metaclass=abc.ABCMeta):
     """
     Base class for correlation models for spatially-distributed ground-shaking
     intensities.
+
+    :param method:
+        "cholesky" (the default) factorizes the full correlation matrix of
+        the complete site collection; "nystrom" uses a low-rank
+        approximation based on a subset of landmark sites, plus an
+        uncorrelated term restoring the unit variance at each site, and
+        requires only O(N * landmarks) memory; "vecchia" conditions each
+        site on its nearest neighbors only, building a sparse triangular
+        factor of the inverse correlation matrix with O(N * neighbors)
+        elements
+    :param landmarks:
+        the number of landmark sites used by the "nystrom" method
+    :param neighbors:
+        the number of conditioning sites used by the "vecchia" method
     """
+    method = 'cholesky'
+    landmarks = 1000
+    neighbors = 16
+
+    def _init_method(self, method, landmarks, neighbors):
+        if method not in METHODS:
+            raise ValueError('Unknown correlation method %r, must be in %s'
+                             % (method, METHODS))
+        self.method = method
+        self.landmarks = landmarks
+        self.neighbors = neighbors
+        self.max_error = {}  # imt -> error on the correlation coefficients
+        self.factors = {}  # imt -> (perm, sparse factor), for vecchia
+
+    def apply_nystrom(self, sites, imt, residuals):
+        """
+        Apply the correlation with the Nystrom approximation. The diagonal
+        term restoring the unit variance is an upper bound on the error on
+        the correlation coefficients; the maximum for each IMT is
+        stored in `.max_error`.
+
+        :param sites: the sites the residuals were sampled for
+        :param imt: Intensity measure type object
+        :param residuals: an array of shape (N, ...) of sampled residuals
+        :returns: an array of correlated residuals with the same shape
+        """
+        N = len(sites)
+        res = residuals.reshape(N, -1)
+        lons, lats = sites.lons, sites.lats
+        lm = get_landmarks(lons, lats, self.landmarks)
+        kmm = self._get_correlation_matrix(geodetic_distance(
+            lons[lm, None], lats[lm, None], lons[lm], lats[lm]), imt)
+        # pseudo-inverse square root, robust to duplicated landmarks
+        lam, vec = numpy.linalg.eigh(kmm)
+        ok = lam > lam[-1] * 1E-10
+        bmat = vec[:, ok] / numpy.sqrt(lam[ok])  # shape (L, K)
+        latent = vec[:, ok].T @ res[lm]  # K independent normals
+        out = numpy.zeros(res.shape)
+        nugget = numpy.zeros(N)
+        chunk = max(1, 10_000_000 // len(lm))  # limit the memory
+        for start in range(0, N, chunk):
+            sl = slice(start, start + chunk)
+            knm = self._get_correlation_matrix(geodetic_distance(
+                lons[sl, None], lats[sl, None], lons[lm], lats[lm]), imt)
+            gmat = knm @ bmat
+            nugget[sl] = numpy.clip(1. - (gmat**2).sum(axis=1), 0., 1.)
+            out[sl] = gmat @ latent + numpy.sqrt(nugget[sl])[:, None] * res[sl]
+        err = nugget.max()
+        if err > self.max_error.get(imt.string, 0.):
+            self.max_error[imt.string] = err
+            logging.info('Nystrom correlation for %s with %d landmarks: '
+                         'max error %.3f', imt, len(lm), err)
+        return out.reshape(residuals.shape)
+
+    def get_vecchia_factor(self, sites, imt, probes=8):
+        """
+        Build the Vecchia approximation of the correlation matrix C of the
+        given sites: in a random order, each site is conditioned on its
+        nearest preceding neighbors, giving a sparse lower triangular
+        matrix B such that C ~ inv(B) @ inv(B).T. The maximum difference
+        between the approximated and the exact correlations of a few
+        probe sites with all the sites is stored in `.max_error`.
+
+        :param sites: a (filtered) site collection
+        :param imt: Intensity measure type object
+        :param probes: number of probe sites used to estimate the error
+        :returns: (perm, B) where perm is the order of the sites
+        """
+        N = len(sites)
+        k = self.neighbors
+        lons, lats = sites.lons, sites.lats
+        rng = numpy.random.default_rng(42)
+        perm = rng.permutation(N)
+        lons, lats = lons[perm], lats[perm]
+        xyz = spherical_to_cartesian(lons, lats)
+        rows, cols, vals = [], [], []
+        start = 0
+        while start < N:
+            # the sites in [start, stop) look for the neighbors among
+            # the sites in [0, stop) preceding them
+            stop = min(N, max(start + 4 * k, int(start * 1.25)))
+            pos = numpy.arange(start, stop)
+            # in the first block all the sites are candidates
+            num = stop if start == 0 else min(stop, 2 * k + 2)
+            cand = cKDTree(xyz[:stop]).query(
+                xyz[start:stop], num)[1].reshape(len(pos), -1)
+            valid = cand < pos[:, None]
+            first = numpy.argsort(~valid, axis=1, kind='stable')[:, :k]
+            nbrs = numpy.take_along_axis(cand, first, 1)
+            ok = numpy.take_along_axis(valid, first, 1)
+            nbrs[~ok] = 0
+            # conditional mean coefficients and stddevs
+            corr_nn = self._get_correlation_matrix(geodetic_distance(
+                lons[nbrs][:, :, None], lats[nbrs][:, :, None],
+                lons[nbrs][:, None, :], lats[nbrs][:, None, :]), imt)
+            ok2 = ok[:, :, None] & ok[:, None, :]
+            eye = numpy.eye(nbrs.shape[1])
+            corr_nn = numpy.where(ok2, corr_nn, eye) + eye * 1E-8
+            corr_in = self._get_correlation_matrix(geodetic_distance(
+                lons[pos, None], lats[pos, None], lons[nbrs], lats[nbrs]),
+                imt) * ok
+            coeffs = numpy.linalg.solve(corr_nn, corr_in[:, :, None])[..., 0]
+            cvar = 1. - (coeffs * corr_in).sum(axis=1)
+            cstd = numpy.sqrt(numpy.maximum(cvar, 1E-10))
+            rows.append(pos)
+            cols.append(pos)
+            vals.append(1. / cstd)
+            rows.append(numpy.repeat(pos, ok.sum(axis=1)))
+            cols.append(nbrs[ok])
+            vals.append((-coeffs / cstd[:, None])[ok])
+            start = stop
+        bmat = sparse.csr_matrix(
+            (numpy.concatenate(vals),
+             (numpy.concatenate(rows), numpy.concatenate(cols))), (N, N))
+
+        # compare the implied and exact correlations for the probe sites
+        pr = rng.choice(N, min(N, probes), replace=False)
+        rhs = numpy.zeros((N, len(pr)))
+        rhs[pr, numpy.arange(len(pr))] = 1.
+        implied = spsolve_triangular(bmat, spsolve_triangular(
+            bmat.T.tocsr(), rhs, lower=False), lower=True)
+        exact = self._get_correlation_matrix(geodetic_distance(
+            lons[:, None], lats[:, None], lons[pr], lats[pr]), imt)
+        err = numpy.abs(implied - exact).max()
+        self.max_error[imt.string] = max(
+            err, self.max_error.get(imt.string, 0.))
+        logging.info('Vecchia correlation for %s with %d sites and %d '
+                     'neighbors: max error %.3f', imt, N, k, err)
+        return perm, bmat
+
+    def apply_vecchia(self, sites, imt, residuals):
+        """
+        Apply the correlation with the Vecchia approximation, by solving
+        a sparse triangular system; the factor is computed only once per
+        IMT for the complete site collection and, as for the cholesky
+        method, the residuals of a filtered site collection are extended
+        with zeros and the portion of the field corresponding to the sites
+        is returned.
+
+        :param sites: the sites the residuals were sampled for
+        :param imt: Intensity measure type object
+        :param residuals: an array of shape (N, ...) of sampled residuals
+        :returns: an array of correlated residuals with the same shape
+        """
+        try:
+            perm, bmat = self.factors[imt.string]
+        except KeyError:
+            perm, bmat = self.factors[imt.string] = self.get_vecchia_factor(
+                sites.complete, imt)
+        N = len(sites.complete)
+        n = len(sites)
+        res = residuals.reshape(n, -1)
+        if n < N:  # filtered site collection
+            res = numpy.zeros((N, res.shape[1]))
+            res[sites.sids] = residuals.reshape(n, -1)
+        out = numpy.zeros(res.shape)
+        out[perm] = spsolve_triangular(bmat, res[perm], lower=True)
+        if n < N:
+            out = out[sites.sids]
+        return out.reshape(residuals.shape)
+
     def apply_correlation(self, sites, imt, residuals, stddev_intra=0):
         """
         Apply correlation to randomly sampled residuals.
@@ -49,7 +262,13 @@ class BaseCorrelationModel(metaclass=abc.ABCMeta):
         NB: the correlation matrix is cached. It is computed only once
         per IMT for the complete site collection and then the portion
         corresponding to the sites is multiplied by the residuals.
+        The same happens with the "vecchia" method, while with the
+        "nystrom" method only the given sites are considered.
         """
+        if self.method == 'nystrom':
+            return self.apply_nystrom(sites, imt, residuals)
+        elif self.method == 'vecchia':
+            return self.apply_vecchia(sites, imt, residuals)
         # intra-event residual for a single relization is a product
         # of lower-triangle decomposed correlation matrix and vector
         # of N random numbers (where N is equal to number of sites).
@@ -84,10 +303,18 @@ class JB2009CorrelationModel(BaseCorrelationModel):
         Boolean value to indicate whether "Case 1" or "Case 2" from page 1700
         should be applied. ``True`` value means that Vs 30 values show or are
         expected to show clustering ("Case 2"), ``False`` means otherwise.
+    :param method:
+        "cholesky", "nystrom" or "vecchia", see :class:`BaseCorrelationModel`
+    :param landmarks:
+        the number of landmark sites for the "nystrom" method
+    :param neighbors:
+        the number of conditioning sites for the "vecchia" method
     """
-    def __init__(self, vs30_clustering):
+    def __init__(self, vs30_clustering, method='cholesky', landmarks=1000,
+                 neighbors=16):
         self.vs30_clustering = vs30_clustering
         self.cache = {}  # imt -> correlation model
+        self._init_method(method, landmarks, neighbors)
 
     def _get_correlation_matrix(self, sites, imt):
         return jbcorrelation(sites, imt, self.vs30_clustering)
@@ -160,11 +387,24 @@ class HM2018CorrelationModel(BaseCorrelationModel):
         Value to be multiplied by the uncertainty in the correlation parameter
         beta. If uncertainty_multiplier = 0 (default), the median value is
         used as a constant value.
+    :param method:
+        "cholesky", "nystrom" or "vecchia", see
+        :class:`BaseCorrelationModel`; the approximated methods require
+        uncertainty_multiplier = 0
+    :param landmarks:
+        the number of landmark sites for the "nystrom" method
+    :param neighbors:
+        the number of conditioning sites for the "vecchia" method
     """
-    def __init__(self, uncertainty_multiplier=0):
+    def __init__(self, uncertainty_multiplier=0, method='cholesky',
+                 landmarks=1000, neighbors=16):
         self.uncertainty_multiplier = uncertainty_multiplier
         self.distance_matrix = {}
         self.cache = {}
+        self._init_method(method, landmarks, neighbors)
+        if method != 'cholesky' and uncertainty_multiplier:
+            raise ValueError('The %s method requires '
+                             'uncertainty_multiplier=0' % method)
 
     def _get_correlation_matrix(self, sites, imt):
         return hmcorrelation(sites, imt, self.uncertainty_multiplier)
@@ -188,6 +428,12 @@ class HM2018CorrelationModel(BaseCorrelationModel):
             # For this, every row of 'residuals' (every site) is divided by its
             # corresponding standard deviation element.
             residuals_norm = residuals / stddev_intra[:, None]
+            if self.method == 'nystrom':
+                return stddev_intra[:, None] * self.apply_nystrom(
+                    sites, imt, residuals_norm)
+            elif self.method == 'vecchia':
+                return stddev_intra[:, None] * self.apply_vecchia(
+                    sites, imt, residuals_norm)
 
             # Lower diagonal of the Cholesky decomposition
             # Note that instead of computing the whole correlation matrix
@@ -215,24 +461,18 @@ class HM2018CorrelationModel(BaseCorrelationModel):
             return residuals_correlated
 
 
-def hmcorrelation(sites_or_distances, imt, uncertainty_multiplier=0):
+def hm_beta(imt, uncertainty_multiplier=0):
     """
-    Returns the Heresi-Miranda correlation model.
+    Returns a realization of the parameter beta of the Heresi-Miranda
+    correlation model.
 
-    :param sites_or_distances:
-        SiteCollection instance o distance matrix
     :param imt:
         Intensity Measure Type (PGA or SA)
     :param uncertainty_multiplier:
         Value to be multiplied by the uncertainty in the correlation parameter
         beta. If uncertainty_multiplier = 0 (default), the median value is
-        used as a constant value.
+        returned.
     """
-    if hasattr(sites_or_distances, 'mesh'):
-        distances = sites_or_distances.mesh.get_distance_matrix()
-    else:
-        distances = sites_or_distances
-
     period = imt.period
 
     # Eq. (9)
@@ -250,6 +490,31 @@ def hmcorrelation(sites_or_distances, imt, uncertainty_multiplier=0):
     else:
         beta = numpy.random.lognormal(
             numpy.log(Med_b), Std_b * uncertainty_multiplier)
+    return beta
+
+
+def hmcorrelation(sites_or_distances, imt, uncertainty_multiplier=0,
+                  beta=None):
+    """
+    Returns the Heresi-Miranda correlation model.
+
+    :param sites_or_distances:
+        SiteCollection instance o distance matrix
+    :param imt:
+        Intensity Measure Type (PGA or SA)
+    :param uncertainty_multiplier:
+        Value to be multiplied by the uncertainty in the correlation parameter
+        beta. If uncertainty_multiplier = 0 (default), the median value is
+        used as a constant value.
+    :param beta:
+        If given, use this realization of beta instead of drawing a new one
+    """
+    if hasattr(sites_or_distances, 'mesh'):
+        distances = sites_or_distances.mesh.get_distance_matrix()
+    else:
+        distances = sites_or_distances
+    if beta is None:
+        beta = hm_beta(imt, uncertainty_multiplier)
 
     # Eq. (8)
     res = numpy.exp(-numpy.power((distances / beta), 0.55))
@@ -80,17 +80,26 @@ def _resample(line, sect_len, orig_extremes):
             _update(rtra, rtra_prj, line.proj, pnt)
             inc_len += sect_len
 
-            # Adding more points still on the same segment
+            # Adding more points still on the same segment; they are
+            # equally spaced, so they are computed and projected back
+            # all together
             delta = txy[idx + 1] - rtra_prj[-1]
             chk_dst = utils.get_dist(txy[idx + 1], rtra_prj[-1])
             rat = delta / chk_dst
-            while chk_dst > sect_len * 0.9999:
-                _update(rtra, rtra_prj, line.proj,
-                        rtra_prj[-1] + sect_len * rat)
-                inc_len += sect_len
-                # This is the distance between the last resampled point
-                # and the second vertex of the segment
-                chk_dst = utils.get_dist(txy[idx + 1], rtra_prj[-1])
+            num = int(chk_dst / sect_len) + 1
+            steps = np.arange(1, num + 1)[:, None] * sect_len
+            pnts = rtra_prj[-1] + steps * rat  # shape (num, 3)
+            # distances between the resampled points and the second vertex
+            # of the segment; stop at the first one below the sampling
+            dsts = np.concatenate(
+                [[chk_dst], utils.get_dist(pnts, txy[idx + 1])])
+            below = dsts <= sect_len * 0.9999
+            n = below.argmax() if below.any() else num
+            if n:
+                xg, yg = line.proj(pnts[:n, 0], pnts[:n, 1], reverse=True)
+                rtra.extend(np.column_stack([xg, yg, pnts[:n, 2]]))
+                rtra_prj.extend(pnts[:n])
+                inc_len += sect_len * n
         else:
 
             same_dir = True
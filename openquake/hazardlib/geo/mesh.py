@@ -23,6 +23,7 @@ its subclass :class:`RectangularMesh`.
 
 import warnings
 import numpy
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 import shapely.geometry
 import shapely.ops
@@ -34,6 +35,8 @@ from openquake.hazardlib.geo import geodetic
 from openquake.hazardlib.geo import utils as geo_utils
 
 F32 = numpy.float32
+F64 = numpy.float64
+KDTREE_MIN_SIZE = 1_000_000  # used in get_joyner_boore_distance
 
 
 def reduce1d(array, n):
@@ -212,20 +215,41 @@ class Mesh(object):
     # NB: it affects the rjb distance and therefore nearly every calculation
     DIST_TOLERANCE = 0.005
 
+    # Tolerance on the distances computed from compact meshes -- 10 meters;
+    # in practice the differences are well below 1 meter
+    COMPACT_TOLERANCE = 0.01
+
+    @property
+    def is_compact(self):
+        """
+        True for the meshes returned by :meth:`compact`
+        """
+        return '_dxyz' in self.__dict__
+
+    # NB: the lons, lats and depths of a compact mesh are fresh float64
+    # copies of the float32 coordinates, so changing them in place has no
+    # effect on the mesh: build a new mesh instead
     @property
     def lons(self):
+        if self.is_compact:  # compute in double precision
+            return F64(self.array[0])
         return self.array[0]
 
     @property
     def lats(self):
+        if self.is_compact:  # compute in double precision
+            return F64(self.array[1])
         return self.array[1]
 
     @property
     def depths(self):
         try:
-            return self.array[2]
+            depths = self.array[2]
         except IndexError:
             return numpy.zeros(self.shape)
+        if self.is_compact:  # compute in double precision
+            return F64(depths)
+        return depths
 
     def __init__(self, lons, lats, depths=None, round=None):
         assert ((lons.shape == lats.shape) and len(lons.shape) in (1, 2)
@@ -292,13 +316,45 @@ class Mesh(object):
         """
         return self.array.shape[1:]
 
-    @cached_property
+    @property
     def xyz(self):
         """
         :returns: an array of shape (N, 3) with the cartesian coordinates
         """
-        return geo_utils.spherical_to_cartesian(
-            self.lons.flat, self.lats.flat, self.depths.flat)
+        # NB: this property is also used by SiteCollection
+        try:
+            return self.__dict__['xyz']
+        except KeyError:
+            pass
+        if '_dxyz' in self.__dict__:  # compact mesh
+            xyz = self._xyz0 + self._dxyz
+        else:
+            xyz = geo_utils.spherical_to_cartesian(
+                self.lons.flat, self.lats.flat, self.depths.flat)
+        self.__dict__['xyz'] = xyz
+        return xyz
+
+    def compact(self):
+        """
+        :returns:
+            a mesh of the same kind using half of the memory, with float32
+            coordinates and float32 cartesian coordinates relative to the
+            center of the mesh; the distances computed from a compact mesh
+            differ from the original ones by less than COMPACT_TOLERANCE
+        """
+        xyz = self.xyz
+        new = object.__new__(self.__class__)
+        new.array = F32(self.array)
+        new._xyz0 = numpy.nanmean(xyz, axis=0)
+        new._dxyz = F32(xyz - new._xyz0)
+        return new
+
+    def _cdist(self, xyz):
+        # distance matrix between the points of the mesh and the given
+        # cartesian coordinates; compact meshes use relative coordinates
+        if self.is_compact:
+            return cdist(self._dxyz, xyz - self._xyz0)
+        return cdist(self.xyz, xyz)
 
     def __iter__(self):
         """
@@ -379,7 +435,7 @@ class Mesh(object):
         # in the large array of shape len(self)*N
         dists = []
         for slc in gen_slices(0, len(mesh), 10_000):
-            dists.append(cdist(self.xyz, mesh.xyz[slc]).min(axis=0))
+            dists.append(self._cdist(mesh.xyz[slc]).min(axis=0))
         return numpy.concatenate(dists)
 
     def get_closest_points(self, mesh):
@@ -390,7 +446,7 @@ class Mesh(object):
             :class:`Mesh` object of the same shape as `mesh` with closest
             points from this one at respective indices.
         """
-        min_idx = cdist(self.xyz, mesh.xyz).argmin(axis=0)  # lose shape
+        min_idx = self._cdist(mesh.xyz).argmin(axis=0)  # lose shape
         if hasattr(mesh, 'shape'):
             min_idx = min_idx.reshape(mesh.shape)
         lons = self.lons.take(min_idx)
@@ -473,8 +529,21 @@ class Mesh(object):
         # depends on mesh spacing. but the difference can be neglected
         # if calculated geodetic distance is over some threshold.
         # get the highest slice from the 3D mesh
-        distances = geodetic.min_geodetic_distance(
-            (self.lons, self.lats), (mesh.lons, mesh.lats))
+        if len(self) * len(mesh) > KDTREE_MIN_SIZE:
+            # for big site collections use a KD-tree on the projection of
+            # the mesh on the earth surface, built once per mesh
+            xyz = geodetic.spherical_to_cartesian(
+                mesh.lons.flatten(), mesh.lats.flatten())
+            distances, _ = self._surface_kdtree.query(xyz)
+        else:
+            distances = geodetic.min_geodetic_distance(
+                (self.lons, self.lats), (mesh.lons, mesh.lats))
+        return self._fix_close_distances(distances, mesh, unstructured)
+
+    def _fix_close_distances(self, distances, mesh, unstructured=False):
+        # replace the distances from the points of the mesh which are
+        # below the threshold with the distances from the enclosing polygon;
+        # also used by the batched Rjb distances in contexts.py
         # here we find the points for which calculated mesh-to-mesh
         # distance is below a threshold. this threshold is arbitrary:
         # lower values increase the maximum possible error, higher
@@ -522,7 +591,7 @@ class Mesh(object):
             shaper = Alpha_Shaper(points)
             _alpha_opt, polygon = shaper.optimize()
         else:
-            proj, polygon = self._get_proj_enclosing_polygon()
+            proj, polygon = self._proj_polygon
 
         if not isinstance(polygon, shapely.geometry.Polygon):
             # either line or point is our enclosing polygon. draw
@@ -538,6 +607,22 @@ class Mesh(object):
 
         return distances
 
+    def __getstate__(self):
+        # do not pickle the caches used in get_joyner_boore_distance
+        return {k: v for k, v in vars(self).items()
+                if k not in ('_proj_polygon', '_surface_kdtree')}
+
+    @cached_property
+    def _proj_polygon(self):
+        # the enclosing polygon is expensive and used for each site
+        # collection in get_joyner_boore_distance, so it is cached
+        return self._get_proj_enclosing_polygon()
+
+    @cached_property
+    def _surface_kdtree(self):
+        return cKDTree(geodetic.spherical_to_cartesian(
+            self.lons.flatten(), self.lats.flatten()))
+
     def _get_proj_enclosing_polygon(self):
         """
         See :meth:`Mesh._get_proj_enclosing_polygon`.
@@ -35,6 +35,12 @@ def _get_finite_mesh(mesh):
     ok = numpy.isfinite(mesh.lons.flat)
     if numpy.all(ok):
         return mesh
+    if mesh.is_compact:  # keep the relative cartesian coordinates
+        fmesh = object.__new__(Mesh)
+        fmesh.array = mesh.array[:, ok.reshape(mesh.shape)]
+        fmesh._xyz0 = mesh._xyz0
+        fmesh._dxyz = mesh._dxyz[ok]
+        return fmesh
     ok = numpy.reshape(ok, mesh.lons.shape)
     return Mesh(mesh.lons[ok], mesh.lats[ok], mesh.depths[ok])
 
@@ -45,6 +45,47 @@ SMALL = 1e-5
 VERY_SMALL = 1e-20
 VERY_BIG = 1e20
 ALMOST_RIGHT_ANGLE = 89.9
+MAX_CACHED_MB = 100  # maximum size of the cache of the kite meshes
+
+
+class _MeshCache(object):
+    """
+    Cache of the kite meshes, used in KiteSurface.from_profiles. When its
+    size exceeds `max_mb` the least recently used meshes are discarded.
+    """
+    def __init__(self, max_mb):
+        self.max_mb = max_mb
+        self.dic = {}  # key -> mesh array, in order of last use
+        self.nbytes = 0
+
+    def __getitem__(self, key):
+        msh = self.dic.pop(key)
+        self.dic[key] = msh  # move to the end, as the most recently used
+        return msh
+
+    def __setitem__(self, key, msh):
+        self.dic[key] = msh
+        self.nbytes += len(key[1]) + msh.nbytes
+        while self.nbytes > self.max_mb * 1024**2 and len(self.dic) > 1:
+            oldkey = next(iter(self.dic))
+            self.nbytes -= len(oldkey[1]) + self.dic.pop(oldkey).nbytes
+
+    def __len__(self):
+        return len(self.dic)
+
+    def clear(self):
+        self.dic.clear()
+        self.nbytes = 0
+
+
+_MESH_CACHE = _MeshCache(MAX_CACHED_MB)
+
+
+def clear_mesh_cache():
+    """
+    Clear the cache of the kite meshes; called at the end of each calculation
+    """
+    _MESH_CACHE.clear()
 
 
 class KiteSurface(BaseSurface):
@@ -450,11 +491,23 @@ class KiteSurface(BaseSurface):
             Lower edge  |____________________|
 
         """
-        # Fix profiles
-        rprof, ref_idx = _fix_profiles(profiles, profile_sd, align, idl)
-
-        # Create mesh
-        msh = _create_mesh(rprof, ref_idx, edge_sd, idl, align)
+        # The meshes are cached by the content of the profiles and by the
+        # construction parameters, since the same surface is typically built
+        # many times (i.e. for each source sharing the same geometry)
+        key = (tuple(len(prof.coo) for prof in profiles),
+               b''.join(prof.coo.tobytes() for prof in profiles),
+               profile_sd, edge_sd, idl, align)
+        try:
+            msh = _MESH_CACHE[key]
+        except KeyError:
+            # Fix profiles
+            rprof, ref_idx = _fix_profiles(profiles, profile_sd, align, idl)
+
+            # Create mesh
+            msh = _create_mesh(rprof, ref_idx, edge_sd, idl, align)
+            # the cached mesh is shared, so it cannot be changed in place
+            msh.flags.writeable = False
+            _MESH_CACHE[key] = msh
 
         return cls(RectangularMesh(msh[:, :, 0], msh[:, :, 1], msh[:, :, 2]),
                    profiles, sec_id)
@@ -590,13 +643,18 @@ class KiteSurface(BaseSurface):
         return '<%s%s>' % (self.__class__.__name__, idx)
 
 
-def geom_to_kite(geom):
+def geom_to_kite(geom, compact=False):
     """
+    :param geom: a geometry array, as stored in multi_fault_sections
+    :param compact: if True, build the surface on a compact float32 mesh
     :returns: KiteSurface described by the given geometry array
     """
     shape_y, shape_z = int(geom[1]), int(geom[2])
     array = geom[3:].astype(np.float64).reshape(3, shape_y, shape_z)
-    return KiteSurface(RectangularMesh(*array))
+    surface = KiteSurface(RectangularMesh(*array))
+    if compact:
+        surface.mesh = surface.mesh.compact()
+    return surface
 
 
 def get_profiles_from_simple_fault_data(
@@ -29,6 +29,7 @@ import numpy
 import numba
 from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist, euclidean
+import shapely
 from shapely import geometry, contains_xy
 from shapely.strtree import STRtree
 
@@ -205,32 +206,37 @@ class _GeographicObjects(object):
         :returns: filtered site collection, filtered objects, discarded
         """
         assert mode in 'strict warn filter', mode
-        dic = {}
-        discarded = []
-        for sid, lon, lat in zip(sitecol.sids, sitecol.lons, sitecol.lats):
-            obj, distance = self.get_closest(lon, lat)
-            if assoc_dist is None:
-                dic[sid] = obj  # associate all
-            elif distance <= assoc_dist:
-                dic[sid] = obj  # associate within
-            elif mode == 'warn':
-                dic[sid] = obj  # associate outside
+        # query all the sites at once, using all the available cores
+        xyz = spherical_to_cartesian(sitecol.lons, sitecol.lats)
+        dists, idxs = self.kdtree.query(xyz, workers=-1)
+        if assoc_dist is None:  # associate all
+            ok = numpy.ones(len(dists), bool)
+        else:  # associate within
+            ok = dists <= assoc_dist
+        far, = (~ok).nonzero()
+        if mode == 'strict' and len(far):
+            i = far[0]
+            raise SiteAssociationError(
+                'There is nothing closer than %s km '
+                'to site (%s %s)' % (assoc_dist, sitecol.lons[i],
+                                     sitecol.lats[i]))
+        elif mode == 'warn':  # associate outside
+            for i in far:
+                obj = self.objects[idxs[i]]
                 logging.warning(
                     'The closest vs30 site (%.1f %.1f) is distant more than %d'
                     ' km from site #%d (%.1f %.1f)', obj['lon'], obj['lat'],
-                    int(distance), sid, lon, lat)
-            elif mode == 'filter':
-                discarded.append(obj)
-            elif mode == 'strict':
-                raise SiteAssociationError(
-                    'There is nothing closer than %s km '
-                    'to site (%s %s)' % (assoc_dist, lon, lat))
-        if not dic:
+                    int(dists[i]), sitecol.sids[i], sitecol.lons[i],
+                    sitecol.lats[i])
+            ok[:] = True
+        if not ok.any():
             raise SiteAssociationError(
                 'No sites could be associated within %s km' % assoc_dist)
-        sids = sorted(dic)
-        return (sitecol.filtered(sids), numpy.array([dic[s] for s in sids]),
-                discarded)
+        discarded = self.objects[idxs[~ok]]
+        sids = sitecol.sids[ok]
+        order = numpy.argsort(sids, kind='stable')
+        return (sitecol.filtered(sids[order]),
+                self.objects[idxs[ok][order]], discarded)
 
     def assoc2(self, exp, assoc_dist, region, mode):
         """
@@ -768,10 +774,8 @@ def point_to_polygon_distance(polygon, pxx, pyy):
     if pxx.ndim == 0:
         pxx = pxx.reshape((1, ))
         pyy = pyy.reshape((1, ))
-    result = numpy.array([
-        polygon.distance(geometry.Point(pxx.item(i), pyy.item(i)))
-        for i in range(pxx.size)
-    ])
+    # vectorized on all the points
+    result = shapely.distance(polygon, shapely.points(pxx.ravel(), pyy.ravel()))
     return result.reshape(pxx.shape)
 
 
@@ -240,6 +240,8 @@ class GroundShakingIntensityModel(metaclass=MetaGSIM):
     non_verified = False
     experimental = False
     adapted = False
+    #: if True the ContextMaker calls compute only once on all the contexts
+    batched = False
 
     @classmethod
     def __init_subclass__(cls):
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Module :mod:`openquake.hazardlib.gsim.onnx_gmpe` defines the
+:class:`openquake.hazardlib.gsim.onnx_gmpe.OnnxGMPE` for ground motion
+models trained with machine learning tools and exported in ONNX format
+"""
+import numpy
+
+from openquake.baselib.onnx import PicklableInferenceSession
+from openquake.hazardlib import const
+from openquake.hazardlib import imt as imt_module
+from openquake.hazardlib.site import site_param_dt
+from openquake.hazardlib.contexts import KNOWN_DISTANCES
+from openquake.hazardlib.gsim.base import GMPE
+
+
+def _get_weights(imt, imts):
+    # returns the indices of the columns to combine and the weight
+    # of the second one, interpolating linearly in log-period
+    if imt.string in imts:
+        k = imts.index(imt.string)
+        return k, k, 0.
+    sas = sorted((imt_module.from_string(im).period, k)
+                 for k, im in enumerate(imts) if im.startswith('SA'))
+    periods = [per for per, _ in sas]
+    if imt.string.startswith('SA') and sas and (
+            periods[0] < imt.period < periods[-1]):
+        i = numpy.searchsorted(periods, imt.period)
+        (per1, k1), (per2, k2) = sas[i - 1], sas[i]
+        w = numpy.log(imt.period / per1) / numpy.log(per2 / per1)
+        return k1, k2, w
+    raise KeyError('%s is not in the range of %s' % (imt, imts))
+
+
+class OnnxGMPE(GMPE):
+    """
+    Generic GMPE backed by a machine learning model in ONNX format.
+
+    The model must accept a matrix with a row of features per site, i.e.
+    the context parameters listed in `features` in the given order, and
+    must return as first output a matrix of shape (N, K) with the natural
+    logarithm of the medians (in g for the accelerations) for the K IMTs
+    listed in `imts`. Any scaling of the features must be part of the
+    model. The standard deviations are constant by IMT. IMTs not
+    returned by the model are interpolated in log-period between the
+    neighbouring spectral accelerations.
+
+    All the contexts are passed to the model in a single call, split in
+    batches of fixed size, so the inference runs at full throughput.
+
+    :param model_file: path to the .onnx file
+    :param features: names of the context parameters used by the model
+    :param imts: IMT strings corresponding to the columns of the output
+    :param sigma: total standard deviations, one for each IMT
+    :param tau: between-event standard deviations, one for each IMT
+    :param phi: within-event standard deviations, one for each IMT
+
+    If tau and phi are not given the GMPE defines only the total standard
+    deviation, so it cannot be used when the between and within-event
+    components are needed, e.g. in event based calculations with a
+    spatial correlation model.
+    """
+    DEFINED_FOR_TECTONIC_REGION_TYPE = ''
+    DEFINED_FOR_INTENSITY_MEASURE_TYPES = set()  # set at the instance level
+    DEFINED_FOR_INTENSITY_MEASURE_COMPONENT = ''
+    DEFINED_FOR_STANDARD_DEVIATION_TYPES = {
+        const.StdDev.TOTAL, const.StdDev.INTER_EVENT,
+        const.StdDev.INTRA_EVENT}
+    #: the REQUIRES_* attributes are set at the instance level
+    REQUIRES_SITES_PARAMETERS = set()
+    REQUIRES_RUPTURE_PARAMETERS = set()
+    REQUIRES_DISTANCES = set()
+    batched = True
+
+    def __init__(self, model_file, features, imts, sigma,
+                 tau=None, phi=None):
+        self.model_file = model_file
+        self.features = features
+        self.imts = imts
+        if (tau is None) != (phi is None):
+            raise ValueError('tau and phi must be given together')
+        elif tau is None:
+            self.DEFINED_FOR_STANDARD_DEVIATION_TYPES = {const.StdDev.TOTAL}
+        K = len(imts)
+        self.stds = numpy.zeros((3, K))
+        for i, std in enumerate([sigma, tau, phi]):
+            if std is None:
+                continue
+            elif len(std) != K:
+                raise ValueError(
+                    'Expected %d standard deviations, got %d' % (K, len(std)))
+            self.stds[i] = std
+        self.DEFINED_FOR_INTENSITY_MEASURE_TYPES = {
+            getattr(imt_module, imt.split('(')[0]) for imt in imts}
+        self.REQUIRES_DISTANCES = {f for f in features
+                                   if f in KNOWN_DISTANCES}
+        self.REQUIRES_SITES_PARAMETERS = {f for f in features
+                                          if f in site_param_dt}
+        self.REQUIRES_RUPTURE_PARAMETERS = set(features) - (
+            self.REQUIRES_DISTANCES | self.REQUIRES_SITES_PARAMETERS)
+        self.session = PicklableInferenceSession(model_file)
+        [inp] = self.session.get_inputs()
+        self.input_name = inp.name
+
+    def compute(self, ctx: numpy.recarray, imts, mean, sig, tau, phi):
+        X = numpy.column_stack([ctx[feat] for feat in self.features])
+        lnY = self.session.run_batched({self.input_name: X})[0]
+        for m, imt in enumerate(imts):
+            k1, k2, w = _get_weights(imt, self.imts)
+            mean[m] = (1. - w) * lnY[:, k1] + w * lnY[:, k2]
+            stds = (1. - w) * self.stds[:, k1] + w * self.stds[:, k2]
+            sig[m], tau[m], phi[m] = stds
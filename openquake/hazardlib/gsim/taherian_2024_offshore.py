@@ -90,7 +90,7 @@ def run_onnx_prediction(ort_session, Mw_scaled, Rjb_scaled,
                                   FM)).astype(np.float32)
 
     input_name = ort_session.get_inputs()[0].name
-    return np.exp(ort_session.run(None, {input_name: Input_data})[0])
+    return np.exp(ort_session.run_batched({input_name: Input_data})[0])
 
 
 def process_predictions(Median_GM, IM_list, additional_data):
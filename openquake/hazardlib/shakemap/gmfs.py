@@ -165,22 +165,15 @@ To avoid that, set a proper `region_grid_spacing` so that your exposure
 involves less sites.'''
 
 
-@calculate_gmfs.add('Silva&Horspool')
-def calculate_gmfs_sh(kind, shakemap, imts, Z, mu, spatialcorr,
-                      crosscorr, cholesky_limit):
+def cholesky_sh(shakemap, imts, spatialcorr, crosscorr, cholesky_limit):
     """
-    Implementation of paper by Silva and Horspool 2019
-    https://onlinelibrary.wiley.com/doi/abs/10.1002/eqe.3154?af=R
-
     :param shakemap: site coordinates with shakemap values
     :param imts: list of required imts
     :param spatialcorr: 'no', 'yes' or 'full'
     :param crosscorr: 'no', 'yes' or 'full'
-    :returns: F(Z, mu) to calculate gmfs
+    :param cholesky_limit: maximum size of the correlation matrix
+    :returns: the triangular matrix used by calculate_gmfs_sh
     """
-    # make sure all imts used have a period, needed for correlation
-    imts = [im for im in imts if hasattr(im, 'period')]
-    # checks
     N = len(shakemap)
     M = len(imts)
     if N * M > cholesky_limit:
@@ -202,8 +195,29 @@ def calculate_gmfs_sh(kind, shakemap, imts, Z, mu, spatialcorr,
     spatial_cov = spatial_covariance_array(stddev, spatial_corr)
 
     # Cholesky Decomposition
-    L = cholesky(spatial_cov, cross_corr)  # shape (M * N, M * N)
+    return cholesky(spatial_cov, cross_corr)  # shape (M * N, M * N)
 
+
+@calculate_gmfs.add('Silva&Horspool')
+def calculate_gmfs_sh(kind, shakemap, imts, Z, mu, spatialcorr,
+                      crosscorr, cholesky_limit, L=None):
+    """
+    Implementation of paper by Silva and Horspool 2019
+    https://onlinelibrary.wiley.com/doi/abs/10.1002/eqe.3154?af=R
+
+    :param shakemap: site coordinates with shakemap values
+    :param imts: list of required imts
+    :param spatialcorr: 'no', 'yes' or 'full'
+    :param crosscorr: 'no', 'yes' or 'full'
+    :param L: the matrix returned by cholesky_sh, computed if not given
+    :returns: F(Z, mu) to calculate gmfs
+    """
+    # make sure all imts used have a period, needed for correlation
+    imts = [im for im in imts if hasattr(im, 'period')]
+    if L is None:
+        L = cholesky_sh(shakemap, imts, spatialcorr, crosscorr,
+                        cholesky_limit)
+    stddev = [shakemap['std'][str(imt)] for imt in imts]
     sig = numpy.array(stddev).flatten()[:, numpy.newaxis]  # (M,N) -> (M*N, 1)
     # mu has unit (pctg), L has unit ln(pctg), sig has unit ln(pctg)
     return numpy.exp(L @ Z + numpy.log(mu) - (sig ** 2 / 2)) / PCTG
@@ -249,6 +263,18 @@ def calculate_gmfs_mmi(kind, shakemap, imts, Z, mu):
     return (Z.T * sig).T + mu
 
 
+def get_imts(shakemap, imts=None):
+    """
+    :param shakemap: site coordinates with shakemap values
+    :param imts: list of IMT-strings or None
+    :returns: the list of IMT-objects for which gmfs are generated
+    """
+    if imts is None or len(imts) == 0:
+        return [imt.from_string(im) for im in shakemap['std'].dtype.names]
+    return [imt.from_string(im)
+            for im in imts if im in shakemap['std'].dtype.names]
+
+
 def to_gmfs(shakemap, gmf_dict, vs30, truncation_level,
             num_gmfs, seed, imts=None):
     """
@@ -261,12 +287,7 @@ def to_gmfs(shakemap, gmf_dict, vs30, truncation_level,
     :param imts: list of IMT-strings for which gmfs are generated
     :returns: list of IMT-objects, array of GMFs of shape (N, E, M)
     """
-    # create list of imts
-    if imts is None or len(imts) == 0:
-        imts = [imt.from_string(im) for im in shakemap['std'].dtype.names]
-    else:
-        imts = [imt.from_string(im)
-                for im in imts if im in shakemap['std'].dtype.names]
+    imts = get_imts(shakemap, imts)
 
     # assign iterators
     M = len(imts)       # Number of imts
@@ -276,9 +297,9 @@ def to_gmfs(shakemap, gmf_dict, vs30, truncation_level,
     Z = truncnorm.rvs(-truncation_level, truncation_level, loc=0, scale=1,
                       size=(M * N, num_gmfs), random_state=seed)
 
-    # build array of mean values of shape (M*N, E)
-    mu = numpy.array([numpy.ones(num_gmfs) * shakemap['val'][str(imt)][j]
-                      for imt in imts for j in range(N)])
+    # build array of mean values of shape (M*N, 1), broadcast to (M*N, E)
+    mu = numpy.array([shakemap['val'][str(imt)]
+                      for imt in imts]).reshape(M * N, 1)
 
     # assemble dictionary for the calculation of the gmfs
     gmf_dict.update({'shakemap': shakemap, 'imts': imts, 'Z': Z, 'mu': mu})
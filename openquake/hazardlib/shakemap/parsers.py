@@ -24,6 +24,8 @@ to numpy composite arrays.
 import io
 import os
 import sys
+import time
+import hashlib
 import pathlib
 import logging
 import json
@@ -47,8 +49,9 @@ from xml.etree.ElementTree import Element, SubElement, tostring
 from xml.dom import minidom
 import math
 
-from openquake.baselib import performance, config
+from openquake.baselib import performance, config, hdf5
 from openquake.baselib.general import gettemp
+from openquake.baselib.python3compat import decode
 from openquake.baselib.node import node_from_xml
 from openquake.hazardlib import nrml, sourceconverter, valid
 from openquake.hazardlib.source.rupture import (
@@ -82,6 +85,7 @@ FIELDMAP = {
     'STDPSA30': ('std', 'SA(3.0)'),
 }
 REQUIRED_IMTS = {'PGA', 'PSA03', 'PSA10'}
+SHAKEMAP_JSON_TTL = 60  # seconds after which the event JSON is expired
 
 
 @dataclass
@@ -94,6 +98,130 @@ class MissingLink(Exception):
     """Could not find link in web page"""
 
 
+class ShakeMapArchive(object):
+    """
+    Local archive of USGS data, with a HDF5 file per event containing
+    the event JSON, expiring after SHAKEMAP_JSON_TTL seconds, and the
+    parsed ShakeMap arrays, indexed by a hash of the URLs of the files
+    they were parsed from; since each ShakeMap version has its own URLs,
+    the arrays never expire.
+
+    :param archive_dir: the directory containing the archive
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.archive_dir)
+
+    def _fname(self, usgs_id):
+        fname = valid.simple_id(usgs_id) + '.hdf5'
+        return os.path.join(self.archive_dir, fname)
+
+    def _read(self, usgs_id, key):
+        fname = self._fname(usgs_id)
+        if not os.path.exists(fname):
+            return None
+        try:
+            with hdf5.File(fname, 'r') as h5:
+                if key in h5:
+                    return h5[key][()], dict(h5[key].attrs)
+        except OSError as exc:  # file being written by another process
+            logging.warning('Could not read %s: %s', fname, exc)
+
+    def _write(self, usgs_id, key, data, **attrs):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        fname = self._fname(usgs_id)
+        try:
+            with hdf5.File(fname, 'a') as h5:
+                if key in h5:
+                    del h5[key]
+                dset = h5.create_dataset(key, data=data)
+                dset.attrs.update(attrs)
+        except OSError as exc:  # file being written by another process
+            logging.warning('Could not write %s: %s', fname, exc)
+
+    def get_json(self, usgs_id, ttl=SHAKEMAP_JSON_TTL):
+        """
+        :returns: the event JSON text if recent enough, otherwise None
+        """
+        got = self._read(usgs_id, 'json')
+        if got and time.time() - got[1]['time'] < ttl:
+            return got[0].tobytes()
+
+    def set_json(self, usgs_id, text):
+        """
+        Store the event JSON text, with the current time
+        """
+        self._write(usgs_id, 'json', numpy.void(text), time=time.time())
+
+    def get_array(self, usgs_id, urls):
+        """
+        :returns: the array parsed from the given URLs, or None
+        """
+        got = self._read(usgs_id, 'shakemaps/' + get_key(urls))
+        if got:
+            return got[0]
+
+    def set_array(self, usgs_id, urls, array):
+        """
+        Store the array parsed from the given URLs
+        """
+        self._write(usgs_id, 'shakemaps/' + get_key(urls), array,
+                    urls=numpy.array(urls, hdf5.vstr), time=time.time())
+
+    def get_versions(self, usgs_id):
+        """
+        :returns: a list of dictionaries key, urls, time, one per array
+        """
+        fname = self._fname(usgs_id)
+        if not os.path.exists(fname):
+            return []
+        with hdf5.File(fname, 'r') as h5:
+            if 'shakemaps' not in h5:
+                return []
+            return [{'key': key, 'urls': decode(dset.attrs['urls']),
+                     'time': dset.attrs['time']}
+                    for key, dset in h5['shakemaps'].items()]
+
+
+def get_key(urls):
+    """
+    :returns: the SHA-1 of the given URLs
+    """
+    return hashlib.sha1('\n'.join(urls).encode('utf8')).hexdigest()
+
+
+def get_archive():
+    """
+    :returns: a ShakeMapArchive if config.directory.shakemap_archive is set
+    """
+    archive_dir = config.directory.get('shakemap_archive')
+    if archive_dir:
+        return ShakeMapArchive(archive_dir)
+
+
+ARCHIVE = get_archive()  # can be replaced, for instance in the tests
+
+
+def get_cached_array(usgs_id, urls, parse):
+    """
+    :param usgs_id: the event ID
+    :param urls: the URLs of the files containing the ShakeMap
+    :param parse: a function without arguments parsing the files
+    :returns: the parsed array, possibly read from the archive
+    """
+    if ARCHIVE is None:
+        return parse()
+    array = ARCHIVE.get_array(usgs_id, urls)
+    if array is None:
+        array = parse()
+        ARCHIVE.set_array(usgs_id, urls, array)
+    else:
+        logging.info('Read the ShakeMap for %s from %s', usgs_id, ARCHIVE)
+    return array
+
+
 def urlextract(url, fname):
     """
     Download and unzip an archive and extract the underlying fname
@@ -1110,6 +1238,8 @@ def _get_usgs_event_data(usgs_id, user=User(), monitor=performance.Monitor()):
     if user.testdir:  # in parsers_test
         fname = os.path.join(user.testdir, usgs_id + '.json')
         text = open(fname).read()
+    elif ARCHIVE and (text := ARCHIVE.get_json(usgs_id)) is not None:
+        logging.info('Read the event JSON for %s from %s', usgs_id, ARCHIVE)
     else:
         url = SHAKEMAP_URL.format(usgs_id)
         logging.info('Downloading %s' % url)
@@ -1121,6 +1251,8 @@ def _get_usgs_event_data(usgs_id, user=User(), monitor=performance.Monitor()):
             err_msg = f'Unable to download from {url}: {exc}'
             err = {"status": "failed", "error_msg": err_msg}
             return None, err
+        if ARCHIVE:
+            ARCHIVE.set_json(usgs_id, text)
     usgs_event_data = json.loads(text)
     return usgs_event_data, err
 
@@ -1145,7 +1277,8 @@ def _contents_properties_shakemap(usgs_id, user, get_grid, monitor,
     if get_grid and 'download/grid.xml' in contents:
         if user.testdir:  # in parsers_test
             grid_fname = f'{user.testdir}/{usgs_id}-grid.xml'
-            shakemap_array = get_shakemap_array(grid_fname)
+            shakemap_array = get_cached_array(
+                usgs_id, [grid_fname], lambda: get_shakemap_array(grid_fname))
         else:  # download the shakemap
             shakemap_array = get_array_usgs_id("usgs_id", usgs_id, contents)
     else:
@@ -1330,22 +1463,9 @@ def get_shakemap_versions(usgs_id, user=User(), monitor=performance.Monitor()):
     except ValueError as exc:
         err = {'status': 'failed', 'error_msg': str(exc)}
         return None, None, err
-    if user.testdir:  # in parsers_test
-        fname = os.path.join(user.testdir, usgs_id + '.json')
-        text = open(fname).read()
-    else:
-        url = SHAKEMAP_URL.format(usgs_id)
-        logging.info('Downloading %s' % url)
-        try:
-            with monitor('Downloading USGS json'):
-                text = urlopen(url).read()
-        except URLError as exc:
-            # in parsers_test
-            err_msg = f'Unable to download from {url}: {exc}'
-            err = {"status": "failed", "error_msg": err_msg}
-            return None, None, err
-
-    js = json.loads(text)
+    js, err = _get_usgs_event_data(usgs_id, user, monitor)
+    if err:
+        return None, None, err
     properties = js['properties']
     shakemaps = properties['products']['shakemap']
     usgs_preferred_shakemap = _get_usgs_preferred_item(shakemaps)
@@ -1534,9 +1654,10 @@ def get_array_usgs_id(kind, id, contents={}):
         'download/uncertainty.xml')
     if not uncertainty:
         logging.warning('No uncertainty.xml file')
-    return get_array(
+    urls = [grid['url'], uncertainty['url']] if uncertainty else [grid['url']]
+    return get_cached_array(id, urls, lambda: get_array(
         kind='usgs_xml', grid_url=grid['url'],
-        uncertainty_url=uncertainty['url'] if uncertainty else None)
+        uncertainty_url=uncertainty['url'] if uncertainty else None))
 
 
 def get_array_file_npy(kind, fname):
@@ -165,17 +165,21 @@ class MultiFaultSource(BaseSeismicSource):
         :returns: the underlying sections as KiteSurfaces
         """
         with hdf5.File(self.hdf5path, 'r') as f:
-            geoms = f['multi_fault_sections'][:]  # small
+            dset = f['multi_fault_sections']
+            geoms = dset[:]  # small
+            compact = dset.attrs.get('compact', False)
         if idxs is None:
             idxs = range(len(geoms))
-        sections = [geom_to_kite(geom) for geom in geoms[idxs]]
+        sections = [geom_to_kite(geom, compact) for geom in geoms[idxs]]
         for sec, idx in zip(sections, idxs):
             sec.idx = idx
         return sections
 
     def iter_ruptures(self, **kwargs):
         """
-        An iterator for the ruptures.
+        An iterator for the ruptures. If the keyword argument `close`
+        is passed, it must be a boolean array with the ruptures to build,
+        the others are skipped.
         """
         # Check
         if not self.hdf5path:
@@ -183,6 +187,7 @@ class MultiFaultSource(BaseSeismicSource):
 
         # iter on the ruptures
         step = kwargs.get('step', 1)
+        close = kwargs.get('close')
         n = len(self.mags)
         sec = self.get_sections()  # read KiteSurfaces, very fast
         rupture_idxs = self.rupture_idxs
@@ -193,6 +198,8 @@ class MultiFaultSource(BaseSeismicSource):
         for i in range(0, n, step**2):
             if msparams[i]['area'] == 0:  # rupture far away
                 continue
+            if close is not None and not close[i]:
+                continue
             idxs = rupture_idxs[i]
             sfc = MultiSurface([sec[idx] for idx in idxs], msparams[i])
             rake = self.rakes[i]
@@ -310,7 +317,7 @@ def _set_rupids_by_tag(src, allrids, dists, s2i):
 # NB: as side effect delete _rupture_idxs,
 # add .hdf5path and possibly .rupids_by_tag
 def save_and_split(mfsources, sectiondict, hdf5path, site1=None,
-                   del_rupture_idxs=True):
+                   del_rupture_idxs=True, compact=False):
     """
     Serialize MultiFaultSources
  
@@ -375,6 +382,8 @@ def save_and_split(mfsources, sectiondict, hdf5path, site1=None,
                 split_dic[src.source_id].append(split)
         h5.save_vlen('multi_fault_sections',
                      [kite_to_geom(sec) for sec in sectiondict.values()])
+        # if compact, the sections are built on compact float32 meshes
+        h5['multi_fault_sections'].attrs['compact'] = compact
         h5['secparams'] = secparams = build_secparams(sectiondict.values())
 
     return split_dic, secparams
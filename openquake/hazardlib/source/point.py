@@ -160,7 +160,7 @@ class PointSource(ParametricSeismicSource):
         new.hypocenter_distribution = PMF([(1., depth)])
         return new
 
-    def get_planin(self, magd=None, npd=None):
+    def get_planin(self, magd=None, npd=None, msr=None):
         """
         :return: array of dtype planin_dt of shape (#mags, #planes)
         """
@@ -168,7 +168,8 @@ class PointSource(ParametricSeismicSource):
             magd = [(r, mag) for mag, r in self.get_annual_occurrence_rates()]
         if npd is None:
             npd = self.nodal_plane_distribution.data
-        msr = self.magnitude_scaling_relationship
+        if msr is None:
+            msr = self.magnitude_scaling_relationship
         planin = numpy.zeros((len(magd), len(npd)), planin_dt).view(
             numpy.recarray)
         mrate, mags = numpy.array(magd).T  # shape (2, num_mags)
@@ -230,12 +231,6 @@ class PointSource(ParametricSeismicSource):
         :returns: a dictionary mag -> list of arrays of shape (U, 3)
         """
         magd = [(r, mag) for mag, r in self.get_annual_occurrence_rates()]
-        if isinstance(self, CollapsedPointSource) and not iruptures:
-            out = AccumDict(accum=[])
-            for src in self.pointsources:
-                out += src.get_planar(shift_hypo)
-            return out
-
         hdd = numpy.array(self.hypocenter_distribution.data)
         clon, clat = self.location.x, self.location.y
         usd = self.upper_seismogenic_depth
@@ -447,16 +442,58 @@ class CollapsedPointSource(PointSource):
         """
         :returns: a list of pairs [(mag, mag_occur_rate), ...]
         """
+        # use the distinct MFDs in pdata, without building the point sources
+        mfd = self.pdata['mfd']
+        counts = numpy.bincount(mfd.inv, minlength=len(mfd.uni))
         acc = AccumDict(accum=0)
-        for psource in self.pointsources:
-            acc += dict(psource.get_annual_occurrence_rates())
+        for uni, cnt in zip(mfd.uni, counts):
+            for mag, rate in uni.get_annual_occurrence_rates():
+                if rate > 0:
+                    acc[mag] += rate * cnt
         return sorted(acc.items())
 
+    def _get_nphc(self):
+        # number of nodal planes times hypocenters per underlying source
+        npd, hcd = self.pdata['npd'], self.pdata['hcd']
+        nn = numpy.array([len(pmf.data) for pmf in npd.uni])
+        nh = numpy.array([len(pmf.data) for pmf in hcd.uni])
+        return nn[npd.inv] * nh[hcd.inv]
+
     def count_nphc(self):
         """
         :returns: the total number of nodal planes and hypocenters
         """
-        return sum(src.count_nphc() for src in self.pointsources)
+        return int(self._get_nphc().sum())
+
+    def get_planar(self, shift_hypo=False, iruptures=False):
+        """
+        :returns: a dictionary mag -> list of arrays of shape (U, 3)
+        """
+        if iruptures:  # use the mean nodal plane and hypocenter
+            return super().get_planar(shift_hypo, iruptures)
+        # build the planars directly from the pdata arrays, computing the
+        # planin once per distinct (mfd, npd, msr) triplet
+        mfd = self.pdata['mfd']
+        npd = self.pdata['npd']
+        hcd = self.pdata['hcd']
+        msr = self.pdata['msr']
+        cache = {}
+        out = AccumDict(accum=[])
+        for i, rec in enumerate(self.pdata['array']):
+            key = mfd.inv[i], npd.inv[i], msr.inv[i]
+            if key not in cache:
+                magd = [(r, mag) for mag, r in
+                        mfd[i].get_annual_occurrence_rates() if r > 0]
+                cache[key] = magd, self.get_planin(
+                    magd, npd[i].data, msr[i])
+            magd, planin = cache[key]
+            hdd = numpy.array(hcd[i].data)
+            planar = build_planar(planin, hdd, rec['lon'], rec['lat'],
+                                  rec['usd'], rec['lsd'], rec['rar'],
+                                  shift_hypo)
+            for (_rate, mag), pla in zip(magd, planar):
+                out[mag].append(pla.reshape(-1, 3))
+        return out
 
     def iter_ruptures(self, **kwargs):
         """
@@ -479,8 +516,11 @@ class CollapsedPointSource(PointSource):
         """
         :returns: the total number of underlying ruptures
         """
-        return sum(src.count_ruptures()
-                   for src in pdata_to_psources(self.pdata))
+        mfd = self.pdata['mfd']
+        nmags = numpy.array([
+            sum(rate > 0 for _mag, rate in uni.get_annual_occurrence_rates())
+            for uni in mfd.uni])
+        return int((nmags[mfd.inv] * self._get_nphc()).sum())
 
 
 def grid_point_sources(sources, ps_grid_spacing):
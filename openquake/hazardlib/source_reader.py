@@ -312,7 +312,8 @@ def get_csm(oq, full_lt, dstore=None):
     # must be called *after* _fix_dupl_ids
     fix_geometry_sections(
         smdict, csm.src_groups, dstore.tempname if dstore else '',
-        sitecol if oq.disagg_by_src and oq.use_rates else None)
+        sitecol if oq.disagg_by_src and oq.use_rates else None,
+        oq.compact_sections)
     return csm
 
 
@@ -379,7 +380,8 @@ def replace(lst, splitdic, key):
     lst[:] = new
 
 
-def fix_geometry_sections(smdict, src_groups, hdf5path='', site1=None):
+def fix_geometry_sections(smdict, src_groups, hdf5path='', site1=None,
+                          compact=False):
     """
     If there are MultiFaultSources, fix the sections according to the
     GeometryModels (if any).
@@ -410,7 +412,7 @@ def fix_geometry_sections(smdict, src_groups, hdf5path='', site1=None):
                     mfsources.append(src)
         if mfsources:
             split_dic, secparams = save_and_split(
-                mfsources, sections, hdf5path, site1)
+                mfsources, sections, hdf5path, site1, compact=compact)
             for sg in src_groups:
                 replace(sg.sources, split_dic, 'source_id')
             return secparams
@@ -22,11 +22,19 @@ U.S. Geological Survey. DOI: https://doi.org/10.5066/F7D21VPQ, see
 https://usgs.github.io/shakemap/manual4_0/tg_verification.html`.
 """
 import unittest
+from unittest import mock
 
 import numpy
 
 from openquake.hazardlib.contexts import simple_cmaker
-from openquake.hazardlib.calc.conditioned_gmfs import get_mean_covs
+from openquake.hazardlib.site import SiteCollection
+from openquake.hazardlib.imt import PGA, SA
+from openquake.hazardlib.correlation import (
+    JB2009CorrelationModel, HM2018CorrelationModel)
+from openquake.hazardlib.geo.geodetic import geodetic_distance
+from openquake.hazardlib.calc.conditioned_gmfs import (
+    get_mean_covs, compute_distance_matrix, cholesky_blocked,
+    compute_conditioned_within_covariance)
 from openquake.hazardlib.tests.calc import \
     _conditioned_gmfs_test_data as test_data
 
@@ -314,6 +322,57 @@ class SetUSGSTestCase(unittest.TestCase):
                           case_name)
 
 
+class BlockedTestCase(unittest.TestCase):
+    # 300 random sites in a 0.5x0.5 degrees square
+    rng = numpy.random.default_rng(42)
+    sites = SiteCollection.from_points(
+        rng.uniform(0, .5, 300), rng.uniform(0, .5, 300))
+
+    @mock.patch('openquake.hazardlib.calc.conditioned_gmfs.TILESIZE', 7000)
+    def test_distance_matrix(self):
+        lons, lats = self.sites.lons, self.sites.lats
+        expected = geodetic_distance(lons[:, None], lats[:, None], lons, lats)
+        aac(compute_distance_matrix(self.sites, self.sites), expected,
+            rtol=1E-6)
+
+    @mock.patch('openquake.hazardlib.calc.conditioned_gmfs.TILESIZE', 7000)
+    def test_within_covariance(self):
+        correl = JB2009CorrelationModel(False)
+        phi = numpy.linspace(.5, .7, 300)
+        RC = self.rng.uniform(0, .1, (300, 20))
+        cov_WD_WY = self.rng.uniform(0, .1, (20, 300))
+        rho = correl._get_correlation_matrix(
+            compute_distance_matrix(self.sites, self.sites), PGA())
+        expected = (phi[:, None] * rho * phi - RC @ cov_WD_WY).clip(min=0)
+        cov = numpy.zeros((300, 300))
+        for sl, tile in compute_conditioned_within_covariance(
+                correl, PGA(), self.sites, phi, RC, cov_WD_WY):
+            cov[sl] = tile
+        aac(cov, expected, atol=1E-12)
+
+    @mock.patch('openquake.hazardlib.calc.conditioned_gmfs.TILESIZE', 7000)
+    def test_within_covariance_hm2018(self):
+        # the random beta must be the same for all the tiles,
+        # so the covariance matrix must be symmetric
+        correl = HM2018CorrelationModel(uncertainty_multiplier=1)
+        phi = numpy.linspace(.5, .7, 300)
+        zeros = numpy.zeros((300, 20))
+        cov = numpy.zeros((300, 300))
+        for sl, tile in compute_conditioned_within_covariance(
+                correl, SA(1.0), self.sites, phi, zeros, zeros.T):
+            cov[sl] = tile
+        aac(cov, cov.T, atol=1E-12)
+
+    def test_cholesky(self):
+        rho = JB2009CorrelationModel(False)._get_correlation_matrix(
+            self.sites, PGA())
+        cov = rho + numpy.eye(300) * 1E-6
+        expected = numpy.linalg.cholesky(cov)
+        aac(cholesky_blocked(cov.copy(), blocksize=64), expected, atol=1E-10)
+        aac(cholesky_blocked(cov.copy(), blocksize=1000), expected,
+            atol=1E-10)
+
+
 # Functions useful for debugging purposes. Recreates the plots on
 # https://usgs.github.io/shakemap/manual4_0/tg_verification.html
 # Original code is from the ShakeMap plotting modules
@@ -18,7 +18,7 @@ import os.path
 import numpy
 import pytest
 
-from openquake.baselib.general import pprod
+from openquake.baselib.general import pprod, DictArray
 from openquake.hazardlib.nrml import to_python
 from openquake.hazardlib.calc import disagg, filters
 from openquake.hazardlib import nrml, read_input, valid
@@ -84,6 +84,48 @@ class DigitizeLonsTestCase(unittest.TestCase):
         numpy.testing.assert_equal(idx, expected)
 
 
+class BuildDisaggMatrixTestCase(unittest.TestCase):
+    def test_scatter(self):
+        # the scatter in log space must give the same matrix as
+        # multiplying the pnes rupture by rupture
+        rng = numpy.random.default_rng(42)
+        U, E, M, P = 500, 3, 2, 2
+        bins = [numpy.arange(0, 101, 20.), numpy.arange(9., 11.1, .5),
+                numpy.arange(44., 46.1, .5), numpy.arange(-3, 3.1, 2)]
+        dists = rng.uniform(0, 100, U)
+        lons = rng.uniform(9, 11, U)
+        lats = rng.uniform(44, 46, U)
+        pnes = rng.uniform(.9, 1., (U, E, M, P))
+        pnes[0] = 0.  # certain exceedence
+        with numpy.errstate(divide='ignore'):
+            bdata = disagg.BinData(dists, lons, lats, numpy.log(pnes))
+        mat = disagg._build_disagg_matrix(bdata, bins)
+        self.assertEqual(mat.shape, (5, 4, 4, 3, M, P))
+        expected = numpy.ones((5, 4, 4, E, M, P))
+        for d, lo, la, pne in zip(
+                numpy.digitize(dists, bins[0]) - 1,
+                numpy.digitize(lons, bins[1]) - 1,
+                numpy.digitize(lats, bins[2]) - 1, pnes):
+            expected[d, lo, la] *= pne
+        numpy.testing.assert_allclose(mat, 1. - expected, atol=1E-12)
+
+
+class InterpDisaggHistTestCase(unittest.TestCase):
+    def test_interp(self):
+        # power-law rates are interpolated exactly in log-log space,
+        # zero rates linearly
+        imtls = DictArray({'PGA': [.01, .1, 1.]})
+        hist = numpy.zeros((2, 1, 3))
+        hist[0, 0] = [1E-1, 1E-2, 1E-3]
+        hist[1, 0] = [1E-2, 0., 0.]
+        iml2 = numpy.array([[.01, .0316227766, 2., 0.]])
+        out = disagg.interp_disagg_hist(hist, imtls, iml2)
+        self.assertEqual(out.shape, (2, 1, 4))
+        numpy.testing.assert_allclose(
+            out[0, 0], [1E-1, 10 ** -1.5, 1E-3, 0.])
+        numpy.testing.assert_allclose(out[1, 0], [1E-2, .005, 0., 0.])
+
+
 class DisaggregateTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
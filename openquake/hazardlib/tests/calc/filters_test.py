@@ -17,6 +17,7 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import unittest
+import numpy
 from numpy.testing import assert_almost_equal as aae
 from openquake.baselib.general import gettemp
 from openquake.hazardlib import nrml
@@ -60,6 +61,18 @@ class SourceFilterTestCase(unittest.TestCase):
         sites = srcfilter.get_close_sites(src)
         self.assertIsNotNone(sites)
 
+    def test_within_bbox(self):
+        # the sorted index must give the same sites as the linear scan
+        rng = numpy.random.default_rng(42)
+        lons = rng.uniform(-10, 10, 1000)
+        lats = rng.uniform(30, 50, 1000)
+        sitecol = SiteCollection.from_points(lons, lats)
+        srcfilter = SourceFilter(sitecol, IntegrationDistance.new('200'))
+        for bbox in [(-5, 35, 5, 45), (-20, 20, -9, 31), (11, 30, 12, 50),
+                     (0, 40, 0, 40), (-180, -90, 180, 90)]:
+            numpy.testing.assert_equal(srcfilter.within_bbox(bbox),
+                                       sitecol.within_bbox(bbox))
+
 
 # from https://groups.google.com/d/msg/openquake-users/P03SxJsfW_s/nCdcxj8WAAAJ
 characteric_source = '''\
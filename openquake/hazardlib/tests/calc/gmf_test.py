@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2026, GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import numpy
+from openquake.hazardlib.imt import PGA, SA
+from openquake.hazardlib.calc import gmf
+from openquake.sep.classes import ZhuEtAl2015LiquefactionGeneral
+
+
+class SecPerilsTestCase(unittest.TestCase):
+
+    def test_blocks_vs_events(self):
+        # computing the secondary perils on blocks of events must give
+        # the same results as computing them event by event
+        N, E = 5, 7
+        rng = numpy.random.default_rng(42)
+        ctx = numpy.zeros(N, [('sids', numpy.uint32), ('vs30', float),
+                              ('cti', float), ('rrup', float)]).view(
+                                  numpy.recarray)
+        ctx['sids'] = numpy.arange(N)
+        ctx['vs30'] = rng.uniform(200, 800, N)
+        ctx['cti'] = rng.uniform(2, 12, N)
+        ctx['rrup'] = rng.uniform(10, 100, N)
+        imts = [PGA(), SA(1.0)]
+        array = rng.uniform(.01, 1., (N, len(imts), E))
+        sp = ZhuEtAl2015LiquefactionGeneral()
+        comp = SimpleNamespace(ctx=ctx, imts=imts, sec_perils=[sp])
+        data = {f'ZhuEtAl2015LiquefactionGeneral_{out}': []
+                for out in sp.outputs}
+        with mock.patch.object(gmf, 'SEC_PERIL_ROWS', 2 * N):
+            gmf.GmfComputer.compute_sec_perils(comp, data, array, 6.5)
+        for out, expected in zip(sp.outputs, zip(*[
+                sp.compute(6.5, zip(imts, array[:, :, e].T), ctx)
+                for e in range(E)])):
+            key = f'ZhuEtAl2015LiquefactionGeneral_{out}'
+            self.assertEqual(len(data[key]), 4)  # blocks of 2 events
+            numpy.testing.assert_allclose(
+                numpy.concatenate(data[key]), numpy.concatenate(expected))
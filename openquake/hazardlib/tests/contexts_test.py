@@ -26,7 +26,8 @@ from openquake.hazardlib import site
 from openquake.hazardlib.pmf import PMF
 from openquake.hazardlib.const import TRT
 from openquake.hazardlib.tom import PoissonTOM
-from openquake.hazardlib.contexts import Effect, ContextMaker, get_distances
+from openquake.hazardlib.contexts import (
+    Effect, ContextMaker, get_distances, _gen_rrups)
 from openquake.hazardlib import valid
 from openquake.hazardlib.geo.surface import SimpleFaultSurface as SFS
 from openquake.hazardlib.source.multi_fault import save_and_split
@@ -35,8 +36,9 @@ from openquake.hazardlib.source.rupture import \
 from openquake.hazardlib.geo import Line, Point
 from openquake.hazardlib.geo.surface.multi import build_secparams
 from openquake.hazardlib.site import Site, SiteCollection
-from openquake.hazardlib.source import PointSource
+from openquake.hazardlib.source import PointSource, SimpleFaultSource
 from openquake.hazardlib.mfd import ArbitraryMFD
+from openquake.hazardlib.calc.filters import IntegrationDistance
 from openquake.hazardlib.scalerel import WC1994
 from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.geo.surface.planar import (
@@ -294,6 +296,91 @@ class GetCtxs02TestCase(unittest.TestCase):
         self.assertAlmostEqual(dst, self.ctx.ry0, delta=1e-3)
 
 
+class MeshRrupsTestCase(unittest.TestCase):
+    def test_simple_fault(self):
+        # the batched distances must be the same as the ones
+        # computed rupture by rupture
+        src = SimpleFaultSource(
+            'SFLT', 'sfault', TRT.ACTIVE_SHALLOW_CRUST,
+            ArbitraryMFD([6.0, 6.5], [1E-3, 1E-4]), 2., WC1994(), 1.5,
+            PoissonTOM(1.), 0., 15.,
+            Line([Point(0., 0.), Point(0.3, 0.1), Point(0.5, 0.3)]), 60., 90.)
+        lons, lats = numpy.meshgrid(
+            numpy.linspace(-.5, 1., 20), numpy.linspace(-.2, .8, 20))
+        sitecol = SiteCollection.from_points(lons.flatten(), lats.flatten())
+        rups = list(src.iter_ruptures())
+        params = ('rrup', 'rjb', 'repi', 'rhypo')
+        got = dict(_gen_rrups(rups, sitecol, None, params))
+        self.assertEqual(len(got), len(rups))
+        for rup in rups:
+            for par in params:
+                aac(got[rup][par], get_distances(rup, sitecol, par),
+                    atol=1E-6, err_msg=par)
+        # some sites are inside the projection of the ruptures
+        self.assertTrue(any((got[rup]['rjb'] == 0).any() for rup in rups))
+
+
+class AttCurvesTestCase(unittest.TestCase):
+    def test_far_contexts(self):
+        # the far contexts are approximated by interpolating attenuation
+        # curves, the close ones are computed exactly
+        src = PointSource(
+            'ps', 'pointsource', TRT.ACTIVE_SHALLOW_CRUST,
+            ArbitraryMFD([6.0], [1E-3]), 2., WC1994(), 1., PoissonTOM(1.),
+            0., 20., Point(0., 0.), PMF([(1., NodalPlane(0., 90., 0.))]),
+            PMF([(1., 10.)]))
+        sitecol = SiteCollection([
+            Site(Point(lon, 0.), vs30=760, vs30measured=False,
+                 z1pt0=20, z2pt5=30) for lon in numpy.linspace(.1, 2.5, 500)])
+        gsims = [valid.gsim('BooreAtkinson2008'), AbrahamsonEtAl2014()]
+        param = dict(imtls={'PGA': [.01, .1], 'SA(1.0)': [.01, .1]},
+                     truncation_level=3., maximum_distance=IntegrationDistance.new('300'),
+                     att_curves_distance={'default': 100.})
+        cmaker = ContextMaker(TRT.ACTIVE_SHALLOW_CRUST, gsims, param)
+        [ctx] = cmaker.get_ctx_iter(src, sitecol)
+        err = cmaker.check_att_curves(ctx)
+        far = (ctx.rrup > 100.).sum()
+        num_approx, num_far, max_err = cmaker.att_stats
+        self.assertEqual(num_far, far)
+        self.assertEqual(num_approx, far)
+        self.assertLess(max_err, cmaker.att_curves_tolerance)
+        self.assertLess(err['mea'], cmaker.att_curves_tolerance)
+        self.assertLess(err['sig'], cmaker.att_curves_tolerance)
+
+        # with a zero tolerance everything is computed exactly
+        cmaker.att_curves_tolerance = 0
+        cmaker.att_stats[:] = 0
+        err = cmaker.check_att_curves(ctx)
+        self.assertEqual(cmaker.att_stats[0], 0)
+        self.assertEqual(max(err.values()), 0)
+
+    def test_hanging_wall(self):
+        # dipping rupture with far sites on both sides: the hanging wall
+        # terms depend on the sign of rx, so the two sides must not be
+        # interpolated together
+        src = PointSource(
+            'ps', 'pointsource', TRT.ACTIVE_SHALLOW_CRUST,
+            ArbitraryMFD([7.0], [1E-3]), 2., WC1994(), 1., PoissonTOM(1.),
+            0., 20., Point(0., 0.), PMF([(1., NodalPlane(0., 30., 90.))]),
+            PMF([(1., 10.)]))
+        sitecol = SiteCollection([
+            Site(Point(lon, .3), vs30=760, vs30measured=False,
+                 z1pt0=20, z2pt5=30) for lon in numpy.linspace(-2.5, 2.5, 1000)])
+        gsims = [AbrahamsonEtAl2014(), valid.gsim('ChiouYoungs2014'),
+                 valid.gsim('CampbellBozorgnia2014')]
+        param = dict(imtls={'PGA': [.01, .1], 'SA(1.0)': [.01, .1]},
+                     truncation_level=3., maximum_distance=IntegrationDistance.new('300'),
+                     att_curves_distance={'default': 50.})
+        cmaker = ContextMaker(TRT.ACTIVE_SHALLOW_CRUST, gsims, param)
+        [ctx] = cmaker.get_ctx_iter(src, sitecol)
+        far = ctx.rrup > 50.
+        self.assertTrue((ctx.rx[far] >= 0).any() and (ctx.rx[far] < 0).any())
+        err = cmaker.check_att_curves(ctx)
+        self.assertGreater(cmaker.att_stats[0], 0)
+        self.assertLess(err['mea'], cmaker.att_curves_tolerance)
+        self.assertLess(err['sig'], cmaker.att_curves_tolerance)
+
+
 class FastRatesTestCase(unittest.TestCase):
     """
     Optimized ways to compute the rates for a source
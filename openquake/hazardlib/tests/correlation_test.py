@@ -19,11 +19,12 @@ import numpy
 
 from openquake.hazardlib.imt import SA, PGA
 from openquake.hazardlib.correlation import JB2009CorrelationModel, \
-                                            HM2018CorrelationModel
+    HM2018CorrelationModel, get_landmarks
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.geo import Point
 
 aaae = numpy.testing.assert_array_almost_equal
+ae = numpy.testing.assert_equal
 
 
 class JB2009CorrelationMatrixTestCase(unittest.TestCase):
@@ -245,6 +246,107 @@ class HM2018CorrelationMatrixTestCase(unittest.TestCase):
                      [0.4102512,    0.5636907,    0.4102512,    0.00000,]], 2)
 
 
+class NystromTestCase(unittest.TestCase):
+    # 400 sites on a 20x20 grid with spacing 0.05 degrees
+    lons, lats = numpy.meshgrid(numpy.arange(20) * .05, numpy.arange(20) * .05)
+    SITECOL = SiteCollection.from_points(lons.flatten(), lats.flatten())
+
+    def test_landmarks(self):
+        idx = get_landmarks(self.SITECOL.lons, self.SITECOL.lats, 100)
+        self.assertEqual(len(idx), 100)
+        self.assertEqual(len(numpy.unique(idx)), 100)
+        # all the sites are landmarks, so the method is exact
+        idx = get_landmarks(self.SITECOL.lons, self.SITECOL.lats, 400)
+        ae(idx, numpy.arange(400))
+
+    def test_exact(self):
+        # with all sites as landmarks the correlation is exact
+        numpy.random.seed(13)
+        cormo = JB2009CorrelationModel(False, method='nystrom', landmarks=400)
+        imt = SA(1.0)
+        res = cormo.apply_correlation(
+            self.SITECOL, imt, numpy.random.normal(size=(400, 20000)))
+        self.assertLess(cormo.max_error['SA(1.0)'], 1E-6)
+        corma = cormo._get_correlation_matrix(self.SITECOL, imt)
+        numpy.testing.assert_allclose(numpy.corrcoef(res), corma, atol=.05)
+
+    def test_low_rank(self):
+        # the error bound is respected by the empirical correlations
+        numpy.random.seed(13)
+        cormo = JB2009CorrelationModel(False, method='nystrom', landmarks=100)
+        imt = SA(1.0)
+        res = cormo.apply_correlation(
+            self.SITECOL, imt, numpy.random.normal(size=(400, 20000)))
+        err = cormo.max_error['SA(1.0)']
+        self.assertLess(err, 1.)
+        aaae(res.std(axis=1), numpy.ones(400), decimal=1)
+        corma = cormo._get_correlation_matrix(self.SITECOL, imt)
+        self.assertLess(numpy.abs(numpy.corrcoef(res) - corma).max(),
+                        err + .05)
+
+    def test_hm2018(self):
+        numpy.random.seed(13)
+        cormo = HM2018CorrelationModel(method='nystrom', landmarks=400)
+        imt = SA(2.0)
+        phi = numpy.full(400, .6)
+        res = cormo.apply_correlation(
+            self.SITECOL, imt, numpy.random.normal(size=(400, 20000)) * .6,
+            phi)
+        aaae(res.std(axis=1), phi, decimal=1)
+        corma = cormo._get_correlation_matrix(self.SITECOL, imt)
+        numpy.testing.assert_allclose(numpy.corrcoef(res), corma, atol=.05)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            JB2009CorrelationModel(False, method='cholesky2')
+        with self.assertRaises(ValueError):
+            HM2018CorrelationModel(1, method='nystrom')
+
+
+class VecchiaTestCase(unittest.TestCase):
+    SITECOL = NystromTestCase.SITECOL
+
+    def test_jb2009(self):
+        numpy.random.seed(13)
+        cormo = JB2009CorrelationModel(False, method='vecchia', neighbors=30)
+        imt = SA(1.0)
+        res = cormo.apply_correlation(
+            self.SITECOL, imt, numpy.random.normal(size=(400, 20000)))
+        self.assertLess(cormo.max_error['SA(1.0)'], .05)
+        aaae(res.std(axis=1), numpy.ones(400), decimal=1)
+        corma = cormo._get_correlation_matrix(self.SITECOL, imt)
+        numpy.testing.assert_allclose(numpy.corrcoef(res), corma, atol=.06)
+
+        # the factor is built for the complete site collection and reused
+        # for the filtered site collections
+        [factor] = cormo.factors.values()
+        cormo.apply_correlation(self.SITECOL, imt, res)
+        self.assertIs(cormo.factors['SA(1.0)'], factor)
+        for sids in ([0, 10, 20, 399], numpy.arange(0, 400, 2)):
+            sites = self.SITECOL.filtered(sids)
+            eps = numpy.random.normal(size=(len(sids), 3))
+            got = cormo.apply_correlation(sites, imt, eps)
+            self.assertIs(cormo.factors['SA(1.0)'], factor)
+            full = numpy.zeros((400, 3))
+            full[sids] = eps
+            exp = cormo.apply_correlation(self.SITECOL, imt, full)[sids]
+            numpy.testing.assert_allclose(got, exp)
+
+    def test_hm2018(self):
+        numpy.random.seed(13)
+        cormo = HM2018CorrelationModel(method='vecchia', neighbors=30)
+        imt = SA(2.0)
+        phi = numpy.full(400, .6)
+        res = cormo.apply_correlation(
+            self.SITECOL, imt, numpy.random.normal(size=(400, 20000)) * .6,
+            phi)
+        aaae(res.std(axis=1), phi, decimal=1)
+        corma = cormo._get_correlation_matrix(self.SITECOL, imt)
+        numpy.testing.assert_allclose(numpy.corrcoef(res), corma, atol=.06)
+        with self.assertRaises(ValueError):
+            HM2018CorrelationModel(1, method='vecchia')
+
+
 class HM2018ApplyCorrelationTestCase(unittest.TestCase):
     SITECOL = SiteCollection([Site(Point(2, -40), 1, 1, 1),
                               Site(Point(2, -40.1), 1, 1, 1),
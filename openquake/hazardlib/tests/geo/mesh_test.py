@@ -20,7 +20,9 @@ import numpy
 
 from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.geo.polygon import Polygon
+from openquake.hazardlib.geo import mesh as mesh_module
 from openquake.hazardlib.geo.mesh import Mesh, RectangularMesh
+from openquake.hazardlib.geo.surface.base import _get_finite_mesh
 from openquake.hazardlib.geo import utils as geo_utils
 
 from openquake.hazardlib.tests import assert_angles_equal
@@ -264,6 +266,61 @@ class MeshGetMinDistanceTestCase(unittest.TestCase):
                    expected_distance_indices=[3, 3, 3, 0, 0, 3, 3, 3, 3])
 
 
+class CompactMeshTestCase(unittest.TestCase):
+    def test_distances(self):
+        # the distances from a float32 mesh must be within the tolerance
+        lons, lats = numpy.meshgrid(numpy.linspace(10.1, 10.6, 21),
+                                    numpy.linspace(45.2, 45.4, 11))
+        depths = numpy.repeat(numpy.linspace(0, 15, 11), 21).reshape(11, 21)
+        mesh = RectangularMesh(lons, lats, depths)
+        cmesh = mesh.compact()
+        self.assertIsInstance(cmesh, RectangularMesh)
+        self.assertTrue(cmesh.is_compact)
+        self.assertEqual(cmesh.array.nbytes, mesh.array.nbytes // 2)
+        self.assertEqual(cmesh._dxyz.nbytes, mesh.xyz.nbytes // 2)
+        self.assertEqual(cmesh.lons.dtype, numpy.float64)
+        sites = Mesh(numpy.linspace(9.5, 11, 50), numpy.linspace(44.8, 46, 50))
+        tol = Mesh.COMPACT_TOLERANCE
+        for meth in ('get_min_distance', 'get_joyner_boore_distance'):
+            numpy.testing.assert_allclose(
+                getattr(cmesh, meth)(sites), getattr(mesh, meth)(sites),
+                atol=tol)
+        cpoints = cmesh.get_closest_points(sites)
+        points = mesh.get_closest_points(sites)
+        numpy.testing.assert_allclose(
+            geo_utils.spherical_to_cartesian(
+                cpoints.lons, cpoints.lats, cpoints.depths),
+            geo_utils.spherical_to_cartesian(
+                points.lons, points.lats, points.depths), atol=tol)
+
+    def test_copies(self):
+        # the coordinates of a compact mesh are float64 copies, so
+        # changing them in place does not change the mesh;
+        # the cartesian coordinates are computed once
+        lons, lats = numpy.meshgrid(numpy.linspace(10.1, 10.6, 6),
+                                    numpy.linspace(45.2, 45.4, 3))
+        cmesh = RectangularMesh(lons, lats, numpy.ones_like(lons)).compact()
+        for name in ('lons', 'lats', 'depths'):
+            getattr(cmesh, name)[0, 0] = 0
+            self.assertNotEqual(getattr(cmesh, name)[0, 0], 0)
+        self.assertIs(cmesh.xyz, cmesh.xyz)
+
+    def test_finite_mesh(self):
+        # the NaNs of a kite mesh are removed keeping the compact form
+        lons, lats = numpy.meshgrid(numpy.linspace(10.1, 10.6, 6),
+                                    numpy.linspace(45.2, 45.4, 3))
+        lons[0, 0] = lats[0, 0] = numpy.nan
+        mesh = RectangularMesh(lons, lats, numpy.ones_like(lons))
+        fmesh = _get_finite_mesh(mesh.compact())
+        self.assertTrue(fmesh.is_compact)
+        self.assertEqual(len(fmesh), 17)
+        sites = Mesh(numpy.linspace(9.5, 11, 5), numpy.linspace(44.8, 46, 5))
+        numpy.testing.assert_allclose(
+            fmesh.get_min_distance(sites),
+            _get_finite_mesh(mesh).get_min_distance(sites),
+            atol=Mesh.COMPACT_TOLERANCE)
+
+
 class MeshGetDistanceMatrixTestCase(unittest.TestCase):
     def test_zeroes(self):
         mesh = Mesh(numpy.zeros(1000), numpy.zeros(1000), None)
@@ -371,6 +428,23 @@ class MeshJoynerBooreDistanceTestCase(unittest.TestCase):
               expected_distance=Point(0.75, 2.3).distance(Point(0.75, 2)),
               delta=0.04)
 
+    def test_kdtree(self):
+        # the KD-tree prefilter used for large site collections must give
+        # the same distances as the direct computation
+        lons = numpy.array([numpy.arange(-1, 1.2, 0.2)] * 11)
+        lats = lons.transpose() + 1
+        mesh = RectangularMesh(lons, lats, lats + 10)
+        sites = Mesh(numpy.linspace(-3, 3, 200), numpy.linspace(-2, 4, 200))
+        expected = mesh.get_joyner_boore_distance(sites)
+        orig = mesh_module.KDTREE_MIN_SIZE
+        mesh_module.KDTREE_MIN_SIZE = 0
+        try:
+            got = RectangularMesh(lons, lats, lats + 10
+                                  ).get_joyner_boore_distance(sites)
+        finally:
+            mesh_module.KDTREE_MIN_SIZE = orig
+        aac(got, expected, atol=1E-6)
+
     def test_vertical_mesh(self):
         lons = numpy.array([[0, 0.5, 1, 2], [0, 0.5, 1, 2]], float)
         lats = numpy.array([[0, 0, 0, 0], [0, 0, 0, 0]], float)
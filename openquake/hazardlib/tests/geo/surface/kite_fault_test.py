@@ -24,6 +24,7 @@ from openquake.hazardlib.nrml import read
 from openquake.hazardlib.geo import geodetic
 from openquake.hazardlib.geo import Point, Line
 from openquake.hazardlib.geo.mesh import Mesh
+from openquake.hazardlib.geo.surface import kite_fault
 from openquake.hazardlib.geo.geodetic import distance
 from openquake.hazardlib.geo.surface.kite_fault import (
     KiteSurface, kite_to_geom, geom_to_kite,
@@ -412,6 +413,36 @@ class KiteSurfaceUCF1Tests(unittest.TestCase):
             title = 'Test mesh creation'
             ppp(self.prf, srfc, title, ax_equal=True)
 
+    def test_mesh_cache(self):
+        # building the same surface twice must give the same mesh,
+        # while changing the sampling must give a different one
+        kite_fault._MESH_CACHE.clear()
+        srfc1 = KiteSurface.from_profiles(self.prf, 2.0, 1.0, False, False)
+        self.assertEqual(len(kite_fault._MESH_CACHE), 1)
+        srfc2 = KiteSurface.from_profiles(self.prf, 2.0, 1.0, False, False)
+        self.assertEqual(len(kite_fault._MESH_CACHE), 1)
+        np.testing.assert_equal(srfc1.mesh.array, srfc2.mesh.array)
+        # changing a surface does not affect the others nor the cache
+        srfc1.mesh.array[2] += 1.
+        self.assertFalse((srfc1.mesh.array == srfc2.mesh.array).all())
+        [msh] = kite_fault._MESH_CACHE.dic.values()
+        self.assertFalse(msh.flags.writeable)
+        srfc3 = KiteSurface.from_profiles(self.prf, 2.0, 2.0, False, False)
+        self.assertEqual(len(kite_fault._MESH_CACHE), 2)
+        self.assertNotEqual(srfc1.mesh.shape, srfc3.mesh.shape)
+
+        # when the cache is full the least recently used mesh is discarded
+        cache = kite_fault._MeshCache(max_mb=2.5)
+        mb = np.zeros(2**17)  # 1 MB
+        cache['a', b''] = cache['b', b''] = mb
+        cache['a', b'']  # now 'b' is the least recently used
+        cache['c', b''] = mb
+        self.assertEqual(list(cache.dic), [('a', b''), ('c', b'')])
+        self.assertEqual(cache.nbytes, 2 * mb.nbytes)
+        kite_fault.clear_mesh_cache()
+        self.assertEqual(len(kite_fault._MESH_CACHE), 0)
+        self.assertEqual(kite_fault._MESH_CACHE.nbytes, 0)
+
 
 class KiteSurfaceUCF2Tests(unittest.TestCase):
 
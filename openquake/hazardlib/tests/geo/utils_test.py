@@ -21,6 +21,7 @@ import shapely.geometry
 
 from openquake.hazardlib import geo
 from openquake.hazardlib.geo import utils
+from openquake.hazardlib.site import SiteCollection
 
 Point = collections.namedtuple("Point",  'lon lat')
 aac = numpy.testing.assert_allclose
@@ -425,4 +426,28 @@ class PlaneFit(unittest.TestCase):
         self.assertAlmostEqual(self.c[-1], -sum(par*pnt), 2)
 
 
-# NB: utils.assoc is tested in the engine
+# NB: utils.assoc is tested in the engine, here only the association modes
+class AssocTestCase(unittest.TestCase):
+    def setUp(self):
+        dt = [('lon', float), ('lat', float), ('vs30', float)]
+        self.objects = numpy.array(
+            [(0., 0., 760.), (1., 0., 400.), (2., 0., 200.)], dt)
+        self.sitecol = SiteCollection.from_points(
+            [0.01, 1.99, 1.01, 5.], [0., 0., 0., 0.])
+
+    def test_filter(self):
+        sitecol, objs, discarded = utils.assoc(
+            self.objects, self.sitecol, 10, 'filter')
+        numpy.testing.assert_equal(sitecol.sids, [0, 1, 2])
+        numpy.testing.assert_equal(objs['vs30'], [760., 200., 400.])
+        numpy.testing.assert_equal(discarded['vs30'], [200.])
+
+    def test_warn(self):
+        with self.assertLogs(level='WARNING'):
+            sitecol, objs, _ = utils.assoc(
+                self.objects, self.sitecol, 10, 'warn')
+        numpy.testing.assert_equal(objs['vs30'], [760., 200., 400., 200.])
+
+    def test_strict(self):
+        with self.assertRaises(utils.SiteAssociationError):
+            utils.assoc(self.objects, self.sitecol, 10, 'strict')
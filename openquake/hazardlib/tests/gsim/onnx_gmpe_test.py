@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2025 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import unittest
+from unittest import mock
+import numpy
+from openquake.baselib import onnx
+from openquake.hazardlib import valid, const
+from openquake.hazardlib.contexts import simple_cmaker
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'onnx')
+
+# the test model computes ln(median) = [mag, ln(rrup), ln(vs30)] @ W + b
+W = numpy.array([[1.0, 1.1, 1.3],
+                 [-1.2, -1.1, -1.0],
+                 [-0.5, -0.4, -0.6]])
+B = numpy.array([-1.5, -1.2, -3.0])
+
+GSIM = '''[OnnxGMPE]
+model_file = "linear_gmpe.onnx"
+features = ["mag", "rrup", "vs30"]
+imts = ["PGA", "SA(0.3)", "SA(1.0)"]
+sigma = [0.7, 0.75, 0.8]
+tau = [0.4, 0.4, 0.45]
+phi = [0.57, 0.63, 0.66]'''
+
+
+@unittest.skipIf(onnxruntime is None, 'onnxruntime is not installed')
+class OnnxGMPETestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.gsim = valid.gsim(GSIM, DATA)
+
+    def test_requires(self):
+        self.assertEqual(self.gsim.REQUIRES_RUPTURE_PARAMETERS, {'mag'})
+        self.assertEqual(self.gsim.REQUIRES_DISTANCES, {'rrup'})
+        self.assertEqual(self.gsim.REQUIRES_SITES_PARAMETERS, {'vs30'})
+        names = {f.__name__ for f in
+                 self.gsim.DEFINED_FOR_INTENSITY_MEASURE_TYPES}
+        self.assertEqual(names, {'PGA', 'SA'})
+
+    def test_total_only(self):
+        # without tau and phi only the total standard deviation is defined
+        gsim = valid.gsim(GSIM.split('\ntau')[0], DATA)
+        self.assertEqual(gsim.DEFINED_FOR_STANDARD_DEVIATION_TYPES,
+                         {const.StdDev.TOTAL})
+        self.assertEqual(len(self.gsim.DEFINED_FOR_STANDARD_DEVIATION_TYPES),
+                         3)
+        with self.assertRaises(ValueError):
+            valid.gsim(GSIM.split('\nphi')[0], DATA)
+
+    def test_mean_stds(self):
+        imts = ['PGA', 'SA(0.3)', 'SA(0.5)', 'SA(1.0)']
+        cmaker = simple_cmaker([self.gsim], imts)
+        ctx = cmaker.new_ctx(6)
+        ctx.mag = [5., 5., 5., 6.5, 6.5, 6.5]
+        ctx.rrup = [10., 30., 100., 10., 30., 100.]
+        ctx.vs30 = 400.
+        compute = self.gsim.__class__.compute
+        with mock.patch.object(self.gsim.__class__, 'compute',
+                               side_effect=compute, autospec=True) as comp:
+            out = cmaker.get_mean_stds([ctx])[:, 0]  # shape (4, M, N)
+        # the two magnitudes are passed to the model in a single call
+        self.assertEqual(comp.call_count, 1)
+
+        X = numpy.column_stack(
+            [ctx.mag, numpy.log(ctx.rrup), numpy.log(ctx.vs30)])
+        lnY = X @ W + B
+        w = numpy.log(.5 / .3) / numpy.log(1. / .3)
+        expected = numpy.array([lnY[:, 0], lnY[:, 1],
+                                (1 - w) * lnY[:, 1] + w * lnY[:, 2],
+                                lnY[:, 2]])
+        numpy.testing.assert_allclose(out[0], expected, rtol=1E-5)
+        numpy.testing.assert_allclose(
+            out[1, :, 0], [.7, .75, (1 - w) * .75 + w * .8, .8])
+        numpy.testing.assert_allclose(
+            out[2, :, 0], [.4, .4, .4 + w * .05, .45])
+
+    def test_outside_range(self):
+        cmaker = simple_cmaker([self.gsim], ['SA(2.0)'])
+        ctx = cmaker.new_ctx(1)
+        ctx.mag = 5.
+        ctx.rrup = 10.
+        ctx.vs30 = 400.
+        with self.assertRaises(KeyError):
+            cmaker.get_mean_stds([ctx])
+
+    def test_run_batched(self):
+        sess = self.gsim.session
+        X = numpy.random.default_rng(42).uniform(1, 100, (10, 3))
+        [expected] = sess.run(None, {'X': numpy.float32(X)})
+        [got] = sess.run_batched({'X': X}, batch_size=3)
+        numpy.testing.assert_allclose(got, expected)
+
+        # the sessions are pooled in each process
+        sess2 = pickle.loads(pickle.dumps(sess))
+        self.assertIs(sess2.inference_session, sess.inference_session)
+        self.assertIs(onnx.get_pooled_session(sess.model),
+                      sess.inference_session)
+
+    def test_pool_size(self):
+        # the least recently used session is discarded
+        fname = self.gsim.session.model
+        with open(fname, 'rb') as f:
+            model = f.read()
+        with mock.patch.object(onnx, 'MAX_SESSIONS', 1), \
+                mock.patch.dict(onnx._sessions, clear=True):
+            sess = onnx.get_pooled_session(fname)
+            self.assertIs(onnx.get_pooled_session(fname), sess)
+            onnx.get_pooled_session(model)
+            self.assertEqual(len(onnx._sessions), 1)
+            self.assertIsNot(onnx.get_pooled_session(fname), sess)
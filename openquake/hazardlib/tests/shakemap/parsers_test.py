@@ -17,11 +17,16 @@
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
-import unittest
 import csv
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy
+from openquake.hazardlib.shakemap import parsers
 from openquake.hazardlib.shakemap.parsers import (
     get_rup_dic, User, utc_to_local_time, get_stations_from_usgs,
-    get_shakemap_versions, get_nodal_planes_and_info)
+    get_shakemap_versions, get_nodal_planes_and_info, ShakeMapArchive)
 from openquake.hazardlib.source.rupture import BaseRupture
 from openquake.hazardlib.geo.surface.complex_fault import ComplexFaultSurface
 
@@ -321,3 +326,40 @@ with cProfile.Profile() as pr:
    ...
    pr.print_stats('cumulative')
 """
+
+
+class ShakeMapArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.archive = ShakeMapArchive(self.archive_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir)
+
+    def test_json(self):
+        self.assertIsNone(self.archive.get_json('us20002926'))
+        self.archive.set_json('us20002926', b'{"id": "us20002926"}')
+        self.assertEqual(self.archive.get_json('us20002926'),
+                         b'{"id": "us20002926"}')
+        # expired
+        self.assertIsNone(self.archive.get_json('us20002926', ttl=0))
+
+    def test_array(self):
+        usgs_id = 'usp0001ccb'
+        with mock.patch.object(parsers, 'ARCHIVE', self.archive):
+            _rup, dic, _err = get_rup_dic(
+                {'usgs_id': usgs_id, 'approach': 'use_shakemap_from_usgs'},
+                user=user, use_shakemap=True)
+            [version] = self.archive.get_versions(usgs_id)
+            self.assertEqual(version['urls'],
+                             [f'{user.testdir}/{usgs_id}-grid.xml'])
+
+            # the second time the array is read from the archive
+            with mock.patch.object(parsers, 'get_shakemap_array') as get:
+                _rup, dic2, _err = get_rup_dic(
+                    {'usgs_id': usgs_id,
+                     'approach': 'use_shakemap_from_usgs'},
+                    user=user, use_shakemap=True)
+            self.assertEqual(get.call_count, 0)
+        numpy.testing.assert_equal(dic2['shakemap_array'],
+                                   dic['shakemap_array'])
@@ -15,9 +15,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import copy
+import shutil
 import cProfile
 import tempfile
 import unittest
+from unittest import mock
 import numpy
 import pandas
 import matplotlib.pyplot as plt
@@ -106,6 +109,14 @@ class MultiFaultTestCase(unittest.TestCase):
         for a, b in zip(src.rupture_idxs, got.rupture_idxs):
             numpy.testing.assert_almost_equal(a, b)
 
+        # the compact meshes are used only if requested
+        self.assertFalse(any(sec.mesh.is_compact
+                             for sec in got.get_sections()))
+        with hdf5.File(fname, 'r+') as f:
+            f['multi_fault_sections'].attrs['compact'] = True
+        self.assertTrue(all(sec.mesh.is_compact
+                            for sec in got.get_sections()))
+
         # check the stored section indices
         with hdf5.File(gm_hdf5, 'r') as f:
             lines = python3compat.decode(f['01/rupture_idxs'][:])
@@ -197,6 +208,74 @@ class MultiFaultTestCase(unittest.TestCase):
                 print(col)
                 aac(df[col].to_numpy(), ctx[col], rtol=1E-5, equal_nan=1)
 
+    def test_close_ruptures(self):
+        # the ruptures discarded without building them must be the
+        # ones with all the sites beyond the maximum distance
+        [src] = load(os.path.join(BASE_DATA_PATH, 'ucerf.hdf5'))
+        sitecol = SiteCollection.from_points([-122, -121], [37, 27])
+        gsim = valid.gsim('AbrahamsonEtAl2014NSHMPMean')
+        cmaker = contexts.simple_cmaker([gsim], ['PGA'])
+        cmaker.fewsites = True
+        src.set_msparams(build_secparams(src.get_sections()))
+        dparam = contexts._build_dparam(src, sitecol, cmaker)
+        close = contexts._close_ruptures(src, dparam, cmaker.maximum_distance)
+        rups = list(src.iter_ruptures())
+        self.assertEqual(len(rups), len(close))
+        for rup, ok in zip(rups[::50], close[::50]):
+            rrup = rup.surface.get_min_distance(sitecol.mesh)
+            mdist = cmaker.maximum_distance(rup.mag)
+            self.assertEqual((rrup <= mdist).any(), ok)
+        got = list(src.iter_ruptures(close=close))
+        self.assertEqual(len(got), close.sum())
+
+    def test_bulk_contexts(self):
+        # the contexts built in bulk from the section distances must be
+        # the same as the ones built rupture by rupture
+        [src] = load(os.path.join(BASE_DATA_PATH, 'ucerf.hdf5'))
+        src.id = 0
+        sitecol = SiteCollection.from_points(
+            numpy.linspace(-123, -119, 20), numpy.linspace(35, 39, 20))
+        sitecol._set('vs30', 760.)
+        sitecol._set('vs30measured', 1)
+        sitecol._set('z1pt0', 100.)
+        sitecol._set('z2pt5', 5.)
+        gsim = valid.gsim('AbrahamsonEtAl2014NSHMPMean')
+        cmaker = contexts.simple_cmaker([gsim], ['PGA'])
+        src.set_msparams(build_secparams(src.get_sections()), ry0=True)
+        got = numpy.concatenate(list(cmaker.get_ctx_iter(src, sitecol)))
+        with mock.patch.object(contexts, '_bulk_mf', return_value=False):
+            exp = numpy.concatenate(list(cmaker.get_ctx_iter(src, sitecol)))
+        self.assertEqual(len(got), len(exp))
+        for name in exp.dtype.names:
+            aac(got[name], exp[name], rtol=1E-5, atol=1E-5, equal_nan=True,
+                err_msg=name)
+
+    def test_dparam_cache(self):
+        # the section distances for a subset of the sites must be taken
+        # from the cache and be the same as the ones computed from scratch
+        [src] = load(os.path.join(BASE_DATA_PATH, 'ucerf.hdf5'))
+        sitecol = SiteCollection.from_points(
+            [-122, -121, -120], [37, 27, 35])
+        gsim = valid.gsim('AbrahamsonEtAl2014NSHMPMean')
+        cmaker = contexts.simple_cmaker([gsim], ['PGA'])
+        sites1 = sitecol.filtered([0, 2])
+        sites2 = sitecol.filtered([1, 2])
+        contexts._build_dparam(src, sites1, cmaker)
+        self.assertEqual(len(cmaker.dcache), len(src.get_unique_idxs()))
+        got = contexts._build_dparam(src, sites2, cmaker)
+        exp = contexts._build_dparam(
+            src, sites2, contexts.simple_cmaker([gsim], ['PGA']))
+        self.assertEqual(got.keys(), exp.keys())
+        for key in exp:
+            numpy.testing.assert_allclose(got[key], exp[key])
+
+        # the sections of a source in another file are not taken from cache
+        src2 = copy.copy(src)
+        src2.hdf5path = general.gettemp(suffix='.hdf5')
+        shutil.copy(src.hdf5path, src2.hdf5path)
+        contexts._build_dparam(src2, sites2, cmaker)
+        self.assertEqual(len(cmaker.dcache), 2 * len(src.get_unique_idxs()))
+
 
 def main100sites():
     [src] = load(os.path.join(BASE_DATA_PATH, 'ucerf.hdf5'))
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
 import numpy
+from openquake.baselib.general import AccumDict
 from openquake.hazardlib.const import TRT
 from openquake.hazardlib.source.point import PointSource, CollapsedPointSource
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
@@ -454,3 +455,50 @@ class CollapsedPointSourceTestCase(unittest.TestCase):
         aac(ps1.count_ruptures(), 2)
         aac(ps2.count_ruptures(), 4)
         aac(cps.count_ruptures(), 6)
+        aac(cps.count_nphc(), 3)
+
+    def test_from_pdata(self):
+        # the rates and counts computed from the pdata arrays must be
+        # the same as the ones computed from the underlying point sources
+        mfd = TruncatedGRMFD(a_val=1, b_val=1, min_mag=5,
+                             max_mag=7, bin_width=.5)
+        psources = [
+            make_point_source(lon=1.2, lat=3.4),
+            make_point_source(lon=1.3, lat=3.4, mfd=mfd),
+            make_point_source(lon=1.3, lat=3.5, hypocenter_distribution=PMF(
+                [(.5, 4), (.5, 3)])),
+            make_point_source(lon=1.2, lat=3.5, mfd=mfd)]
+        cps = CollapsedPointSource('1', psources)
+        acc = AccumDict(accum=0)
+        for ps in psources:
+            acc += dict(ps.get_annual_occurrence_rates())
+        aac(cps.get_annual_occurrence_rates(), sorted(acc.items()))
+        self.assertEqual(cps.count_ruptures(),
+                         sum(ps.count_ruptures() for ps in psources))
+        self.assertEqual(cps.count_nphc(),
+                         sum(ps.count_nphc() for ps in psources))
+
+    def test_planar_from_pdata(self):
+        # the planars built from the pdata arrays must be the same as the
+        # ones built from the underlying point sources
+        mfd = TruncatedGRMFD(a_val=1, b_val=1, min_mag=5,
+                             max_mag=7, bin_width=.5)
+        psources = [
+            make_point_source(lon=1.2, lat=3.4),
+            make_point_source(lon=1.3, lat=3.4, mfd=mfd),
+            make_point_source(lon=1.3, lat=3.5, hypocenter_distribution=PMF(
+                [(.5, 4), (.5, 3)])),
+            make_point_source(lon=1.2, lat=3.5, mfd=mfd,
+                              magnitude_scaling_relationship=WC1994())]
+        cps = CollapsedPointSource('1', psources)
+        expected = AccumDict(accum=[])
+        for ps in psources:
+            expected += ps.get_planar()
+        planardict = cps.get_planar()
+        self.assertEqual(sorted(planardict), sorted(expected))
+        for mag, planars in planardict.items():
+            self.assertEqual(len(planars), len(expected[mag]))
+            for pla, exp in zip(planars, expected[mag]):
+                aac(pla.corners, exp.corners)
+                aac(pla.wlr, exp.wlr)
+                aac(pla.hypo, exp.hypo)
@@ -406,6 +406,13 @@ def by_policy(rbe, pol_dict, treaty_df):
     return rbp
 
 
+def overcols(codes):
+    """
+    :returns: the names of the overspill columns for the given treaty codes
+    """
+    return ['over_' + code for code in codes]
+
+
 # called by post_risk
 def by_event(rbp, treaty_df, mon=Monitor()):
     with mon('processing reinsurance by policy', measuremem=True):
@@ -447,15 +454,21 @@ def by_event(rbp, treaty_df, mon=Monitor()):
         np.testing.assert_allclose(cession + ret, claim)
 
         dic.update({col: res[:, c] for c, col in enumerate(outcols)})
-        dic.update(overspill)
+        # the overspill columns are listed in the order of the treaties
+        dic.update((over, overspill[over]) for over in overcols(tdf.index)
+                   if over in overspill)
         alias = dict(zip(tdf.index, tdf.id))
         df = pd.DataFrame(dic).rename(columns=alias)
     return df
 
 
-def reins_by_policy(dstore, policy_df, treaty_df, loss_id, monitor):
+def reins_by_event(dstore, policy_df, treaty_df, loss_id, eids, monitor):
     """
-    Task function called by post_risk
+    Task function called by post_risk: read the rows of risk_by_event
+    for the events in the range `eids`, aggregate them by policy and
+    apply the treaties (since they act event by event).
+
+    :yields: a dictionary with the reinsurance losses by policy and by event
     """
     rbe_mon = monitor('reading risk_by_event')
     policies = [dict(policy) for _, policy in policy_df.iterrows()]
@@ -464,9 +477,17 @@ def reins_by_policy(dstore, policy_df, treaty_df, loss_id, monitor):
         nrows = len(dstore['risk_by_event/agg_id'])
         for slc in gen_slices(0, nrows, hdf5.MAX_ROWS):
             with rbe_mon:
+                # read the other columns only if there are events in range
+                eid = dstore['risk_by_event/event_id'][slc]
+                if not ((eid >= eids[0]) & (eid < eids[1])).any():
+                    continue
                 rbe_df = dstore.read_df(
                     'risk_by_event', sel={'loss_id': loss_id}, slc=slc)
+                eid = rbe_df.event_id.to_numpy()
+                rbe_df = rbe_df[(eid >= eids[0]) & (eid < eids[1])]
             for policy in policies:
                 dfs.append(by_policy(rbe_df, policy, treaty_df))
-    if dfs:
-        yield pd.concat(dfs)
+    rbp = pd.concat(dfs) if dfs else ()
+    if len(rbp):
+        rbe = by_event(rbp, treaty_df, monitor)  # removes policy_grp
+        yield dict(rbp=rbp, rbe=rbe)
@@ -413,7 +413,8 @@ class RiskModel(object):
         asset_df = pandas.DataFrame(dict(aid=assets.index, val=val), sid)
         vf = self.risk_functions[peril][loss_type]
         df = vf(asset_df, gmf_df, imt, rndgen,
-                self.minimum_asset_loss.get(loss_type, 0.))
+                self.minimum_asset_loss.get(loss_type, 0.),
+                scientific.rng_stream(peril, loss_type, vf.id))
         return df
 
     scenario = ebrisk = scenario_risk = event_based_risk
@@ -705,6 +706,38 @@ class CompositeRiskModel(collections.abc.Mapping):
                             csq[consequence, li][pi] += cAE
         return csq
 
+    def compute_sparse_csq(self, assets, sdd, li, tmap_df, oq):
+        """
+        Compact version of :meth:`compute_csq` for a single peril
+
+        :param assets: asset array
+        :param sdd: dictionary with keys aidx, eidx, dmg as returned by
+            :meth:`openquake.risklib.scientific.RiskComputer.get_sparse_dds`
+        :param li: loss type index
+        :param tmap_df: DataFrame corresponding to the given taxonomy
+        :param oq: OqParam instance with .loss_types and .time_event
+        :returns: a dict consequence_name -> array N
+        """
+        [peril] = self.perils
+        lt = oq.loss_types[li]
+        assets = assets[sdd['aidx']]
+        dmg = sdd['dmg']  # without the no damage state
+        csq = AccumDict(accum=numpy.zeros(len(dmg)))
+        for byname, coeffs in self.consdict.items():
+            if len(coeffs):
+                consequence, _tagname = byname.split('_by_')
+                for risk_id, df in tmap_df.groupby('risk_id'):
+                    if len(df) == 1:
+                        [w] = df.weight
+                    else:  # assume one weigth per peril
+                        [w] = df[df.peril == peril].weight
+                    coeff = dmg @ coeffs[risk_id][peril][lt] * w
+                    cN1 = scientific.consequence(
+                        consequence, assets, coeff.reshape(-1, 1), lt,
+                        oq.time_event)
+                    csq[consequence] += cN1[:, 0]
+        return csq
+
     def init(self):
         oq = self.oqparam
         if self.risklist:
@@ -20,6 +20,7 @@ This module includes the scientific API of the oq-risklib
 """
 import ast
 import copy
+import zlib
 import bisect
 import itertools
 import collections
@@ -38,6 +39,9 @@ U32 = numpy.uint32
 U64 = numpy.uint64
 U16 = numpy.uint16
 U8 = numpy.uint8
+MASK32 = U64(0xFFFFFFFF)
+PHILOX_M0 = U64(0xD2511F53)
+PHILOX_M1 = U64(0xCD9E8D57)
 
 TWO32 = 2 ** 32
 KNOWN_CONSEQUENCES = ['loss', 'loss_aep', 'loss_oep',
@@ -133,9 +137,10 @@ def fine_graining(points, steps):
 
 # sampling functions
 class Sampler(object):
-    def __init__(self, distname, rng, lratios=(), cols=None):
+    def __init__(self, distname, rng, lratios=(), cols=None, stream=0):
         self.distname = distname
         self.rng = rng
+        self.stream = stream  # for the counter based RNG
         self.arange = numpy.arange(len(lratios))  # for the PM distribution
         self.lratios = lratios  # for the PM distribution
         self.cols = cols  # for the PM distribution
@@ -152,14 +157,16 @@ class Sampler(object):
         means = df['mean'].to_numpy()
         covs = df['cov'].to_numpy()
         eids = df['eid'].to_numpy()
-        losses = self.rng.lognormal(eids, means, covs)
+        aids = df['aid'].to_numpy()
+        losses = self.rng.lognormal(eids, means, covs, aids, self.stream)
         return losses
 
     def sampleBT(self, df):
         means = df['mean'].to_numpy()
         covs = df['cov'].to_numpy()
         eids = df['eid'].to_numpy()
-        return self.rng.beta(eids, means, covs)
+        aids = df['aid'].to_numpy()
+        return self.rng.beta(eids, means, covs, aids, self.stream)
 
     def samplePM(self, df):
         eids = df['eid'].to_numpy()
@@ -304,12 +311,14 @@ class VulnerabilityFunction(object):
         else:
             raise NotImplementedError(self.distribution_name)
 
-    def __call__(self, asset_df, gmf_df, col, rng=None, minloss=0):
+    def __call__(self, asset_df, gmf_df, col, rng=None, minloss=0, stream=0):
         """
         :param asset_df: a DataFrame with A assets
         :param gmf_df: a DataFrame of GMFs for the given assets
         :param col: GMF column associated to the IMT (i.e. "gmv_0")
         :param rng: a MultiEventRNG or None
+        :param minloss: minimum loss to keep
+        :param stream: stream index for the counter based RNG
         :returns: a DataFrame with columns eid, aid, loss
         """
         if asset_df is None:  # in the tests
@@ -322,7 +331,7 @@ class VulnerabilityFunction(object):
             lratios = ()
             cols = None
         df = ratio_df.join(asset_df, how='inner')
-        sampler = Sampler(self.distribution_name, rng, lratios, cols)
+        sampler = Sampler(self.distribution_name, rng, lratios, cols, stream)
         covs = not hasattr(self, 'covs') or self.covs.any()
         losses = sampler.get_losses(df, covs)
         ok = losses > minloss
@@ -806,6 +815,55 @@ def _alpha_beta(mean, stddev):
     return c * mean ** 2, c * (mean - mean ** 2)
 
 
+def rng_stream(*keys):
+    """
+    :param keys: strings identifying a sampling, like the loss type and the
+                 vulnerability function ID
+    :returns: a 31 bit stream index for the counter based RNG
+
+    >>> rng_stream('structural', 'RC')
+    1538273422
+    """
+    # NB: zlib.crc32 does not depend on the process, unlike hash
+    return zlib.crc32(':'.join(keys).encode('utf8')) >> 1
+
+
+def philox_uniform(seed, eids, aids, stream=0):
+    """
+    Counter-based generator (Philox4x32-10) of uniform numbers, which are a
+    pure function of (seed, eid, aid, stream) and therefore independent from
+    the order of generation and from the task distribution.
+
+    :param seed: an integer seed
+    :param eids: N event IDs
+    :param aids: N asset IDs (or a scalar), smaller than 2**32
+    :param stream: a 32 bit integer identifying independent streams
+    :returns: two arrays of N uniform numbers in the open interval (0, 1)
+
+    >>> u1, u2 = philox_uniform(42, [0, 1, 1], [0, 0, 1])
+    >>> u1 == philox_uniform(42, [1], [1])[0]
+    array([False, False,  True])
+    >>> u1 == philox_uniform(42, [0, 1, 1], [0, 0, 1], stream=1)[0]
+    array([False, False, False])
+    """
+    eids, aids = numpy.broadcast_arrays(U64(eids), U64(aids))
+    c0 = aids & MASK32
+    c1 = numpy.full_like(c0, U64(stream) & MASK32)
+    c2, c3 = eids & MASK32, eids >> U64(32)
+    k0, k1 = seed & 0xFFFFFFFF, (seed >> 32) & 0xFFFFFFFF
+    for _ in range(10):
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> U64(32)) ^ c1 ^ U64(k0), p1 & MASK32,
+                          (p0 >> U64(32)) ^ c3 ^ U64(k1), p0 & MASK32)
+        k0 = (k0 + 0x9E3779B9) & 0xFFFFFFFF
+        k1 = (k1 + 0xBB67AE85) & 0xFFFFFFFF
+    # build 53 bit floats from pairs of 32 bit integers
+    u1 = ((c0 >> U64(5)) * U64(67108864) + (c1 >> U64(6)) + .5) / 2 ** 53
+    u2 = ((c2 >> U64(5)) * U64(67108864) + (c3 >> U64(6)) + .5) / 2 ** 53
+    return u1, u2
+
+
 class MultiEventRNG(object):
     """
     An object ``MultiEventRNG(master_seed, eids, asset_correlation=0)``
@@ -813,6 +871,15 @@ class MultiEventRNG(object):
     normally distributed random numbers.
     If the ``asset_correlation`` is 1 the numbers are the same.
 
+    If ``counter_based`` is true, the methods ``lognormal`` and ``beta``
+    must receive the asset IDs and the random numbers are generated in
+    a single vectorized call to :func:`philox_uniform`, without building
+    a generator per event; then the results do not depend on how the
+    events and assets are split across tasks. The ``stream`` argument
+    (see :func:`rng_stream`) makes the numbers of different loss types
+    and vulnerability functions independent. The methods
+    ``discrete_dmg_dist`` and ``boolean_dist`` are not supported.
+
     >>> rng = MultiEventRNG(
     ...     master_seed=42, eids=[0, 1, 2], asset_correlation=1)
     >>> eids = numpy.array([1] * 3)
@@ -826,10 +893,14 @@ class MultiEventRNG(object):
     >>> rng.discrete_dmg_dist([0], fractions, [10])
     array([[[8, 2, 0]]], dtype=uint32)
     """
-    def __init__(self, master_seed, eids, asset_correlation=0):
+    def __init__(self, master_seed, eids, asset_correlation=0,
+                 counter_based=False):
         self.master_seed = master_seed
         self.asset_correlation = asset_correlation
+        self.counter_based = counter_based
         self.rng = {}
+        if counter_based:  # no need for generators
+            return
         for eid in eids:
             # NB: int below is necessary for totally mysterious reasons:
             # a calculation on cluster1 #41904 failed with a floating
@@ -846,25 +917,47 @@ class MultiEventRNG(object):
                 return eps
         return self.rng[eid].normal()
 
-    def lognormal(self, eids, means, covs):
+    def _get_uniform(self, eids, aids, stream):
+        # used in counter based mode
+        if aids is None:
+            raise ValueError('Missing asset IDs in counter based mode')
+        return philox_uniform(int(self.master_seed), eids,
+                              0 if self.asset_correlation else aids, stream)
+
+    def _check_sequential(self, method):
+        if self.counter_based:
+            raise ValueError('%s is not supported with counter_based_rng'
+                             % method)
+
+    def lognormal(self, eids, means, covs, aids=None, stream=0):
         """
         :param eids: event IDs
         :param means: array of floats in the range 0..1
         :param covs: array of floats with the same shape
+        :param aids: asset IDs (used only in counter based mode)
+        :param stream: stream index (used only in counter based mode)
         :returns: array of floats
         """
-        corrcache = {}
-        eps = numpy.array([self._get_eps(eid, corrcache) for eid in eids])
+        if self.counter_based:
+            u1, u2 = self._get_uniform(eids, aids, 2 * stream)
+            # Box-Muller transform
+            eps = numpy.sqrt(-2 * numpy.log(u1)) * numpy.cos(2 * numpy.pi * u2)
+        else:
+            corrcache = {}
+            eps = numpy.array([self._get_eps(eid, corrcache)
+                               for eid in eids])
         sigma = numpy.sqrt(numpy.log(1 + covs ** 2))
         div = numpy.sqrt(1 + covs ** 2)
         return means * numpy.exp(eps * sigma) / div
 
     # NB: asset correlation is ignored
-    def beta(self, eids, means, covs):
+    def beta(self, eids, means, covs, aids=None, stream=0):
         """
         :param eids: event IDs
         :param means: array of floats in the range 0..1
         :param covs: array of floats with the same shape
+        :param aids: asset IDs (used only in counter based mode)
+        :param stream: stream index (used only in counter based mode)
         :returns: array of floats following the beta distribution
 
         This function works properly even when some or all of the stddevs
@@ -878,8 +971,13 @@ class MultiEventRNG(object):
         res = numpy.array(means)
         ok = (means != 0) & (covs != 0)  # nonsingular values
         alpha, beta = _alpha_beta(means[ok], means[ok] * covs[ok])
-        res[ok] = [self.rng[eid].beta(alpha[i], beta[i])
-                   for i, eid in enumerate(eids[ok])]
+        if self.counter_based:
+            aids = aids if aids is None else numpy.asarray(aids)[ok]
+            u1, _u2 = self._get_uniform(eids[ok], aids, 2 * stream + 1)
+            res[ok] = stats.beta.ppf(u1, alpha, beta)
+        else:
+            res[ok] = [self.rng[eid].beta(alpha[i], beta[i])
+                       for i, eid in enumerate(eids[ok])]
         return res
 
     def discrete_dmg_dist(self, eids, fractions, numbers):
@@ -892,6 +990,7 @@ class MultiEventRNG(object):
         :param numbers: A asset numbers
         :returns: array of integers of shape (A, E, D)
         """
+        self._check_sequential('discrete_dmg_dist')
         A, E, D = fractions.shape
         assert len(eids) == E, (len(eids), E)
         assert len(numbers) == A, (len(eids), A)
@@ -915,6 +1014,7 @@ class MultiEventRNG(object):
         >>> dist.sum(axis=1)  # around 10% and 20% respectively
         array([12., 17.,  0.])
         """
+        self._check_sequential('boolean_dist')
         E = len(self.rng)
         assert len(probs) == E, (len(probs), E)
         booldist = numpy.zeros((E, num_sims))
@@ -1519,6 +1619,42 @@ def fix_losses(orig_losses, num_events, eff_time=0, sorting=True):
     return losses, sorting_idxs, eperiods
 
 
+def num_top_losses(return_periods, eff_time):
+    """
+    :param return_periods: ordered return periods
+    :param eff_time: investigation_time * ses_per_logic_tree_path
+    :returns: the number of largest losses needed to interpolate the curve
+
+    Only the losses with an empirical period longer than the smallest
+    return period (plus one point on the left for the interpolation)
+    enter in the loss curve, so the others can be discarded.
+
+    >>> num_top_losses([50, 100, 200], 10_000)
+    202
+    """
+    min_period = return_periods[0]
+    if min_period <= 0:  # no truncation possible
+        return 0
+    return int(numpy.ceil(eff_time / min_period)) + 2
+
+
+def top_losses(losses, k):
+    """
+    :param losses: an array of losses
+    :param k: the number of losses to keep
+    :returns: the k largest losses, sorted in ascending order
+
+    This is a partial sort, O(N) instead of O(N log N):
+
+    >>> top_losses(numpy.array([3., 1., 5., 4., 2.]), 2)
+    array([4., 5.])
+    """
+    n = len(losses)
+    if k <= 0 or k >= n:
+        return numpy.sort(losses)
+    return numpy.sort(numpy.partition(losses, n - k)[n - k:])
+
+
 def losses_by_period(losses, return_periods, num_events, eff_time=None,
                      sorting=True, name='curve', pla_factor=None):
     # NB: sorting = False is used in test_claim
@@ -1555,6 +1691,11 @@ def losses_by_period(losses, return_periods, num_events, eff_time=None,
         losses = losses.to_numpy()
     if eff_time is None:
         eff_time = return_periods[-1]
+    if sorting:
+        # only the largest losses contribute to the curve, so use a
+        # partial sort; the discarded ones are replaced by zeros
+        losses = top_losses(losses, num_top_losses(return_periods, eff_time))
+        sorting = False
     losses, _sorting_idxs, eperiods = fix_losses(
         losses, num_events, eff_time, sorting)
     num_left = sum(1 for rp in return_periods if rp < eperiods[0])
@@ -1763,6 +1904,44 @@ class RiskComputer(dict):
                 dd5[:, :, :, li, csqidx[cons]] = values  # (P, A, E)
         return dd5
 
+    def get_sparse_dds(self, adf, gmf_df, rng, crm=None):
+        """
+        Compact version of :meth:`get_dd5` for discrete damage distributions
+        and a single peril: only the damaged (asset, event) pairs are kept,
+        with integer building counts and without the no damage state.
+
+        :param adf:
+            DataFrame of assets on the given site with the same taxonomy
+        :param gmf_df:
+            GMFs on the given site for E events
+        :param rng:
+            MultiEvent random generator
+        :param crm:
+            CompositeRiskModel used to compute the consequences, if any
+        :returns:
+            a list of L dictionaries with keys `aidx`, `eidx` (the indices
+            of the N damaged pairs), `dmg` (uint16/uint32 counts of shape
+            (N, D-1)) and the consequence names (arrays of size N)
+        """
+        assert self.P == 1, self.P
+        assets = adf.to_records()
+        number = assets['value-number'] = U32(assets['value-number'])
+        dt = U16 if number.max() <= numpy.iinfo(U16).max else U32
+        [out] = self.output(adf, gmf_df)
+        if crm:
+            tmap_df = crm.tmap_df[crm.tmap_df.taxi == assets[0]['taxonomy']]
+        sdds = []
+        for li, lt in enumerate(self.loss_types):
+            ddd = rng.discrete_dmg_dist(gmf_df.eid, out[lt], number)
+            aidx, eidx = ddd[:, :, 1:].any(axis=2).nonzero()
+            dic = dict(aidx=U32(aidx), eidx=U32(eidx),
+                       dmg=dt(ddd[aidx, eidx, 1:]))
+            if crm:
+                dic.update(crm.compute_sparse_csq(
+                    assets, dic, li, tmap_df, crm.oqparam))
+            sdds.append(dic)
+        return sdds
+
     def todict(self):
         """
         :returns: a literal dict describing the RiskComputer
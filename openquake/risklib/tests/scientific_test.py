@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
+import unittest.mock
 import pickle
 import toml
 
@@ -217,6 +218,58 @@ class VulnerabilityFunctionTestCase(unittest.TestCase):
         aac(lrem, expected_lrem, atol=1E-3)
 
 
+class CounterBasedRNGTestCase(unittest.TestCase):
+    def test_independent_from_splitting(self):
+        eids = numpy.repeat(numpy.arange(100), 50)
+        aids = numpy.tile(numpy.arange(50), 100)
+        means = numpy.full(5000, .5)
+        covs = numpy.full(5000, .2)
+        rng = scientific.MultiEventRNG(42, [], counter_based=True)
+        vals = rng.lognormal(eids, means, covs, aids)
+        # generating the numbers in reverse order
+        rng2 = scientific.MultiEventRNG(42, [], counter_based=True)
+        aac(rng2.lognormal(eids[::-1], means, covs, aids[::-1]), vals[::-1])
+        # the lognormal distribution has the right mean and cov
+        aac(vals.mean(), .5, rtol=1E-2)
+        aac(vals.std() / vals.mean(), .2, rtol=5E-2)
+        bvals = rng.beta(eids, means, covs, aids)
+        aac(bvals.mean(), .5, rtol=1E-2)
+        aac(rng.beta(eids[:10], means[:10], covs[:10], aids[:10]), bvals[:10])
+
+    def test_asset_correlation(self):
+        rng = scientific.MultiEventRNG(42, [], 1, counter_based=True)
+        vals = rng.lognormal(numpy.array([1, 1, 2]), numpy.full(3, .5),
+                             numpy.full(3, .2), numpy.array([0, 1, 0]))
+        self.assertEqual(vals[0], vals[1])
+        self.assertNotEqual(vals[0], vals[2])
+
+    def test_independent_streams(self):
+        # different loss types and vulnerability functions must not
+        # draw the same epsilons, as in the sequential mode
+        eids = numpy.repeat(numpy.arange(100), 50)
+        aids = numpy.tile(numpy.arange(50), 100)
+        means = numpy.full(5000, .5)
+        covs = numpy.full(5000, .2)
+        rng = scientific.MultiEventRNG(42, [], counter_based=True)
+        s1 = scientific.rng_stream('groundshaking', 'structural', 'RC')
+        s2 = scientific.rng_stream('groundshaking', 'nonstructural', 'RC')
+        v1 = rng.lognormal(eids, means, covs, aids, s1)
+        v2 = rng.lognormal(eids, means, covs, aids, s2)
+        self.assertLess(abs(numpy.corrcoef(v1, v2)[0, 1]), .05)
+        # lognormal and beta do not use the same uniform numbers
+        b1 = rng.beta(eids, means, covs, aids, s1)
+        self.assertLess(abs(numpy.corrcoef(v1, b1)[0, 1]), .05)
+
+    def test_unsupported(self):
+        rng = scientific.MultiEventRNG(42, [0], counter_based=True)
+        with self.assertRaises(ValueError) as ctx:
+            rng.discrete_dmg_dist([0], numpy.array([[[.8, .1, .1]]]), [10])
+        self.assertIn('not supported with counter_based_rng',
+                      str(ctx.exception))
+        with self.assertRaises(ValueError):
+            rng.boolean_dist([.1], 10)
+
+
 class VulnerabilityLossRatioStepsTestCase(unittest.TestCase):
     IMT = 'PGA'
 
@@ -550,6 +603,19 @@ class LossesByEventTestCase(unittest.TestCase):
             losses, periods, len(losses), 2*eff_time)['curve']
         aac(mean, full, rtol=1E-2)  # converges only at 1%
 
+    def test_top_losses(self):
+        # the partial sort must give the same curve as the full sort
+        periods = scientific.return_periods(10_000, 5000)[3:]
+        losses = 10**numpy.random.default_rng(42).random(5000)
+        k = scientific.num_top_losses(periods, 10_000)
+        self.assertEqual(k, 502)
+        aac(scientific.top_losses(losses, k), numpy.sort(losses)[-k:])
+        curve = scientific.losses_by_period(
+            losses, periods, 6000, 10_000)['curve']
+        expected = scientific.losses_by_period(
+            numpy.sort(losses), periods, 6000, 10_000, sorting=False)['curve']
+        aac(curve, expected)
+
     def test_maximum_probable_loss(self):
         # checking that MPL does not break summability
         rng = numpy.random.default_rng(42)
@@ -796,3 +862,65 @@ class RiskComputerTestCase(unittest.TestCase):
         dd1 = dd5[0, 0, 1, 0, 1:]
         aac(dd0, [10, 8, 4, 0])
         aac(dd1, [31, 14, 3, 0], atol=1e-8)
+
+    def test_6(self):
+        # sparse discrete damage distributions and consequences
+        # must be the same as the dense ones
+        rcdic = {'calculation_mode': 'event_based_damage',
+                 'risk_functions':
+                 {'groundshaking#structural#Wood':
+                  {'openquake.risklib.scientific.FragilityFunctionList': {
+                      'array':
+                      [[0.0, 0.5, 0.861, 0.957, 0.985, 0.994, 0.997, 0.999],
+                       [0.0, 0.204, 0.6, 0.813, 0.909, 0.954, 0.976, 0.986],
+                       [0.0, 0.041, 0.255, 0.49, 0.664, 0.78, 0.855, 0.903],
+                       [0.0, 0.007, 0.088, 0.236, 0.394, 0.532, 0.642, 0.728]],
+                      'format': 'discrete',
+                      'id': 'Wood',
+                      'imls': [1e-10, 0.2, 0.4, 0.6, 0.8, 1.0, 1.2, 1.4],
+                      'imt': 'PGA',
+                      'kind': 'fragility',
+                      'loss_type': 'structural',
+                      'nodamage': 0.05,
+                      'peril': 'groundshaking'}}}}
+        limit_states = 'slight moderate extreme complete'.split()
+        rc = riskmodels.get_riskcomputer(rcdic, limit_states)
+        asset_df = pandas.DataFrame({
+            'id': ['a1', 'a2', 'a3'],
+            'site_id': [0, 0, 0],
+            'value-number': [100, 1, 7],
+            'value-structural': [11340., 300., 5000.],
+            'taxonomy': [2, 2, 2]})
+        gmf_df = pandas.DataFrame({
+            'eid': [0, 1, 2, 3],
+            'sid': [0, 0, 0, 0],
+            'PGA': [.098234, .01, .165975, .6]})
+        eids = gmf_df.eid.to_numpy()
+        rng = scientific.MultiEventRNG(master_seed=42, eids=eids)
+        dd5 = rc.get_dd5(asset_df, gmf_df, rng)  # (P, A, E, L, D)
+        rng = scientific.MultiEventRNG(master_seed=42, eids=eids)
+        [sdd] = rc.get_sparse_dds(asset_df, gmf_df, rng)
+        self.assertEqual(sdd['dmg'].dtype, numpy.uint16)
+        dense = numpy.zeros((3, 4, 4))
+        dense[sdd['aidx'], sdd['eidx']] = sdd['dmg']
+        aac(dense, dd5[0, :, :, 0, 1:])
+        # the no damage pairs are not stored
+        self.assertEqual(len(sdd['dmg']), (dense.sum(axis=2) > 0).sum())
+        self.assertLess(len(sdd['dmg']), 12)
+
+        # consequences
+        crm = riskmodels.CompositeRiskModel.__new__(
+            riskmodels.CompositeRiskModel)
+        crm.perils = ['groundshaking']
+        crm.consdict = {'losses_by_risk_id': {'Wood': {'groundshaking': {
+            'structural': numpy.array([.05, .2, .6, 1.])}}}}
+        tmap_df = pandas.DataFrame(dict(
+            taxi=[2], risk_id=['Wood'], weight=[1.], peril=['*']))
+        oq = unittest.mock.Mock(loss_types=['structural'], time_event='avg')
+        assets = asset_df.to_records()
+        assets['value-number'] = numpy.uint32(assets['value-number'])
+        csq = crm.compute_csq(assets, dd5, tmap_df, oq)
+        scsq = crm.compute_sparse_csq(assets, sdd, 0, tmap_df, oq)
+        dense = numpy.zeros((3, 4))
+        dense[sdd['aidx'], sdd['eidx']] = scsq['losses']
+        aac(dense, csq['losses', 0][0], rtol=1E-6)
@@ -674,7 +674,7 @@ def todorovic_silva_2022_nonparametric_general(
     :param precip:
         Mean annual precipitation, measured in mm
     :param session:
-        A Pickable ONNX Runtime Inference Session with the trained model loaded
+        A PicklableInferenceSession with the trained model loaded
 
     :returns:
         out_class: output 0 or 1, i.e., liquefaction nonoccurrence
@@ -683,7 +683,7 @@ def todorovic_silva_2022_nonparametric_general(
     """
     strain_proxy = pgv / (CM_PER_M * vs30)
     matrix = np.array([strain_proxy, dw, wtd, precip]).T
-    results = session.run(None, {"X": matrix})
+    results = session.run_batched({"X": matrix})
     out_class = results[0]
     out_prob = [p[1] for p in results[1]]
     return out_class, out_prob